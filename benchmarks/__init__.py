@@ -0,0 +1,4 @@
+"""Performance benchmarks of the hot endpoints.
+
+Run with `python -m benchmarks`, see `python -m benchmarks --help`.
+"""
@@ -0,0 +1,136 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+
+import django
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks',
+        description='Benchmarks of the hot endpoints on seeded test data',
+    )
+    parser.add_argument('--sizes', default='small',
+                        help='comma separated dataset sizes: small, medium, '
+                             'large')
+    parser.add_argument('--only', default='',
+                        help='comma separated benchmark names, all by default')
+    parser.add_argument('--repeat', type=int, default=10,
+                        help='measured runs of each benchmark')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='seed of the dataset')
+    parser.add_argument('--output', help='save results to the JSON file')
+    parser.add_argument('--compare',
+                        help='JSON file with baseline results to compare with')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='allowed slowdown against the baseline, '
+                             '0.2 is 20%%')
+    return parser.parse_args(argv)
+
+
+def get_commit() -> str | None:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],
+                              capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'star_burger.settings')
+    django.setup()
+
+    from django.contrib.auth.models import User
+    from django.db import connection
+    from django.test import Client, override_settings
+    from django.test.utils import (setup_databases, setup_test_environment,
+                                   teardown_databases,
+                                   teardown_test_environment)
+
+    from .cases import BENCHMARKS, MUTATING_BENCHMARKS
+    from .datasets import SIZES, reseed_dataset
+    from .runner import compare, measure, measure_rolled_back
+
+    sizes = args.sizes.split(',')
+    names = args.only.split(',') if args.only else list(BENCHMARKS)
+    unknown = [size for size in sizes if size not in SIZES] + \
+              [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        print('Unknown sizes or benchmarks: {}'.format(', '.join(unknown)),
+              file=sys.stderr)
+        return 2
+
+    results = {}
+    setup_test_environment(debug=False)
+    databases = setup_databases(verbosity=0, interactive=False)
+    try:
+        with override_settings(
+            GEOCODER_BACKEND='coordinates_keeper.geocoder.OfflineGeocoder',
+            CACHES={'default': {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            }},
+        ):
+            for size in sizes:
+                print(f'Seeding {size} dataset: {SIZES[size]}')
+                reseed_dataset(SIZES[size], seed=args.seed)
+
+                client = Client()
+                client.force_login(User.objects.get(username='manager'))
+                for name in names:
+                    if name in MUTATING_BENCHMARKS:
+                        result = measure_rolled_back(BENCHMARKS[name],
+                                                     client,
+                                                     repeat=args.repeat)
+                    else:
+                        result = measure(BENCHMARKS[name](client),
+                                         repeat=args.repeat)
+                    results[f'{size}/{name}'] = result
+                    print('{:<45} {:>10.2f} ms {:>6} queries {:>10.0f} KiB'
+                          .format(f'{size}/{name}',
+                                  result['wall_ms_median'],
+                                  result['queries'],
+                                  result['peak_memory_kib']))
+    finally:
+        teardown_databases(databases, verbosity=0)
+        teardown_test_environment()
+
+    report = {
+        'meta': {
+            'commit': get_commit(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'sizes': {size: SIZES[size]._asdict() for size in sizes},
+            'seed': args.seed,
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2)
+
+    if not args.compare:
+        return 0
+    with open(args.compare) as file:
+        baseline = json.load(file)['results']
+    regressions = compare(results, baseline, threshold=args.threshold)
+    for name in results:
+        if name not in baseline:
+            continue
+        print('{:<45} {:>10.2f} ms -> {:>10.2f} ms {:>6} -> {:>6} queries{}'
+              .format(name,
+                      baseline[name]['wall_ms_median'],
+                      results[name]['wall_ms_median'],
+                      baseline[name]['queries'],
+                      results[name]['queries'],
+                      '  REGRESSION' if name in regressions else ''))
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,118 @@
+import itertools
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+
+from coordinates_keeper.distance_calc import Distance, prepare_lookup
+from foodcartapp.models import Order, Product, Restaurant
+from restaurateur.views import enrich_orders_with_restaurants
+
+BENCHMARKS = {}
+# benchmarks which write to the database, their changes are rolled back
+MUTATING_BENCHMARKS = set()
+
+
+def benchmark(name: str, mutates: bool = False):
+    """Register a benchmark.
+
+    The decorated function gets a logged in test client, prepares the
+    data and returns the measured callable. Benchmarks which change the
+    dataset are marked with `mutates`.
+    """
+    def register(setup):
+        BENCHMARKS[name] = setup
+        if mutates:
+            MUTATING_BENCHMARKS.add(name)
+        return setup
+    return register
+
+
+def check_status(response, status_code=200):
+    assert response.status_code == status_code, response.status_code
+
+
+@benchmark('product_list_api')
+def product_list_api(client):
+    def run():
+        cache.clear()
+        check_status(client.get('/api/products/'))
+    return run
+
+
+@benchmark('product_list_api_cached')
+def product_list_api_cached(client):
+    return lambda: check_status(client.get('/api/products/'))
+
+
+@benchmark('register_order', mutates=True)
+def register_order(client):
+    product_ids = list(Product.objects.available()
+                       .values_list('id', flat=True)[:3])
+    counter = itertools.count()
+
+    def run():
+        order = {
+            'products': [{'product': product_id, 'quantity': 2}
+                         for product_id in product_ids],
+            'firstname': 'Иван',
+            'lastname': 'Петров',
+            'phonenumber': '+79291000000',
+            'address': f'Москва, Тверская улица, {next(counter) % 150 + 1}',
+        }
+        check_status(client.post('/api/order/',
+                                 json.dumps(order),
+                                 content_type='application/json',
+                                 ),
+                     status_code=201)
+    return run
+
+
+@benchmark('view_products')
+def view_products(client):
+    return lambda: check_status(client.get('/manager/products/'))
+
+
+@benchmark('view_orders')
+def view_orders(client):
+    return lambda: check_status(client.get('/manager/orders/'))
+
+
+@benchmark('enrich_orders_with_restaurants')
+def enrich_orders(client):
+    orders = list(Order.objects.new()
+                  .order_by('created_at', 'id')[:settings.ORDERS_PAGE_SIZE])
+    return lambda: enrich_orders_with_restaurants(orders)
+
+
+@benchmark('distance_matrix')
+def distance_matrix(client):
+    order_addresses = list(Order.objects.values_list('address', flat=True)
+                           .distinct()[:1000])
+    restaurant_addresses = list(Restaurant.objects
+                                .values_list('address', flat=True))
+    dist = Distance(address_lookup=prepare_lookup(
+        order_addresses + restaurant_addresses,
+        fetch_missing=False,
+    ))
+    return lambda: dist.get_distance_matrix(order_addresses,
+                                            restaurant_addresses)
+
+
+@benchmark('prepare_lookup_known')
+def prepare_lookup_known(client):
+    addresses = list(Order.objects.values_list('address', flat=True)
+                     .distinct()[:1000])
+    return lambda: prepare_lookup(addresses, fetch_missing=False)
+
+
+@benchmark('prepare_lookup_geocoding', mutates=True)
+def prepare_lookup_geocoding(client):
+    runs = itertools.count()
+
+    def run():
+        run_number = next(runs)
+        # new addresses every run, so they are geocoded every time
+        prepare_lookup([f'Москва, улица Бенчмарка {run_number}, {house}'
+                        for house in range(1, 101)])
+    return run
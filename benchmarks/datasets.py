@@ -0,0 +1,91 @@
+import random
+from typing import NamedTuple
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+
+from coordinates_keeper.models import Address
+from coordinates_keeper.normalization import normalize_address
+from foodcartapp.models import (Product, ProductCategory, Restaurant,
+                                RestaurantMenuItem)
+from foodcartapp.order_generator import (build_catalogue, create_orders_batch,
+                                         get_batches, get_street_addresses,
+                                         seed_addresses)
+
+
+class DatasetSize(NamedTuple):
+    orders: int
+    restaurants: int
+    products: int
+
+
+SIZES = {
+    'small': DatasetSize(orders=1_000, restaurants=10, products=20),
+    'medium': DatasetSize(orders=10_000, restaurants=30, products=50),
+    'large': DatasetSize(orders=100_000, restaurants=100, products=100),
+}
+
+
+def seed_dataset(size: DatasetSize, seed: int = 0):
+    """Fill the empty database, the same seed gives the same data."""
+    rnd = random.Random(seed)
+    User.objects.create(username='manager', is_staff=True)
+
+    categories = [ProductCategory.objects.create(name=name)
+                  for name in ('Бургеры', 'Напитки', 'Закуски')]
+    Product.objects.bulk_create([
+        Product(name=f'Блюдо {number}',
+                category=rnd.choice(categories),
+                price=rnd.randrange(50, 500),
+                image='burger.jpg',
+                special_status=rnd.random() < 0.1,
+                )
+        for number in range(size.products)
+    ])
+    products = list(Product.objects.order_by('id'))
+
+    street_addresses = get_street_addresses()
+    seed_addresses(street_addresses)
+    restaurant_addresses = rnd.sample(street_addresses, size.restaurants)
+    locations = {
+        address.canonical_key: address
+        for address in Address.objects.filter(
+            canonical_key__in=[normalize_address(name)
+                               for name, _, _ in restaurant_addresses],
+        )
+    }
+    Restaurant.objects.bulk_create([
+        Restaurant(name=f'Star Burger {number}',
+                   address=name,
+                   location=locations[normalize_address(name)],
+                   )
+        for number, (name, _, _) in enumerate(restaurant_addresses)
+    ])
+    restaurants = list(Restaurant.objects.order_by('id'))
+    RestaurantMenuItem.objects.bulk_create([
+        RestaurantMenuItem(restaurant=restaurant,
+                           product=product,
+                           availability=rnd.random() < 0.9,
+                           )
+        for restaurant in restaurants
+        for product in products
+        if rnd.random() < 0.8
+    ])
+
+    catalogue = build_catalogue(products,
+                                [restaurant.id for restaurant in restaurants],
+                                days=30)
+    for batch_size, batch_seed in get_batches(size.orders, 5000, seed):
+        create_orders_batch(catalogue, batch_size, batch_seed)
+
+
+def reseed_dataset(size: DatasetSize, seed: int = 0):
+    """Replace the data of the previous size with a new dataset.
+
+    Flush and bulk inserts send no signals, so the caches built from the
+    previous dataset, like the availability matrix, are cleared here.
+    """
+    call_command('flush', interactive=False, verbosity=0)
+    seed_dataset(size, seed=seed)
+    cache.clear()
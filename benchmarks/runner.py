@@ -0,0 +1,65 @@
+import statistics
+import time
+import tracemalloc
+
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+
+def measure(run, repeat: int, warmup: int = 1) -> dict:
+    """Wall time of the runs, queries and peak memory of one more run.
+
+    Memory is traced in a separate run, since tracemalloc slows the code
+    down.
+    """
+    for _ in range(warmup):
+        run()
+
+    wall_times = []
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        run()
+        wall_times.append(time.perf_counter() - started_at)
+
+    with CaptureQueriesContext(connection) as queries:
+        tracemalloc.start()
+        try:
+            run()
+            _, peak_memory = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+    return {
+        'wall_ms_median': statistics.median(wall_times) * 1000,
+        'wall_ms_min': min(wall_times) * 1000,
+        'wall_ms_max': max(wall_times) * 1000,
+        'repeat': repeat,
+        'queries': len(queries),
+        'peak_memory_kib': peak_memory / 1024,
+    }
+
+
+def measure_rolled_back(setup, client, repeat: int) -> dict:
+    """Measure a benchmark which changes the dataset and undo the changes.
+
+    on_commit callbacks are not run inside the rolled back transaction,
+    so the benchmark should not rely on them.
+    """
+    with transaction.atomic():
+        result = measure(setup(client), repeat=repeat)
+        transaction.set_rollback(True)
+    return result
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    """Names of benchmarks which got slower or make more queries."""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        slower = result['wall_ms_median'] > \
+            base['wall_ms_median'] * (1 + threshold)
+        if slower or result['queries'] > base['queries']:
+            regressions.append(name)
+    return regressions
@@ -0,0 +1,32 @@
+from django.core.cache import cache
+from django.test import TestCase
+
+from foodcartapp.availability import get_availability_matrix
+from foodcartapp.models import Order, Restaurant, RestaurantMenuItem
+
+from .datasets import DatasetSize, reseed_dataset
+
+
+class ReseedDatasetTest(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+
+    def test_sizes_do_not_share_caches(self):
+        for size in (DatasetSize(orders=10, restaurants=2, products=3),
+                     DatasetSize(orders=20, restaurants=4, products=5)):
+            reseed_dataset(size)
+            matrix = get_availability_matrix()
+
+            self.assertEqual(Order.objects.count(), size.orders)
+            self.assertEqual(Restaurant.objects.count(), size.restaurants)
+            menu_items = RestaurantMenuItem.objects.filter(availability=True)
+            self.assertEqual(
+                set(matrix.get_restaurant_ids(
+                    matrix.get_restaurants_mask([]),
+                )),
+                set(menu_items.values_list('restaurant_id', flat=True)),
+            )
+            for restaurant_id, product_id in menu_items.values_list(
+                    'restaurant_id', 'product_id'):
+                self.assertTrue(matrix.is_available(restaurant_id,
+                                                    product_id))
@@ -1,8 +1,47 @@
 from django.contrib import admin
 
-from .models import Address
+from .models import Address, AddressDistance, GeocodeRequest
 
 
 @admin.register(Address)
 class AddressAdmin(admin.ModelAdmin):
-    pass
+    list_display = [
+        'name',
+        'lat',
+        'long',
+        'geocode_status',
+        'geocode_attempts',
+        'retry_after',
+        'update_ts',
+    ]
+    list_filter = [
+        'geocode_status',
+    ]
+    search_fields = [
+        'name',
+    ]
+    readonly_fields = [
+        'canonical_key',
+    ]
+
+
+@admin.register(GeocodeRequest)
+class GeocodeRequestAdmin(admin.ModelAdmin):
+    list_display = [
+        'name',
+        'created_at',
+    ]
+
+
+@admin.register(AddressDistance)
+class AddressDistanceAdmin(admin.ModelAdmin):
+    list_display = [
+        'address_from',
+        'address_to',
+        'ellipsoidal',
+        'kilometers',
+    ]
+    raw_id_fields = [
+        'address_from',
+        'address_to',
+    ]
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class CoordinatesKeeperConfig(AppConfig):
     default_auto_field = 'django.db.models.AutoField'
     name = 'coordinates_keeper'
+
+    def ready(self):
+        from . import signals  # noqa: F401
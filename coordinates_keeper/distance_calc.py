@@ -1,64 +1,259 @@
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
 from itertools import chain
 
+import numpy as np
 import requests
 from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
 from geopy import distance
 
-from .models import Address
+from monitoring.metrics import measure_geocoder
 
+from .geocoder import get_geocoder
+from .models import Address, AddressDistance, GeocodeRequest
+from .normalization import normalize_address
+from .signals import addresses_geocoded
 
-def prepare_lookup(raw_addresses):
-    raw_addresses = set(address.lower()
-                        for address in raw_addresses)
 
-    address_lookup = Address.objects.filter(
-        name__in=raw_addresses,
-    ).values()
+def prepare_lookup(raw_addresses, fetch_missing=True, resolved_addresses=()):
+    """Collect coordinates of addresses, keyed by canonical address key.
 
-    address_lookup = {address['name']: address
-                      for address in address_lookup}
-    for address in raw_addresses:
-        if address not in address_lookup:
-            address_lookup[address] = {'name': address}
-            long, lat = fetch_coordinates(address)
-            address_lookup[address]['long'] = long
-            address_lookup[address]['lat'] = lat
-            Address.objects.create(
-                **address_lookup[address]
+    Unknown addresses and failed ones whose retry time has come are geocoded
+    in place, or unknown ones are just put to the geocoding queue with
+    unknown coordinates if `fetch_missing` is off. Addresses known to fail
+    are never geocoded before their `retry_after`.
+
+    `resolved_addresses` are Address objects loaded beforehand, they get to
+    the lookup without queries.
+    """
+    address_lookup = {address.canonical_key: address
+                      for address in resolved_addresses}
+    raw_addresses = {normalize_address(address): address.lower()
+                     for address in raw_addresses}
+    for key in address_lookup:
+        raw_addresses.pop(key, None)
+
+    known_addresses = Address.objects.filter(
+        canonical_key__in=raw_addresses.keys(),
+    )
+    for address in known_addresses:
+        # duplicates may be left before merge_duplicate_addresses,
+        # the geocoded one is preferred
+        key = address.canonical_key
+        if key not in address_lookup or address_lookup[key].lat is None:
+            address_lookup[key] = address
+    unknown_keys = [key for key in raw_addresses
+                    if key not in address_lookup]
+
+    if not fetch_missing:
+        GeocodeRequest.objects.bulk_create(
+            [GeocodeRequest(name=raw_addresses[key]) for key in unknown_keys],
+            ignore_conflicts=True,
+        )
+        for key in unknown_keys:
+            address_lookup[key] = Address(name=raw_addresses[key],
+                                          canonical_key=key,
+                                          )
+    else:
+        now = timezone.now()
+        retried_addresses = [
+            address for address in address_lookup.values()
+            if address.geocode_status == address.GeocodeStatus.PENDING or
+            address.retry_after is not None and address.retry_after <= now
+        ]
+        new_addresses = [
+            Address(name=raw_addresses[key], canonical_key=key)
+            for key in unknown_keys
+        ]
+        geocode_addresses(retried_addresses + new_addresses)
+        address_lookup.update(
+            (address.canonical_key, address) for address in new_addresses
+        )
+
+    return {key: _as_lookup_entry(address)
+            for key, address in address_lookup.items()}
+
+
+def resolve_address(raw_address: str) -> Address | None:
+    """Find the stored address, it is geocoded first if it is new."""
+    prepare_lookup([raw_address])
+    addresses = Address.objects.filter(
+        canonical_key=normalize_address(raw_address),
+    )
+    # duplicates may be left before merge_duplicate_addresses
+    return addresses.filter(lat__isnull=False).first() or addresses.first()
+
+
+def _as_lookup_entry(address: Address) -> dict:
+    entry = {'name': address.name,
+             'canonical_key': address.canonical_key,
+             'long': address.long,
+             'lat': address.lat,
+             'geocode_status': address.geocode_status,
+             }
+    if address.pk:
+        entry['id'] = address.pk
+    return entry
+
+
+def geocode_addresses(addresses: list[Address], workers: int | None = None):
+    """Fetch coordinates of addresses and save them, both new and stored.
+
+    Failed addresses are retried with exponential backoff, they keep
+    previous coordinates if they had any.
+    """
+    fetched_coordinates = fetch_many_coordinates(
+        [address.name for address in addresses],
+        workers=workers,
+    )
+    now = timezone.now()
+    geocoded_names = []
+    moved_ids = []
+    for address in addresses:
+        coordinates = fetched_coordinates[address.name]
+        if coordinates is None or None in coordinates:
+            address.geocode_status = address.GeocodeStatus.FAILED \
+                if coordinates is None else address.GeocodeStatus.NOT_FOUND
+            if address.lat is not None:
+                # outdated coordinates are still better than none
+                address.geocode_status = address.GeocodeStatus.FOUND
+            address.geocode_attempts += 1
+            address.retry_after = now + get_retry_delay(
+                address.geocode_attempts,
             )
+            continue
+
+        long, lat = coordinates
+        if (address.lat, address.long) != (lat, long):
+            geocoded_names.append(address.name)
+            if address.pk:
+                moved_ids.append(address.pk)
+        address.lat, address.long = lat, long
+        address.geocode_status = address.GeocodeStatus.FOUND
+        address.geocode_attempts = 0
+        address.retry_after = None
+        address.update_ts = now
 
-    return address_lookup
+    # the geocoder is called above, only the results are saved together
+    with transaction.atomic():
+        Address.objects.bulk_create(
+            [address for address in addresses if not address.pk],
+            ignore_conflicts=True,
+        )
+        Address.objects.bulk_update(
+            [address for address in addresses if address.pk],
+            ['lat', 'long', 'geocode_status', 'geocode_attempts',
+             'retry_after', 'update_ts'],
+        )
+        if moved_ids:
+            AddressDistance.objects.involving(moved_ids).delete()
+        if geocoded_names:
+            addresses_geocoded.send(sender=Address, names=geocoded_names)
+
+
+def get_retry_delay(attempts: int) -> timedelta:
+    delay = settings.GEOCODER_RETRY_DELAY * 2 ** (attempts - 1)
+    return timedelta(seconds=min(delay, settings.GEOCODER_RETRY_MAX_DELAY))
+
+
+def fetch_many_coordinates(addresses, workers: int | None = None) -> dict:
+    """Geocode addresses concurrently in GEOCODER_CONCURRENCY threads.
+
+    Gives `None` instead of coordinates for addresses which failed
+    because the geocoder is unreachable, rejected or throttled the request,
+    or because the backend has raised any other error.
+    """
+    if not addresses:
+        return {}
+
+    def fetch(address):
+        try:
+            return fetch_coordinates(address)
+        except requests.RequestException as err:
+            logging.warning('cannot fetch coordinates for address: %s, %s',
+                            address, err)
+            return None
+        except Exception:
+            # a broken backend must not lose coordinates of other addresses
+            logging.exception('cannot fetch coordinates for address: %s',
+                              address)
+            return None
+
+    workers = min(workers or settings.GEOCODER_CONCURRENCY, len(addresses))
+    with measure_geocoder(), \
+            ThreadPoolExecutor(max_workers=workers) as executor:
+        return dict(zip(addresses, executor.map(fetch, addresses)))
 
 
 def fetch_coordinates(address) -> tuple[float, float] | tuple[None, None]:
-    if not settings.YANDEX_MAP_API_KEY:
-        logging.warning('STAR_BURGER__YANDEX_MAP_API_KEY has not been set')
-        return None, None
-
-    base_url = "https://geocode-maps.yandex.ru/1.x"
-    response = requests.get(base_url, params={
-        "geocode": address,
-        "apikey": settings.YANDEX_MAP_API_KEY,
-        "format": "json",
-    })
-    wrn_msg = 'problems with authorizing to {}, ' \
-              'check your STAR_BURGER__YANDEX_MAP_API_KEY'.format(base_url)
-    if response.status_code == 403:
-        logging.warning(wrn_msg)
-        return None, None
-
-    response.raise_for_status()
-    found_places = response.json()['response']['GeoObjectCollection'][
-        'featureMember']
-
-    if not found_places:
-        logging.warning('cannot find coordinates for address: {}' % address)
-        return None, None
-
-    most_relevant = found_places[0]
-    lon, lat = most_relevant['GeoObject']['Point']['pos'].split(" ")
-    return float(lon), float(lat)
+    return get_geocoder().fetch_coordinates(address)
+
+
+def distance_matrix(origins, destinations,
+                    ellipsoidal: bool = False) -> np.ndarray:
+    """Calculate kilometers between every origin and every destination.
+
+    Both arguments are sequences of `(lat, long)` pairs, `None` coordinates
+    give `nan` distances. Haversine is used by default, Lambert's formula
+    for the WGS-84 ellipsoid if `ellipsoidal` is set.
+    """
+    origins = _to_radians(origins)[:, np.newaxis, :]
+    destinations = _to_radians(destinations)[np.newaxis, :, :]
+    if ellipsoidal:
+        return _lambert(origins, destinations)
+    return _haversine(origins, destinations)
+
+
+def paired_distances(origins, destinations,
+                     ellipsoidal: bool = False) -> np.ndarray:
+    """Calculate kilometers between each origin and its own destination.
+
+    Takes the same arguments as `distance_matrix`, both sequences must
+    have the same length.
+    """
+    origins = _to_radians(origins)
+    destinations = _to_radians(destinations)
+    if ellipsoidal:
+        return _lambert(origins, destinations)
+    return _haversine(origins, destinations)
+
+
+def _to_radians(coords) -> np.ndarray:
+    coords = np.array(coords, dtype=float).reshape(-1, 2)
+    return np.radians(coords)
+
+
+def _central_angle(lat_a, long_a, lat_b, long_b) -> np.ndarray:
+    hav = (np.sin((lat_b - lat_a) / 2) ** 2 +
+           np.cos(lat_a) * np.cos(lat_b) * np.sin((long_b - long_a) / 2) ** 2)
+    return 2 * np.arcsin(np.sqrt(np.clip(hav, 0, 1)))
+
+
+def _haversine(origins, destinations) -> np.ndarray:
+    angle = _central_angle(origins[..., 0], origins[..., 1],
+                           destinations[..., 0], destinations[..., 1])
+    return distance.EARTH_RADIUS * angle
+
+
+def _lambert(origins, destinations) -> np.ndarray:
+    major, _, flattening = distance.ELLIPSOIDS['WGS-84']
+    reduced_a = np.arctan((1 - flattening) * np.tan(origins[..., 0]))
+    reduced_b = np.arctan((1 - flattening) * np.tan(destinations[..., 0]))
+    angle = _central_angle(reduced_a, origins[..., 1],
+                           reduced_b, destinations[..., 1])
+
+    p = (reduced_a + reduced_b) / 2
+    q = (reduced_b - reduced_a) / 2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x = ((angle - np.sin(angle)) * np.sin(p) ** 2 * np.cos(q) ** 2 /
+             np.cos(angle / 2) ** 2)
+        y = ((angle + np.sin(angle)) * np.cos(p) ** 2 * np.sin(q) ** 2 /
+             np.sin(angle / 2) ** 2)
+        kilometers = major * (angle - flattening / 2 * (x + y))
+    return np.where(angle == 0, 0.0, kilometers)
 
 
 class Distance:
@@ -66,13 +261,100 @@ class Distance:
     def __init__(self, address_lookup: dict):
         self._address_lookup = address_lookup
 
+    def get_coordinates(self, address: str) -> tuple:
+        address = self._address_lookup[normalize_address(address)]
+        return address['lat'], address['long']
+
     def get_distance(self, address_a: str, address_b: str) -> [int]:
-        address_a = address_a.lower()
-        address_b = address_b.lower()
-        address_a_coords = (self._address_lookup[address_a]['long'],
-                            self._address_lookup[address_a]['lat'])
-        address_b_coords = (self._address_lookup[address_b]['long'],
-                            self._address_lookup[address_b]['lat'])
+        address_a_coords = self.get_coordinates(address_a)
+        address_b_coords = self.get_coordinates(address_b)
         if not all(chain(address_a_coords, address_b_coords)):
             return None
         return distance.distance(address_a_coords, address_b_coords).kilometers
+
+    def get_distance_matrix(self, addresses_a, addresses_b) -> np.ndarray:
+        return distance_matrix(
+            [self.get_coordinates(address) for address in addresses_a],
+            [self.get_coordinates(address) for address in addresses_b],
+            ellipsoidal=settings.DISTANCE_ELLIPSOIDAL,
+        )
+
+    def get_paired_distances(self, addresses_a, addresses_b) -> np.ndarray:
+        """Calculate kilometers between each address and its pair.
+
+        Distances between stored addresses are read from AddressDistance
+        table in one query, the missing ones are calculated at once and
+        saved there.
+        """
+        addresses_a = [self._address_lookup[normalize_address(address)]
+                       for address in addresses_a]
+        addresses_b = [self._address_lookup[normalize_address(address)]
+                       for address in addresses_b]
+        ellipsoidal = settings.DISTANCE_ELLIPSOIDAL
+
+        pair_keys = [
+            _get_pair_key(address_a, address_b)
+            for address_a, address_b in zip(addresses_a, addresses_b)
+        ]
+        cacheable_keys = {key for key in pair_keys if key}
+        address_ids = {address_id
+                       for key in cacheable_keys
+                       for address_id in key}
+        known_distances = {}
+        if cacheable_keys:
+            known_distances = {
+                (address_from_id, address_to_id): kilometers
+                for address_from_id, address_to_id, kilometers
+                in AddressDistance.objects.filter(
+                    address_from__in=address_ids,
+                    address_to__in=address_ids,
+                    ellipsoidal=ellipsoidal,
+                ).values_list('address_from', 'address_to', 'kilometers')
+            }
+
+        missing_positions = [
+            position for position, key in enumerate(pair_keys)
+            if key not in known_distances
+        ]
+        calculated_distances = paired_distances(
+            [(addresses_a[position]['lat'], addresses_a[position]['long'])
+             for position in missing_positions],
+            [(addresses_b[position]['lat'], addresses_b[position]['long'])
+             for position in missing_positions],
+            ellipsoidal=ellipsoidal,
+        )
+
+        kilometers = np.array(
+            [known_distances.get(key, np.nan) for key in pair_keys],
+            dtype=float,
+        )
+        kilometers[missing_positions] = calculated_distances
+
+        new_distances = {}
+        for position, calculated in zip(missing_positions,
+                                        calculated_distances):
+            key = pair_keys[position]
+            if key and not np.isnan(calculated):
+                new_distances[key] = float(calculated)
+        AddressDistance.objects.bulk_create(
+            [AddressDistance(address_from_id=address_from_id,
+                             address_to_id=address_to_id,
+                             ellipsoidal=ellipsoidal,
+                             kilometers=calculated,
+                             )
+             for (address_from_id, address_to_id), calculated
+             in new_distances.items()],
+            ignore_conflicts=True,
+        )
+
+        return kilometers
+
+
+def _get_pair_key(address_a: dict, address_b: dict) -> tuple | None:
+    """Key of a cached distance, it is the same in both directions."""
+    if 'id' not in address_a or 'id' not in address_b:
+        return None
+    if None in (address_a['lat'], address_a['long'],
+                address_b['lat'], address_b['long']):
+        return None
+    return tuple(sorted((address_a['id'], address_b['id'])))
@@ -0,0 +1,83 @@
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .distance_calc import geocode_addresses, prepare_lookup
+from .models import Address, GeocodeRequest
+from .normalization import normalize_address
+
+# a worker which has died is replaced by others after its lease
+LEASE_DURATION = timedelta(minutes=5)
+
+
+def enqueue_addresses(raw_addresses):
+    """Put addresses without known coordinates to the geocoding queue."""
+    raw_addresses = {normalize_address(address): address.lower()
+                     for address in raw_addresses}
+    known_keys = set(Address.objects.filter(
+        canonical_key__in=raw_addresses.keys(),
+    ).values_list('canonical_key', flat=True))
+
+    GeocodeRequest.objects.bulk_create(
+        [GeocodeRequest(name=address)
+         for key, address in raw_addresses.items()
+         if key not in known_keys],
+        ignore_conflicts=True,
+    )
+
+
+def process_queue_batch(batch_size: int) -> int:
+    """Geocode the oldest queued addresses and remove them from the queue.
+
+    The batch is leased for LEASE_DURATION in a short transaction, so the
+    geocoder is called without holding locks or an open transaction, and
+    several workers can drain the queue together. Failed addresses are
+    stored with their retry time and left to `refresh_addresses_batch`.
+    Returns the number of processed queue entries.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        batch = list(
+            GeocodeRequest.objects
+            .filter(Q(leased_until__isnull=True) | Q(leased_until__lte=now))
+            .select_for_update(skip_locked=True)
+            .order_by('created_at')[:batch_size]
+        )
+        if not batch:
+            return 0
+        request_ids = [request.id for request in batch]
+        GeocodeRequest.objects \
+            .filter(id__in=request_ids) \
+            .update(leased_until=now + LEASE_DURATION)
+
+    prepare_lookup([request.name for request in batch])
+    GeocodeRequest.objects.filter(id__in=request_ids).delete()
+    return len(batch)
+
+
+def refresh_addresses_batch(batch_size: int) -> int:
+    """Geocode again stored addresses which are due for it.
+
+    Failed addresses are retried after their backoff delay, geocoded ones
+    are refreshed when they get old. The batch is leased by moving its
+    `retry_after` to the end of the lease, the geocoder sets the real
+    retry time afterwards. Returns the number of processed addresses.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        batch = list(
+            Address.objects
+            .due_for_geocoding(now)
+            .select_for_update(skip_locked=True)
+            .order_by('update_ts')[:batch_size]
+        )
+        if not batch:
+            return 0
+        Address.objects \
+            .filter(id__in=[address.id for address in batch]) \
+            .update(retry_after=now + LEASE_DURATION)
+
+    geocode_addresses(batch)
+    return len(batch)
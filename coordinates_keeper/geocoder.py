@@ -0,0 +1,330 @@
+import csv
+import hashlib
+import logging
+import threading
+import time
+from functools import lru_cache
+
+import requests
+from django.conf import settings
+from django.utils.module_loading import import_string
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .normalization import normalize_address
+
+YANDEX_GEOCODER_URL = 'https://geocode-maps.yandex.ru/1.x'
+# min lat, min long, max lat, max long
+MOSCOW_BBOX = (55.57, 37.36, 55.91, 37.85)
+
+
+class GeocoderUnavailable(requests.RequestException):
+    """Request was not sent: the circuit is open or the quota is spent."""
+
+
+class GeocoderResponseError(requests.RequestException):
+    """Geocoder answered with a payload which could not be parsed."""
+
+
+class TokenBucket:
+    """Thread-safe token bucket, `rate` tokens a second up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout: float) -> bool:
+        """Take a token, waiting for it no longer than `timeout` seconds."""
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.capacity,
+                    self._tokens + (now - self._updated_at) * self.rate,
+                )
+                self._updated_at = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / self.rate
+            if now + wait > deadline:
+                return False
+            time.sleep(wait)
+
+
+class CircuitBreaker:
+    """Stop calling a failing service for `cooldown` seconds.
+
+    The circuit opens after `failure_threshold` errors in a row. When the
+    cooldown is over one trial call is let through: its success closes the
+    circuit, its failure opens it again.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int, cooldown: float):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._failures = 0
+        self._opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._get_state()
+
+    def _get_state(self) -> str:
+        if self._opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self._opened_at < self.cooldown:
+            return self.OPEN
+        return self.HALF_OPEN
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self._get_state()
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial_running or \
+                    self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            self._trial_running = False
+
+
+class Geocoder:
+    """Geocoder backend interface, see GEOCODER_BACKEND setting.
+
+    Backends are shared between threads, so they must be thread-safe.
+    """
+    # stats which only grow, the rest are current values
+    counters: tuple[str, ...] = ()
+
+    @classmethod
+    def from_settings(cls):
+        return cls()
+
+    def fetch_coordinates(self, address: str) -> tuple[float, float] | \
+            tuple[None, None]:
+        """Find `(long, lat)` of the address.
+
+        Gives `(None, None)` if nothing was found and raises
+        `requests.RequestException` if the geocoder could not answer.
+        """
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        """Counters for monitoring."""
+        return {}
+
+
+class YandexGeocoder(Geocoder):
+    """Yandex geocoder client.
+
+    Requests go through a pooled session with connect and read timeouts,
+    are throttled by a token bucket sized to the API quota and are
+    rejected at once while the circuit breaker is open.
+    """
+    counters = ('requests', 'found', 'not_found', 'failures',
+                'rejected', 'throttled')
+
+    def __init__(self, api_key: str,
+                 base_url: str = YANDEX_GEOCODER_URL,
+                 connect_timeout: float = 2.0,
+                 read_timeout: float = 3.0,
+                 rate_limit: float = 5.0,
+                 burst: int = 10,
+                 failure_threshold: int = 5,
+                 cooldown: float = 30.0,
+                 pool_size: int = 8,
+                 ):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_wait = connect_timeout + read_timeout
+        self.rate_limiter = TokenBucket(rate_limit, burst)
+        self.breaker = CircuitBreaker(failure_threshold, cooldown)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_maxsize=pool_size,
+            max_retries=Retry(total=2,
+                              connect=2,
+                              read=0,
+                              status=0,
+                              backoff_factor=0.2,
+                              ),
+        )
+        self.session.mount('https://', adapter)
+
+        self._counters = dict.fromkeys(self.counters, 0)
+        self._counters_lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls):
+        return cls(api_key=settings.YANDEX_MAP_API_KEY,
+                   connect_timeout=settings.GEOCODER_CONNECT_TIMEOUT,
+                   read_timeout=settings.GEOCODER_TIMEOUT,
+                   rate_limit=settings.GEOCODER_RATE_LIMIT,
+                   burst=settings.GEOCODER_BURST,
+                   failure_threshold=settings.GEOCODER_FAILURE_THRESHOLD,
+                   cooldown=settings.GEOCODER_COOLDOWN,
+                   pool_size=settings.GEOCODER_CONCURRENCY,
+                   )
+
+    def _count(self, counter: str):
+        with self._counters_lock:
+            self._counters[counter] += 1
+
+    def stats(self) -> dict:
+        """Snapshot of the breaker state and request counters."""
+        with self._counters_lock:
+            stats = dict(self._counters)
+        stats['circuit'] = self.breaker.state
+        return stats
+
+    def fetch_coordinates(self, address: str) -> tuple[float, float] | \
+            tuple[None, None]:
+        if not self.api_key:
+            raise GeocoderUnavailable(
+                'STAR_BURGER__YANDEX_MAP_API_KEY has not been set'
+            )
+        # do not wait for the quota when the call is going to be rejected
+        if self.breaker.state == self.breaker.OPEN:
+            self._count('rejected')
+            raise GeocoderUnavailable('geocoder circuit is open')
+        if not self.rate_limiter.acquire(timeout=self.max_wait):
+            self._count('throttled')
+            raise GeocoderUnavailable('geocoder rate limit is exceeded')
+        if not self.breaker.allow():
+            self._count('rejected')
+            raise GeocoderUnavailable('geocoder circuit is open')
+
+        self._count('requests')
+        # every allowed call has to be recorded, otherwise a trial call of
+        # the half-open circuit would never be finished
+        try:
+            response = self.session.get(self.base_url, params={
+                'geocode': address,
+                'apikey': self.api_key,
+                'format': 'json',
+            }, timeout=self.timeout)
+            if response.status_code == 403:
+                logging.warning('problems with authorizing to %s, check your '
+                                'STAR_BURGER__YANDEX_MAP_API_KEY',
+                                self.base_url)
+            response.raise_for_status()
+            found_places = response.json()['response'][
+                'GeoObjectCollection']['featureMember']
+            coordinates = None, None
+            if found_places:
+                most_relevant = found_places[0]
+                lon, lat = most_relevant['GeoObject']['Point']['pos'] \
+                    .split(' ')
+                coordinates = float(lon), float(lat)
+        except requests.HTTPError as err:
+            self._count('failures')
+            if is_client_error(err.response):
+                # the geocoder is up, it is the request which is wrong
+                self.breaker.record_success()
+            else:
+                self.breaker.record_failure()
+            raise
+        except requests.RequestException:
+            self._count('failures')
+            self.breaker.record_failure()
+            raise
+        except Exception as err:
+            self._count('failures')
+            self.breaker.record_failure()
+            raise GeocoderResponseError(
+                f'unexpected geocoder response: {err!r}',
+            ) from err
+        self.breaker.record_success()
+
+        if not found_places:
+            self._count('not_found')
+            logging.warning('cannot find coordinates for address: %s',
+                            address)
+            return coordinates
+
+        self._count('found')
+        return coordinates
+
+
+def is_client_error(response) -> bool:
+    # too many requests is an overload of the geocoder
+    return response is not None and 400 <= response.status_code < 500 and \
+        response.status_code != 429
+
+
+class OfflineGeocoder(Geocoder):
+    """Deterministic geocoder without network for tests and benchmarks.
+
+    Addresses are looked up in a CSV gazetteer with `address`, `lat` and
+    `long` columns if it is given. Other addresses are hashed into a point
+    of the bounding box, so the same address always gets the same
+    coordinates.
+    """
+
+    def __init__(self,
+                 gazetteer_path: str | None = None,
+                 bbox: tuple[float, float, float, float] = MOSCOW_BBOX,
+                 ):
+        self.bbox = bbox
+        self.gazetteer = {}
+        if gazetteer_path:
+            with open(gazetteer_path, encoding='utf-8', newline='') as file:
+                self.gazetteer = {
+                    normalize_address(row['address']): (float(row['long']),
+                                                        float(row['lat']))
+                    for row in csv.DictReader(file)
+                }
+
+    @classmethod
+    def from_settings(cls):
+        return cls(gazetteer_path=settings.GEOCODER_GAZETTEER or None,
+                   bbox=tuple(settings.GEOCODER_OFFLINE_BBOX),
+                   )
+
+    def fetch_coordinates(self, address: str) -> tuple[float, float]:
+        key = normalize_address(address)
+        if key in self.gazetteer:
+            return self.gazetteer[key]
+
+        digest = hashlib.sha1(key.encode()).digest()
+        lat_share, long_share = (
+            int.from_bytes(part, 'big') / 2 ** 64
+            for part in (digest[:8], digest[8:16])
+        )
+        min_lat, min_long, max_lat, max_long = self.bbox
+        return (min_long + (max_long - min_long) * long_share,
+                min_lat + (max_lat - min_lat) * lat_share)
+
+    def stats(self) -> dict:
+        return {'gazetteer_size': len(self.gazetteer)}
+
+
+@lru_cache(maxsize=None)
+def get_geocoder() -> Geocoder:
+    return import_string(settings.GEOCODER_BACKEND).from_settings()
@@ -0,0 +1,78 @@
+import time
+from itertools import chain, islice
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from coordinates_keeper.distance_calc import geocode_addresses
+from coordinates_keeper.models import Address
+from coordinates_keeper.normalization import normalize_address
+from foodcartapp.models import Order, Restaurant
+
+
+class Command(BaseCommand):
+    help = 'Геокодирование адресов всех ресторанов и заказов заранее'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200,
+                            help='number of addresses committed at once')
+        parser.add_argument('--workers', type=int,
+                            default=settings.GEOCODER_CONCURRENCY,
+                            help='number of concurrent geocoder requests')
+
+    def handle(self, *args, **options):
+        querysets = [
+            Restaurant.objects.values_list('address', flat=True),
+            Order.objects.values_list('address', flat=True),
+        ]
+        total = sum(queryset.distinct().count() for queryset in querysets)
+        raw_addresses = chain.from_iterable(
+            queryset.distinct().order_by('address').iterator()
+            for queryset in querysets
+        )
+
+        # every batch is committed, so an interrupted run is resumed by
+        # running the command again: geocoded addresses are skipped
+        stats = dict.fromkeys(('read', 'skipped', 'found', 'failed'), 0)
+        started_at = time.monotonic()
+        while True:
+            batch = list(islice(raw_addresses, options['batch_size']))
+            if not batch:
+                break
+            stats['read'] += len(batch)
+
+            new_addresses = {}
+            for address in batch:
+                key = normalize_address(address)
+                new_addresses.setdefault(key, address.lower())
+            known_keys = set(Address.objects.filter(
+                canonical_key__in=new_addresses.keys(),
+            ).values_list('canonical_key', flat=True))
+            addresses = [Address(name=name, canonical_key=key)
+                         for key, name in new_addresses.items()
+                         if key not in known_keys]
+            stats['skipped'] += len(batch) - len(addresses)
+
+            with transaction.atomic():
+                geocode_addresses(addresses, workers=options['workers'])
+            found = sum(address.lat is not None for address in addresses)
+            stats['found'] += found
+            stats['failed'] += len(addresses) - found
+
+            elapsed = time.monotonic() - started_at
+            self.stdout.write(
+                '{read}/{total} read, {skipped} skipped, {found} found, '
+                '{failed} failed, {speed:.1f} addresses/s'.format(
+                    total=total,
+                    speed=stats['read'] / elapsed if elapsed else 0,
+                    **stats,
+                )
+            )
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                'Successfully geocoded {found} addresses, '
+                '{failed} failed'.format(**stats)
+            )
+        )
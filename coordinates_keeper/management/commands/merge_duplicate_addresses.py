@@ -0,0 +1,81 @@
+from django.core.management.base import BaseCommand
+from django.db import models, transaction
+
+from coordinates_keeper.models import Address
+from coordinates_keeper.normalization import normalize_address
+from coordinates_keeper.signals import addresses_geocoded
+
+
+class Command(BaseCommand):
+    help = 'Объединение адресов с одинаковым нормализованным видом'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='only report duplicates')
+
+    def handle(self, *args, **options):
+        addresses = list(Address.objects.order_by('canonical_key', 'id'))
+        for address in addresses:
+            address.canonical_key = normalize_address(address.name)
+
+        duplicates = {}
+        for address in addresses:
+            duplicates.setdefault(address.canonical_key, []).append(address)
+
+        obsolete_ids = []
+        merges = []
+        for key, group in duplicates.items():
+            if len(group) < 2:
+                continue
+            # geocoded and the most recent address wins
+            group.sort(key=lambda address: (address.lat is not None,
+                                            address.update_ts),
+                       reverse=True)
+            kept, *obsolete = group
+            obsolete_ids.extend(address.id for address in obsolete)
+            merges.append((kept, [address.id for address in obsolete]))
+            self.stdout.write(
+                '{}: keep "{}", drop {}'.format(
+                    key,
+                    kept.name,
+                    ', '.join(f'"{address.name}"' for address in obsolete),
+                )
+            )
+
+        if not options['dry_run']:
+            with transaction.atomic():
+                Address.objects.bulk_update(addresses, ['canonical_key'],
+                                            batch_size=500)
+                for kept, duplicate_ids in merges:
+                    repoint_references(duplicate_ids, kept)
+                Address.objects.filter(id__in=obsolete_ids).delete()
+                # moved references may have got coordinates of kept ones
+                if merges:
+                    addresses_geocoded.send(
+                        sender=Address,
+                        names=[kept.name for kept, _ in merges],
+                    )
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                '{} duplicate addresses {}'.format(
+                    len(obsolete_ids),
+                    'found' if options['dry_run'] else 'removed',
+                )
+            )
+        )
+
+
+def repoint_references(duplicate_ids, kept):
+    """Move references to duplicates, like restaurant locations, to `kept`.
+
+    References deleted together with the address, like cached distances,
+    are left to be deleted.
+    """
+    for relation in Address._meta.related_objects:
+        if not relation.one_to_many or \
+                relation.on_delete is models.CASCADE:
+            continue
+        relation.related_model._base_manager.filter(**{
+            f'{relation.field.name}__in': duplicate_ids,
+        }).update(**{relation.field.name: kept})
@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from coordinates_keeper.geocoder import get_geocoder
+from coordinates_keeper.geocode_queue import (process_queue_batch,
+                                              refresh_addresses_batch)
+
+
+class Command(BaseCommand):
+    help = 'Геокодирование адресов из очереди и обновление устаревших'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50,
+                            help='number of addresses geocoded at once')
+        parser.add_argument('--forever', action='store_true',
+                            help='keep polling the queue when it is empty')
+        parser.add_argument('--sleep', type=float, default=5,
+                            help='seconds between polls of the empty queue')
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            # new addresses go first, the stored ones are refreshed
+            # when the queue is empty
+            processed = process_queue_batch(options['batch_size']) or \
+                refresh_addresses_batch(options['batch_size'])
+            total += processed
+            if processed:
+                continue
+            if not options['forever']:
+                break
+            time.sleep(options['sleep'])
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                'Successfully processed {} addresses'.format(total)
+            )
+        )
+        self.stdout.write('Geocoder: {}'.format(
+            ', '.join(f'{name} {value}' for name, value
+                      in get_geocoder().stats().items())
+        ))
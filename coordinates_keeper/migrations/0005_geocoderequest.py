@@ -0,0 +1,26 @@
+# Generated by Django 3.2 on 2026-10-18 02:34
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coordinates_keeper', '0004_auto_20220509_0911'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GeocodeRequest',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200, unique=True, verbose_name='адрес')),
+                ('created_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name='создан в')),
+            ],
+            options={
+                'verbose_name': 'запрос геокодирования',
+                'verbose_name_plural': 'очередь геокодирования',
+            },
+        ),
+    ]
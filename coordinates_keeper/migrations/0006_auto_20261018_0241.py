@@ -0,0 +1,32 @@
+# Generated by Django 3.2 on 2026-10-18 02:41
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coordinates_keeper', '0005_geocoderequest'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AddressDistance',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ellipsoidal', models.BooleanField(default=False, verbose_name='по эллипсоиду')),
+                ('kilometers', models.FloatField(verbose_name='расстояние, км')),
+                ('address_from', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='coordinates_keeper.address', verbose_name='откуда')),
+                ('address_to', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='coordinates_keeper.address', verbose_name='куда')),
+            ],
+            options={
+                'verbose_name': 'расстояние',
+                'verbose_name_plural': 'расстояния',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='addressdistance',
+            constraint=models.UniqueConstraint(fields=('address_from', 'address_to', 'ellipsoidal'), name='unique_address_distance'),
+        ),
+    ]
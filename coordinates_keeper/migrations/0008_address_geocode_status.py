@@ -0,0 +1,41 @@
+# Generated by Django 3.2 on 2026-10-18 02:44
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def fill_geocode_status(apps, schema_editor):
+    Address = apps.get_model('coordinates_keeper', 'Address')
+    Address.objects.filter(lat__isnull=False, long__isnull=False) \
+        .update(geocode_status='found')
+    # addresses without coordinates have failed before, retry them soon
+    Address.objects.filter(geocode_status='pending') \
+        .update(geocode_status='not_found',
+                geocode_attempts=1,
+                retry_after=timezone.now())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coordinates_keeper', '0007_address_canonical_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='address',
+            name='geocode_attempts',
+            field=models.PositiveSmallIntegerField(default=0, verbose_name='неудачных попыток подряд'),
+        ),
+        migrations.AddField(
+            model_name='address',
+            name='geocode_status',
+            field=models.CharField(choices=[('pending', 'Не геокодирован'), ('found', 'Найден'), ('not_found', 'Не найден'), ('failed', 'Ошибка геокодера')], db_index=True, default='pending', max_length=20, verbose_name='статус геокодирования'),
+        ),
+        migrations.AddField(
+            model_name='address',
+            name='retry_after',
+            field=models.DateTimeField(blank=True, db_index=True, null=True, verbose_name='повторить после'),
+        ),
+        migrations.RunPython(fill_geocode_status, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2 on 2026-10-18 02:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coordinates_keeper', '0008_address_geocode_status'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='address',
+            name='name',
+            field=models.CharField(max_length=200, unique=True, verbose_name='адрес'),
+        ),
+    ]
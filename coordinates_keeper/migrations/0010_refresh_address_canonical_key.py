@@ -0,0 +1,89 @@
+# Generated by Django 3.2 on 2026-10-18 03:15
+
+import re
+
+from django.db import migrations, models
+
+# normalize_address as it was when the migration was written, the code
+# may change later while the migration has to give the same keys
+STREET_TYPES = {
+    'ул': 'улица',
+    'улица': 'улица',
+    'пр-т': 'проспект',
+    'просп': 'проспект',
+    'проспект': 'проспект',
+    'пер': 'переулок',
+    'переулок': 'переулок',
+    'ш': 'шоссе',
+    'шоссе': 'шоссе',
+    'б-р': 'бульвар',
+    'бул': 'бульвар',
+    'бульвар': 'бульвар',
+    'пл': 'площадь',
+    'площадь': 'площадь',
+    'наб': 'набережная',
+    'набережная': 'набережная',
+    'пр-д': 'проезд',
+    'проезд': 'проезд',
+    'туп': 'тупик',
+    'тупик': 'тупик',
+    'мкр': 'микрорайон',
+    'микрорайон': 'микрорайон',
+    'г': 'город',
+    'город': 'город',
+    'д': 'дом',
+    'дом': 'дом',
+    'к': 'корпус',
+    'корп': 'корпус',
+    'корпус': 'корпус',
+    'стр': 'строение',
+    'строение': 'строение',
+}
+# words which are implied when omitted, so they do not tell addresses apart
+IMPLIED_TOKENS = {'улица', 'город', 'дом', 'россия', 'рф'}
+
+TOKEN_SEPARATORS = re.compile(r'[\s,.;:()"«»/\\]+')
+HOUSE_NUMBER = re.compile(r'\d')
+
+
+def normalize_address(address: str) -> str:
+    address = address.lower().replace('ё', 'е')
+
+    words = []
+    numbers = []
+    for token in TOKEN_SEPARATORS.split(address):
+        token = STREET_TYPES.get(token.strip('-'), token.strip('-'))
+        if not token or token in IMPLIED_TOKENS:
+            continue
+        if HOUSE_NUMBER.search(token):
+            numbers.append(token)
+        else:
+            words.append(token)
+
+    return ' '.join(sorted(words) + numbers) or address.strip()
+
+
+def refresh_canonical_key(apps, schema_editor):
+    # "пр" is not expanded to "проспект" any more
+    Address = apps.get_model('coordinates_keeper', 'Address')
+    addresses = list(Address.objects.all())
+    for address in addresses:
+        address.canonical_key = normalize_address(address.name)
+    Address.objects.bulk_update(addresses, ['canonical_key'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coordinates_keeper', '0009_alter_address_name'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='address',
+            name='canonical_key',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=200, verbose_name='нормализованный адрес'),
+        ),
+        migrations.RunPython(refresh_canonical_key,
+                             migrations.RunPython.noop),
+    ]
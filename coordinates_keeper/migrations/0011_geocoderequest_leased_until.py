@@ -0,0 +1,18 @@
+# Generated by Django 3.2 on 2026-10-18 03:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coordinates_keeper', '0010_refresh_address_canonical_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='geocoderequest',
+            name='leased_until',
+            field=models.DateTimeField(blank=True, db_index=True, null=True, verbose_name='занят воркером до'),
+        ),
+    ]
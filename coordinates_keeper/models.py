@@ -1,12 +1,51 @@
+from datetime import timedelta
+
+from django.conf import settings
 from django.db import models
+from django.utils import timezone
+
+from .normalization import normalize_address
+
+
+class AddressQuerySet(models.QuerySet):
+    def due_for_geocoding(self, now=None):
+        """Addresses to be geocoded by the background worker.
+
+        These are never geocoded ones, failed ones whose retry time has come
+        and geocoded ones older than GEOCODER_REFRESH_DAYS. Addresses taken
+        by a worker have `retry_after` set to the end of its lease.
+        """
+        now = now or timezone.now()
+        refresh_before = now - timedelta(days=settings.GEOCODER_REFRESH_DAYS)
+        return self.filter(
+            models.Q(geocode_status=Address.GeocodeStatus.PENDING,
+                     retry_after__isnull=True) |
+            models.Q(retry_after__lte=now) |
+            models.Q(geocode_status=Address.GeocodeStatus.FOUND,
+                     retry_after__isnull=True,
+                     update_ts__lt=refresh_before)
+        )
 
 
 class Address(models.Model):
+    class GeocodeStatus(models.TextChoices):
+        PENDING = 'pending', 'Не геокодирован'
+        FOUND = 'found', 'Найден'
+        NOT_FOUND = 'not_found', 'Не найден'
+        FAILED = 'failed', 'Ошибка геокодера'
+
     name = models.CharField(
         'адрес',
-        max_length=100,
+        max_length=200,
         unique=True,
     )
+    canonical_key = models.CharField(
+        'нормализованный адрес',
+        max_length=200,
+        db_index=True,
+        blank=True,
+        editable=False,
+    )
     lat = models.FloatField('Широта',
                             blank=True,
                             null=True,
@@ -20,6 +59,25 @@ class Address(models.Model):
                                      db_index=True,
                                      verbose_name='изменён в',
                                      )
+    geocode_status = models.CharField(
+        'статус геокодирования',
+        max_length=20,
+        choices=GeocodeStatus.choices,
+        default=GeocodeStatus.PENDING,
+        db_index=True,
+    )
+    geocode_attempts = models.PositiveSmallIntegerField(
+        'неудачных попыток подряд',
+        default=0,
+    )
+    retry_after = models.DateTimeField(
+        'повторить после',
+        blank=True,
+        null=True,
+        db_index=True,
+    )
+
+    objects = AddressQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'адрес'
@@ -27,3 +85,73 @@ class Address(models.Model):
 
     def __str__(self):
         return f'{self.name} {self.lat} {self.long}'
+
+    def save(self, *args, **kwargs):
+        self.canonical_key = normalize_address(self.name)
+        if self.geocode_status == self.GeocodeStatus.PENDING and \
+                self.lat is not None and self.long is not None:
+            self.geocode_status = self.GeocodeStatus.FOUND
+        super().save(*args, **kwargs)
+
+
+class GeocodeRequest(models.Model):
+    name = models.CharField(
+        'адрес',
+        max_length=200,
+        unique=True,
+    )
+    created_at = models.DateTimeField('создан в',
+                                      default=timezone.now,
+                                      db_index=True,
+                                      )
+    leased_until = models.DateTimeField('занят воркером до',
+                                        blank=True,
+                                        null=True,
+                                        db_index=True,
+                                        )
+
+    class Meta:
+        verbose_name = 'запрос геокодирования'
+        verbose_name_plural = 'очередь геокодирования'
+
+    def __str__(self):
+        return self.name
+
+
+class AddressDistanceQuerySet(models.QuerySet):
+    def involving(self, addresses):
+        return self.filter(
+            models.Q(address_from__in=addresses) |
+            models.Q(address_to__in=addresses)
+        )
+
+
+class AddressDistance(models.Model):
+    address_from = models.ForeignKey(Address,
+                                     related_name='+',
+                                     on_delete=models.CASCADE,
+                                     verbose_name='откуда',
+                                     )
+    address_to = models.ForeignKey(Address,
+                                   related_name='+',
+                                   on_delete=models.CASCADE,
+                                   verbose_name='куда',
+                                   )
+    ellipsoidal = models.BooleanField('по эллипсоиду', default=False)
+    kilometers = models.FloatField('расстояние, км')
+
+    objects = AddressDistanceQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'расстояние'
+        verbose_name_plural = 'расстояния'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['address_from', 'address_to', 'ellipsoidal'],
+                name='unique_address_distance',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.address_from_id} - {self.address_to_id} ' \
+               f'{self.kilometers} km'
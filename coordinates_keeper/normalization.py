@@ -0,0 +1,65 @@
+import re
+
+STREET_TYPES = {
+    'ул': 'улица',
+    'улица': 'улица',
+    'пр-т': 'проспект',
+    'просп': 'проспект',
+    'проспект': 'проспект',
+    'пер': 'переулок',
+    'переулок': 'переулок',
+    'ш': 'шоссе',
+    'шоссе': 'шоссе',
+    'б-р': 'бульвар',
+    'бул': 'бульвар',
+    'бульвар': 'бульвар',
+    'пл': 'площадь',
+    'площадь': 'площадь',
+    'наб': 'набережная',
+    'набережная': 'набережная',
+    'пр-д': 'проезд',
+    'проезд': 'проезд',
+    'туп': 'тупик',
+    'тупик': 'тупик',
+    'мкр': 'микрорайон',
+    'микрорайон': 'микрорайон',
+    'г': 'город',
+    'город': 'город',
+    'д': 'дом',
+    'дом': 'дом',
+    'к': 'корпус',
+    'корп': 'корпус',
+    'корпус': 'корпус',
+    'стр': 'строение',
+    'строение': 'строение',
+}
+# words which are implied when omitted, so they do not tell addresses apart
+IMPLIED_TOKENS = {'улица', 'город', 'дом', 'россия', 'рф'}
+
+TOKEN_SEPARATORS = re.compile(r'[\s,.;:()"«»/\\]+')
+HOUSE_NUMBER = re.compile(r'\d')
+
+
+def normalize_address(address: str) -> str:
+    """Turn a Russian street address into its canonical key.
+
+    Punctuation and extra spaces are dropped, street types abbreviations
+    are expanded and implied words like "улица" are removed. Words are
+    sorted, so "Москва, Тверская 1" and "Тверская ул., 1, Москва" share
+    the key, while numbers keep their order to tell "1 Мая 10" from
+    "10 Мая 1".
+    """
+    address = address.lower().replace('ё', 'е')
+
+    words = []
+    numbers = []
+    for token in TOKEN_SEPARATORS.split(address):
+        token = STREET_TYPES.get(token.strip('-'), token.strip('-'))
+        if not token or token in IMPLIED_TOKENS:
+            continue
+        if HOUSE_NUMBER.search(token):
+            numbers.append(token)
+        else:
+            words.append(token)
+
+    return ' '.join(sorted(words) + numbers) or address.strip()
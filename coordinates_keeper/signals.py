@@ -0,0 +1,23 @@
+from django.core.signals import setting_changed
+from django.db.models.signals import post_save
+from django.dispatch import Signal, receiver
+
+from .geocoder import get_geocoder
+from .models import Address, AddressDistance
+
+# sent with `names` of addresses which got coordinates in bulk, since
+# bulk_create does not send post_save
+addresses_geocoded = Signal()
+
+
+@receiver(post_save, sender=Address)
+def forget_distances(instance, created, **kwargs):
+    # coordinates may have been changed, so cached distances are outdated
+    if not created:
+        AddressDistance.objects.involving([instance.pk]).delete()
+
+
+@receiver(setting_changed)
+def reset_geocoder(setting, **kwargs):
+    if setting.startswith('GEOCODER_') or setting == 'YANDEX_MAP_API_KEY':
+        get_geocoder.cache_clear()
@@ -0,0 +1,159 @@
+import heapq
+import threading
+import time
+import uuid
+from typing import Callable, Hashable, Iterable
+
+import numpy as np
+from django.core.cache import cache
+from geopy import distance
+
+LEAF_SIZE = 8
+
+
+class SpatialIndex:
+    """KD-tree over points on the Earth surface.
+
+    Points are kept as unit vectors, so the straight line (chord) distance
+    between them grows together with the great circle one and the tree can
+    prune whole branches by a single coordinate.
+    """
+
+    def __init__(self, points: Iterable[tuple[Hashable, float, float]]):
+        self._keys = []
+        coords = []
+        for key, lat, long in points:
+            self._keys.append(key)
+            coords.append((lat, long))
+        self._key_set = set(self._keys)
+        self._points = _to_unit_vectors(coords)
+        self._root = self._build(np.arange(len(self._keys)))
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, key):
+        return key in self._key_set
+
+    def nearest(self, lat: float, long: float,
+                k: int | None = None,
+                radius_km: float | None = None,
+                keys=None) -> list[tuple[Hashable, float]]:
+        """Find `k` nearest points within `radius_km` from the target.
+
+        Only points with `keys` are looked for if the argument is set.
+        Returns `(key, kilometers)` pairs, nearest first. Kilometers are
+        great circle ones, the same as `distance_matrix` gives by default.
+        """
+        target = _to_unit_vectors([(lat, long)])[0]
+        k = len(self._keys) if k is None else k
+        max_chord = np.inf if radius_km is None else _km_to_chord(radius_km)
+        # max-heap of the best points found so far, by negated chord
+        found = []
+
+        def search_bound():
+            if len(found) < k:
+                return max_chord
+            return min(max_chord, -found[0][0])
+
+        def visit(node):
+            if isinstance(node, np.ndarray):
+                chords = np.linalg.norm(self._points[node] - target, axis=1)
+                for position, chord in zip(node, chords):
+                    if chord > search_bound():
+                        continue
+                    if keys is not None and self._keys[position] not in keys:
+                        continue
+                    heapq.heappush(found, (-chord, -position))
+                    if len(found) > k:
+                        heapq.heappop(found)
+                return
+
+            axis, split, below, above = node
+            offset = target[axis] - split
+            near, far = (below, above) if offset < 0 else (above, below)
+            visit(near)
+            if abs(offset) <= search_bound():
+                visit(far)
+
+        if k > 0 and self._keys:
+            visit(self._root)
+
+        return [
+            (self._keys[-position], _chord_to_km(-chord))
+            for chord, position in sorted(found, reverse=True)
+        ]
+
+    def _build(self, positions: np.ndarray):
+        if len(positions) <= LEAF_SIZE:
+            return positions
+
+        points = self._points[positions]
+        axis = int(np.argmax(points.max(axis=0) - points.min(axis=0)))
+        order = np.argsort(points[:, axis], kind='stable')
+        median = len(positions) // 2
+        split = points[order[median], axis]
+        return (
+            axis,
+            split,
+            self._build(positions[order[:median]]),
+            self._build(positions[order[median:]]),
+        )
+
+
+class CachedIndex:
+    """Spatial index kept in process memory until invalidated.
+
+    The version is kept in Django cache, so with a shared cache every
+    worker rebuilds its own copy on the next call after a change. A cache
+    in process memory reaches only the worker which made the change, the
+    others rebuild their copies once they are older than `max_age` seconds.
+    """
+
+    def __init__(self, name: str,
+                 build: Callable[[], Iterable[tuple[Hashable, float, float]]],
+                 max_age: float | None = None):
+        self._version_key = f'coordinates_keeper:index:{name}:version'
+        self._build = build
+        self._max_age = max_age
+        self._lock = threading.Lock()
+        self._version = None
+        self._built_at = None
+        self._index = None
+
+    def get(self) -> SpatialIndex:
+        version = cache.get(self._version_key)
+        if version is None:
+            cache.add(self._version_key, uuid.uuid4().hex, timeout=None)
+            version = cache.get(self._version_key)
+
+        with self._lock:
+            expired = self._max_age is not None and \
+                self._built_at is not None and \
+                time.monotonic() - self._built_at > self._max_age
+            if version != self._version or expired:
+                self._index = SpatialIndex(self._build())
+                self._version = version
+                self._built_at = time.monotonic()
+            return self._index
+
+    def invalidate(self):
+        cache.set(self._version_key, uuid.uuid4().hex, timeout=None)
+
+
+def _to_unit_vectors(coords) -> np.ndarray:
+    lat, long = np.radians(np.array(coords, dtype=float).reshape(-1, 2)).T
+    return np.stack([
+        np.cos(lat) * np.cos(long),
+        np.cos(lat) * np.sin(long),
+        np.sin(lat),
+    ], axis=1)
+
+
+def _km_to_chord(kilometers: float) -> float:
+    angle = min(kilometers / distance.EARTH_RADIUS, np.pi)
+    return 2 * np.sin(angle / 2)
+
+
+def _chord_to_km(chord: float) -> float:
+    return float(2 * np.arcsin(min(chord / 2, 1)) * distance.EARTH_RADIUS)
@@ -1,3 +1,623 @@
-from django.test import TestCase
+import math
+import random
+import tempfile
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from geopy import distance
+from requests import ConnectionError, HTTPError, Timeout
+
+from foodcartapp.models import Order, Restaurant
+
+from . import distance_calc
+from .distance_calc import Distance, distance_matrix, prepare_lookup
+from .geocoder import (CircuitBreaker, GeocoderResponseError,
+                       GeocoderUnavailable, OfflineGeocoder, YandexGeocoder,
+                       get_geocoder)
+from .geocode_queue import (enqueue_addresses, process_queue_batch,
+                            refresh_addresses_batch)
+from .models import Address, AddressDistance, GeocodeRequest
+from .normalization import normalize_address
+from .spatial_index import CachedIndex, SpatialIndex
+
+RED_SQUARE = (55.753930, 37.620795)
+VDNH = (55.826296, 37.637760)
+PULKOVO = (59.800292, 30.262503)
+
+
+class DistanceMatrixTest(SimpleTestCase):
+    def test_haversine_matches_great_circle(self):
+        kilometers = distance_matrix([RED_SQUARE, VDNH], [VDNH, PULKOVO])
+        self.assertEqual(kilometers.shape, (2, 2))
+        for row, origin in enumerate([RED_SQUARE, VDNH]):
+            for column, destination in enumerate([VDNH, PULKOVO]):
+                self.assertAlmostEqual(
+                    kilometers[row, column],
+                    distance.great_circle(origin, destination).kilometers,
+                    places=6,
+                )
+
+    def test_ellipsoidal_close_to_geodesic(self):
+        kilometers = distance_matrix([RED_SQUARE], [VDNH, PULKOVO],
+                                     ellipsoidal=True)
+        for column, destination in enumerate([VDNH, PULKOVO]):
+            self.assertAlmostEqual(
+                kilometers[0, column],
+                distance.geodesic(RED_SQUARE, destination).kilometers,
+                delta=0.01,
+            )
+
+    def test_same_point(self):
+        for ellipsoidal in (False, True):
+            with self.subTest(ellipsoidal=ellipsoidal):
+                kilometers = distance_matrix([RED_SQUARE], [RED_SQUARE],
+                                             ellipsoidal=ellipsoidal)
+                self.assertEqual(kilometers[0, 0], 0)
+
+    def test_unknown_coordinates(self):
+        kilometers = distance_matrix([RED_SQUARE, (None, None)],
+                                     [VDNH, (None, None)])
+        self.assertFalse(math.isnan(kilometers[0, 0]))
+        self.assertTrue(math.isnan(kilometers[0, 1]))
+        self.assertTrue(math.isnan(kilometers[1, 0]))
+        self.assertTrue(math.isnan(kilometers[1, 1]))
+
+    def test_empty(self):
+        self.assertEqual(distance_matrix([], [VDNH]).shape, (0, 1))
+
+
+class SpatialIndexTest(SimpleTestCase):
+    def setUp(self) -> None:
+        rnd = random.Random(42)
+        self.points = [
+            (number, 55.5 + rnd.random(), 37.2 + rnd.random())
+            for number in range(300)
+        ]
+        self.index = SpatialIndex(self.points)
+        self.target = (55.75, 37.62)
+
+    def brute_force(self, keys=None):
+        kilometers = distance_matrix(
+            [self.target],
+            [(lat, long) for _, lat, long in self.points],
+        )[0]
+        found = sorted(zip(kilometers, (key for key, *_ in self.points)))
+        return [(key, km) for km, key in found
+                if keys is None or key in keys]
+
+    def assertSameNearest(self, nearest, expected):
+        self.assertEqual([key for key, _ in nearest],
+                         [key for key, _ in expected])
+        for (_, km), (_, expected_km) in zip(nearest, expected):
+            self.assertAlmostEqual(km, expected_km, places=6)
+
+    def test_k_nearest(self):
+        self.assertSameNearest(self.index.nearest(*self.target, k=5),
+                               self.brute_force()[:5])
+
+    def test_all_points(self):
+        self.assertSameNearest(self.index.nearest(*self.target),
+                               self.brute_force())
+
+    def test_radius(self):
+        expected = [(key, km) for key, km in self.brute_force() if km <= 10]
+        self.assertSameNearest(self.index.nearest(*self.target, radius_km=10),
+                               expected)
+
+    def test_keys(self):
+        keys = set(range(0, 300, 7))
+        self.assertSameNearest(
+            self.index.nearest(*self.target, k=3, keys=keys),
+            self.brute_force(keys)[:3],
+        )
+
+    def test_empty_index(self):
+        self.assertEqual(SpatialIndex([]).nearest(*self.target), [])
+
+
+class CachedIndexTest(SimpleTestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        self.build = mock.Mock(return_value=[(1, *VDNH)])
+
+    def test_rebuilt_after_invalidation(self):
+        index = CachedIndex('test', build=self.build)
+        index.get()
+        index.get()
+        self.assertEqual(self.build.call_count, 1)
+
+        index.invalidate()
+        self.assertIn(1, index.get())
+        self.assertEqual(self.build.call_count, 2)
+
+    def test_rebuilt_when_too_old(self):
+        index = CachedIndex('test', build=self.build, max_age=60)
+        with mock.patch('time.monotonic', side_effect=[0, 30, 61, 61]):
+            index.get()
+            index.get()
+            self.assertEqual(self.build.call_count, 1)
+            index.get()
+            self.assertEqual(self.build.call_count, 2)
+
+
+def geocoder_response(*points):
+    response = mock.Mock(status_code=200)
+    response.json.return_value = {'response': {'GeoObjectCollection': {
+        'featureMember': [
+            {'GeoObject': {'Point': {'pos': f'{long} {lat}'}}}
+            for lat, long in points
+        ],
+    }}}
+    return response
+
+
+class YandexGeocoderTest(SimpleTestCase):
+    def setUp(self) -> None:
+        self.geocoder = YandexGeocoder(api_key='key',
+                                       rate_limit=1000,
+                                       burst=10,
+                                       failure_threshold=2,
+                                       cooldown=60,
+                                       )
+        self.session_get = mock.patch.object(self.geocoder.session,
+                                             'get').start()
+        self.addCleanup(mock.patch.stopall)
+
+    def test_found_and_not_found(self):
+        self.session_get.side_effect = [geocoder_response(RED_SQUARE),
+                                        geocoder_response()]
+        self.assertEqual(self.geocoder.fetch_coordinates('красная площадь'),
+                         (RED_SQUARE[1], RED_SQUARE[0]))
+        self.assertEqual(self.geocoder.fetch_coordinates('нигде'),
+                         (None, None))
+        self.assertEqual(self.session_get.call_args.kwargs['timeout'],
+                         (2.0, 3.0))
+
+        stats = self.geocoder.stats()
+        self.assertEqual((stats['requests'], stats['found'],
+                          stats['not_found']), (2, 1, 1))
+
+    def test_circuit_opens_after_failures(self):
+        self.session_get.side_effect = ConnectionError
+        for _ in range(2):
+            with self.assertRaises(ConnectionError):
+                self.geocoder.fetch_coordinates('красная площадь')
+
+        with self.assertRaises(GeocoderUnavailable):
+            self.geocoder.fetch_coordinates('красная площадь')
+        self.assertEqual(self.session_get.call_count, 2)
+        stats = self.geocoder.stats()
+        self.assertEqual(stats['circuit'], CircuitBreaker.OPEN)
+        self.assertEqual(stats['rejected'], 1)
+
+    def test_half_open_circuit(self):
+        breaker = CircuitBreaker(failure_threshold=1, cooldown=0)
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+
+        self.assertTrue(breaker.allow())
+        # only one trial call at a time
+        self.assertFalse(breaker.allow())
+        breaker.record_success()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+    def test_half_open_trial_with_malformed_payload(self):
+        self.geocoder.breaker.cooldown = 0
+        self.session_get.side_effect = ConnectionError
+        for _ in range(2):
+            with self.assertRaises(ConnectionError):
+                self.geocoder.fetch_coordinates('красная площадь')
+        self.assertEqual(self.geocoder.breaker.state,
+                         CircuitBreaker.HALF_OPEN)
+
+        response = geocoder_response()
+        response.json.return_value = {'error': 'unexpected'}
+        self.session_get.side_effect = None
+        self.session_get.return_value = response
+        with self.assertRaises(GeocoderResponseError):
+            self.geocoder.fetch_coordinates('красная площадь')
+
+        # the failed trial has been finished, so the next one is let through
+        self.session_get.return_value = geocoder_response(RED_SQUARE)
+        self.assertEqual(self.geocoder.fetch_coordinates('красная площадь'),
+                         (RED_SQUARE[1], RED_SQUARE[0]))
+        self.assertEqual(self.geocoder.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_client_errors_do_not_open_circuit(self):
+        response = geocoder_response()
+        response.status_code = 403
+        response.raise_for_status.side_effect = HTTPError(response=response)
+        self.session_get.return_value = response
+        for _ in range(3):
+            with self.assertRaises(HTTPError):
+                self.geocoder.fetch_coordinates('красная площадь')
+
+        stats = self.geocoder.stats()
+        self.assertEqual(stats['circuit'], CircuitBreaker.CLOSED)
+        self.assertEqual(stats['failures'], 3)
+
+    def test_rate_limit(self):
+        self.geocoder.rate_limiter.rate = 0.001
+        self.geocoder.max_wait = 0
+        self.session_get.return_value = geocoder_response(RED_SQUARE)
+        for _ in range(10):
+            self.geocoder.fetch_coordinates('красная площадь')
+
+        with self.assertRaises(GeocoderUnavailable):
+            self.geocoder.fetch_coordinates('красная площадь')
+        self.assertEqual(self.geocoder.stats()['throttled'], 1)
+        self.assertEqual(self.geocoder.stats()['circuit'],
+                         CircuitBreaker.CLOSED)
+
+
+class OfflineGeocoderTest(SimpleTestCase):
+    def test_hashed_coordinates(self):
+        geocoder = OfflineGeocoder()
+        long, lat = geocoder.fetch_coordinates('Москва, Тверская ул., 1')
+
+        self.assertEqual(geocoder.fetch_coordinates('тверская 1 москва'),
+                         (long, lat))
+        self.assertNotEqual(geocoder.fetch_coordinates('тверская 2 москва'),
+                            (long, lat))
+        min_lat, min_long, max_lat, max_long = geocoder.bbox
+        self.assertTrue(min_lat <= lat <= max_lat)
+        self.assertTrue(min_long <= long <= max_long)
+
+    def test_gazetteer(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv') as gazetteer:
+            gazetteer.write('address,lat,long\n'
+                            f'"Москва, ВДНХ",{VDNH[0]},{VDNH[1]}\n')
+            gazetteer.flush()
+            geocoder = OfflineGeocoder(gazetteer_path=gazetteer.name)
+
+        self.assertEqual(geocoder.fetch_coordinates('вднх москва'),
+                         (VDNH[1], VDNH[0]))
+
+    @override_settings(
+        GEOCODER_BACKEND='coordinates_keeper.geocoder.OfflineGeocoder',
+    )
+    def test_backend_from_settings(self):
+        self.assertIsInstance(get_geocoder(), OfflineGeocoder)
+
+
+class NormalizeAddressTest(SimpleTestCase):
+    def test_same_address_spellings(self):
+        spellings = (
+            'Москва, ул. Тверская, д. 1',
+            'москва тверская 1',
+            'Тверская улица, 1, г. Москва',
+            '  МОСКВА,   Тверская ул.,  дом 1 ',
+        )
+        keys = {normalize_address(address) for address in spellings}
+        self.assertEqual(keys, {'москва тверская 1'})
+
+    def test_street_types(self):
+        self.assertEqual(normalize_address('Ленинский пр-т, 5'),
+                         normalize_address('Ленинский проспект 5'))
+        self.assertNotEqual(normalize_address('Ленинский проспект 5'),
+                            normalize_address('Ленинская улица 5'))
+        # "пр" may be both "проспект" and "проезд"
+        self.assertNotEqual(normalize_address('Кутузовский пр 5'),
+                            normalize_address('Кутузовский проспект 5'))
+
+    def test_numbers_keep_order(self):
+        self.assertNotEqual(normalize_address('Тверская 1, корп. 2'),
+                            normalize_address('Тверская 2, корп. 1'))
+
+
+@mock.patch('coordinates_keeper.distance_calc.fetch_coordinates',
+            return_value=(37.620795, 55.753930))
+class GeocodeQueueTest(TestCase):
+    def test_lookup_without_fetching(self, fetch_coordinates):
+        address_lookup = prepare_lookup(['Красная площадь'],
+                                        fetch_missing=False)
+
+        self.assertIsNone(address_lookup['красная площадь']['lat'])
+        self.assertTrue(
+            GeocodeRequest.objects.filter(name='красная площадь').exists()
+        )
+        fetch_coordinates.assert_not_called()
+
+    def test_canonical_key_follows_name(self, fetch_coordinates):
+        address = Address.objects.create(name='тверская 1',
+                                         canonical_key='арбат 1',
+                                         )
+        self.assertEqual(address.canonical_key, 'тверская 1')
+
+        address.name = 'Тверская ул., 2'
+        address.save()
+        address.refresh_from_db()
+        self.assertEqual(address.canonical_key, 'тверская 2')
+
+    def test_known_address_is_not_queued(self, fetch_coordinates):
+        Address.objects.create(name='красная площадь')
+        enqueue_addresses(['Красная площадь', 'ВДНХ', 'вднх'])
+
+        self.assertCountEqual(
+            GeocodeRequest.objects.values_list('name', flat=True),
+            ['вднх'],
+        )
+
+    def test_queue_draining(self, fetch_coordinates):
+        enqueue_addresses(['Красная площадь', 'ВДНХ'])
+        call_command('process_geocode_queue', batch_size=1,
+                     stdout=mock.Mock())
+
+        self.assertFalse(GeocodeRequest.objects.exists())
+        address = Address.objects.get(name='вднх')
+        self.assertEqual((address.lat, address.long), RED_SQUARE)
+
+    def test_geocoding_outside_of_transaction(self, fetch_coordinates):
+        enqueue_addresses(['Красная площадь'])
+        # the test itself runs in transactions
+        test_atomic_blocks = len(connection.savepoint_ids)
+
+        def fetch_many(addresses, **kwargs):
+            self.assertEqual(len(connection.savepoint_ids),
+                             test_atomic_blocks)
+            # other workers see the batch leased while it is geocoded
+            request = GeocodeRequest.objects.get()
+            self.assertGreater(request.leased_until, timezone.now())
+            self.assertEqual(process_queue_batch(batch_size=10), 0)
+            return {address: (RED_SQUARE[1], RED_SQUARE[0])
+                    for address in addresses}
+
+        with mock.patch.object(distance_calc, 'fetch_many_coordinates',
+                               side_effect=fetch_many):
+            self.assertEqual(process_queue_batch(batch_size=10), 1)
+        self.assertFalse(GeocodeRequest.objects.exists())
+        self.assertEqual(Address.objects.get().geocode_status,
+                         Address.GeocodeStatus.FOUND)
+
+    def test_refreshed_addresses_are_leased(self, fetch_coordinates):
+        Address.objects.create(name='красная площадь')
+
+        def fetch_many(addresses, **kwargs):
+            self.assertEqual(refresh_addresses_batch(batch_size=10), 0)
+            return {address: (RED_SQUARE[1], RED_SQUARE[0])
+                    for address in addresses}
+
+        with mock.patch.object(distance_calc, 'fetch_many_coordinates',
+                               side_effect=fetch_many):
+            self.assertEqual(refresh_addresses_batch(batch_size=10), 1)
+        address = Address.objects.get()
+        self.assertEqual(address.geocode_status, Address.GeocodeStatus.FOUND)
+        self.assertIsNone(address.retry_after)
+
+    def test_network_failure_is_retried_with_backoff(self,
+                                                     fetch_coordinates):
+        fetch_coordinates.side_effect = ConnectionError
+        enqueue_addresses(['Красная площадь'])
+        call_command('process_geocode_queue', stdout=mock.Mock())
+
+        self.assertFalse(GeocodeRequest.objects.exists())
+        address = Address.objects.get()
+        self.assertEqual(address.geocode_status, Address.GeocodeStatus.FAILED)
+        self.assertEqual(address.geocode_attempts, 1)
+        first_delay = address.retry_after - timezone.now()
+
+        # the worker does not touch the address before its retry time
+        call_command('process_geocode_queue', stdout=mock.Mock())
+        self.assertEqual(fetch_coordinates.call_count, 1)
+
+        Address.objects.update(retry_after=timezone.now())
+        call_command('process_geocode_queue', stdout=mock.Mock())
+        address.refresh_from_db()
+        self.assertEqual(address.geocode_attempts, 2)
+        self.assertGreater(address.retry_after - timezone.now(),
+                           first_delay * 1.5)
+
+        fetch_coordinates.side_effect = None
+        Address.objects.update(retry_after=timezone.now())
+        call_command('process_geocode_queue', stdout=mock.Mock())
+        address.refresh_from_db()
+        self.assertEqual(address.geocode_status, Address.GeocodeStatus.FOUND)
+        self.assertEqual((address.lat, address.long), RED_SQUARE)
+        self.assertIsNone(address.retry_after)
+
+    def test_board_does_not_wait_for_failing_address(self,
+                                                     fetch_coordinates):
+        Address.objects.create(name='красная площадь',
+                               geocode_status=Address.GeocodeStatus.NOT_FOUND,
+                               geocode_attempts=3,
+                               retry_after=timezone.now(),
+                               )
+        address_lookup = prepare_lookup(['Красная площадь'],
+                                        fetch_missing=False)
+
+        self.assertIsNone(address_lookup['красная площадь']['lat'])
+        self.assertFalse(GeocodeRequest.objects.exists())
+        fetch_coordinates.assert_not_called()
+
+    def test_old_addresses_are_refreshed(self, fetch_coordinates):
+        Address.objects.create(name='красная площадь', lat=0, long=0)
+        Address.objects.create(name='вднх', lat=0, long=0)
+        Address.objects.filter(name='вднх').update(
+            update_ts=timezone.now() - timedelta(days=365),
+        )
+        call_command('process_geocode_queue', stdout=mock.Mock())
+
+        self.assertCountEqual(
+            Address.objects.values_list('name', 'lat'),
+            [('красная площадь', 0), ('вднх', RED_SQUARE[0])],
+        )
+
+    def test_address_spelling_is_not_geocoded_again(self, fetch_coordinates):
+        Address.objects.create(name='москва, тверская 1', lat=55.7, long=37.6)
+        address_lookup = prepare_lookup(['Тверская ул., д. 1, Москва'])
+
+        self.assertEqual(address_lookup['москва тверская 1']['lat'], 55.7)
+        fetch_coordinates.assert_not_called()
+
+    def test_merge_duplicates(self, fetch_coordinates):
+        Address.objects.bulk_create([
+            Address(name='москва, тверская 1'),
+            Address(name='тверская ул. 1, москва', lat=55.7, long=37.6),
+            Address(name='вднх'),
+        ])
+        call_command('merge_duplicate_addresses', stdout=mock.Mock())
+
+        self.assertCountEqual(
+            Address.objects.values_list('name', 'canonical_key'),
+            [('тверская ул. 1, москва', 'москва тверская 1'),
+             ('вднх', 'вднх')],
+        )
+
+    def test_merge_keeps_restaurant_locations(self, fetch_coordinates):
+        duplicate = Address.objects.create(name='москва, тверская 1')
+        kept = Address.objects.create(name='тверская ул. 1, москва',
+                                      lat=55.7,
+                                      long=37.6,
+                                      )
+        restaurant = Restaurant.objects.create(name='Star Burger',
+                                               address='Тверская 1',
+                                               location=duplicate,
+                                               )
+        call_command('merge_duplicate_addresses', stdout=mock.Mock())
+
+        restaurant.refresh_from_db()
+        self.assertEqual(restaurant.location, kept)
+
+
+class ConcurrentGeocodingTest(TestCase):
+    def fetch(self, address):
+        if address in self.failures:
+            raise self.failures[address]
+        return VDNH[1], VDNH[0]
+
+    def setUp(self) -> None:
+        self.failures = {}
+        patcher = mock.patch('coordinates_keeper.distance_calc.'
+                             'fetch_coordinates', side_effect=self.fetch)
+        self.fetch_coordinates = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_duplicates_in_batch(self):
+        address_lookup = prepare_lookup(['ВДНХ', 'вднх', ' ВДНХ ',
+                                         'Москва, ул. Тверская, 1',
+                                         'москва тверская 1'])
+
+        self.assertEqual(self.fetch_coordinates.call_count, 2)
+        self.assertCountEqual(
+            Address.objects.values_list('canonical_key', flat=True),
+            ['вднх', 'москва тверская 1'],
+        )
+        self.assertEqual(address_lookup['вднх']['lat'], VDNH[0])
+
+    def test_address_created_meanwhile(self):
+        fetch_many_coordinates = distance_calc.fetch_many_coordinates
+
+        def fetch_and_create(addresses, **kwargs):
+            # another worker stores the same address while this one waits
+            # for the geocoder
+            Address.objects.create(name='вднх')
+            return fetch_many_coordinates(addresses, **kwargs)
+
+        with mock.patch.object(distance_calc, 'fetch_many_coordinates',
+                               side_effect=fetch_and_create):
+            prepare_lookup(['ВДНХ', 'Пулково'])
+
+        self.assertCountEqual(Address.objects.values_list('name', flat=True),
+                              ['вднх', 'пулково'])
+        self.assertEqual(Address.objects.get(name='пулково').lat, VDNH[0])
+
+    def test_unexpected_errors_do_not_lose_other_results(self):
+        self.failures['красная площадь'] = KeyError('response')
+        with self.assertLogs(level='ERROR'):
+            prepare_lookup(['Красная площадь', 'ВДНХ'])
+
+        self.assertEqual(
+            Address.objects.get(name='красная площадь').geocode_status,
+            Address.GeocodeStatus.FAILED,
+        )
+        self.assertEqual(Address.objects.get(name='вднх').geocode_status,
+                         Address.GeocodeStatus.FOUND)
+
+    def test_failed_workers_do_not_lose_other_results(self):
+        self.failures = {'красная площадь': ConnectionError(),
+                         'пулково': Timeout()}
+
+        address_lookup = prepare_lookup(['Красная площадь', 'ВДНХ',
+                                         'Пулково'])
+
+        self.assertEqual(address_lookup['вднх']['lat'], VDNH[0])
+        self.assertIsNone(address_lookup['пулково']['lat'])
+        self.assertCountEqual(
+            Address.objects.values_list('name', 'geocode_status', 'lat'),
+            [('красная площадь', Address.GeocodeStatus.FAILED, None),
+             ('вднх', Address.GeocodeStatus.FOUND, VDNH[0]),
+             ('пулково', Address.GeocodeStatus.FAILED, None)],
+        )
+
+
+@mock.patch('coordinates_keeper.distance_calc.fetch_coordinates',
+            return_value=(37.620795, 55.753930))
+class GeocodeAddressesCommandTest(TestCase):
+    def test_prewarm(self, fetch_coordinates):
+        Restaurant.objects.create(name='Star Burger', address='ВДНХ')
+        Address.objects.create(name='красная площадь', lat=0, long=0)
+        for address in ('Красная площадь', 'Москва, Тверская 1',
+                        'Тверская ул., 1, Москва', 'вднх'):
+            Order.objects.create(firstname='Иван',
+                                 lastname='Петров',
+                                 phonenumber='+79291000000',
+                                 address=address,
+                                 )
+
+        call_command('geocode_addresses', batch_size=2, stdout=mock.Mock())
+
+        self.assertCountEqual(
+            Address.objects.values_list('canonical_key', flat=True),
+            ['красная площадь', 'вднх', 'москва тверская 1'],
+        )
+        self.assertEqual(fetch_coordinates.call_count, 2)
+
+        # geocoded addresses are skipped on the next run
+        call_command('geocode_addresses', stdout=mock.Mock())
+        self.assertEqual(fetch_coordinates.call_count, 2)
+
+
+class DistanceCacheTest(TestCase):
+    def setUp(self) -> None:
+        for name, (lat, long) in (('красная площадь', RED_SQUARE),
+                                  ('вднх', VDNH),
+                                  ('пулково', PULKOVO)):
+            Address.objects.create(name=name, lat=lat, long=long)
+        Address.objects.create(name='неизвестно')
+        self.names = ['Красная площадь', 'ВДНХ', 'Пулково', 'Неизвестно']
+
+    def get_distances(self):
+        dist = Distance(address_lookup=prepare_lookup(self.names))
+        return dist.get_paired_distances(
+            ['Красная площадь', 'Красная площадь', 'ВДНХ', 'ВДНХ'],
+            ['ВДНХ', 'Пулково', 'Красная площадь', 'Неизвестно'],
+        )
+
+    def test_distances_are_cached(self):
+        kilometers = self.get_distances()
+        self.assertEqual(AddressDistance.objects.count(), 2)
+        self.assertEqual(kilometers[0], kilometers[2])
+        self.assertTrue(math.isnan(kilometers[3]))
+
+        dist = Distance(address_lookup=prepare_lookup(self.names))
+        with self.assertNumQueries(1):
+            cached_kilometers = dist.get_paired_distances(
+                ['Красная площадь', 'Красная площадь', 'ВДНХ'],
+                ['ВДНХ', 'Пулково', 'Красная площадь'],
+            )
+        self.assertEqual(list(cached_kilometers), list(kilometers[:3]))
+
+    def test_moved_address_is_forgotten(self):
+        self.get_distances()
+        address = Address.objects.get(name='пулково')
+        address.lat, address.long = VDNH
+        address.save()
+
+        self.assertEqual(AddressDistance.objects.count(), 1)
+        self.assertAlmostEqual(self.get_distances()[1],
+                               self.get_distances()[0])
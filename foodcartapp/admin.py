@@ -6,6 +6,8 @@ from django.utils.http import url_has_allowed_host_and_scheme
 from django.utils.encoding import iri_to_uri
 from django.shortcuts import redirect
 
+from coordinates_keeper.distance_calc import resolve_address
+
 from .models import Product
 from .models import ProductCategory
 from .models import Restaurant
@@ -30,10 +32,19 @@ class RestaurantAdmin(admin.ModelAdmin):
         'address',
         'contact_phone',
     ]
+    readonly_fields = [
+        'location',
+    ]
     inlines = [
         RestaurantMenuItemInline
     ]
 
+    def save_model(self, request, obj, form, change):
+        if obj.get_location() is None:
+            obj.location = resolve_address(obj.address) \
+                if obj.address else None
+        super().save_model(request, obj, form, change)
+
 
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
@@ -123,6 +134,9 @@ class OrderAdmin(admin.ModelAdmin):
     inlines = [
         OrderItemInline,
     ]
+    readonly_fields = [
+        'total_price',
+    ]
 
     def response_change(self, request, obj):
         res = super().response_change(request=request, obj=obj)
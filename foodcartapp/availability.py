@@ -0,0 +1,126 @@
+import random
+from typing import Iterable
+
+from django.core.cache import cache
+
+from .models import RestaurantMenuItem
+
+MATRIX_CACHE_KEY = 'foodcartapp:availability'
+GENERATION_CACHE_KEY = 'foodcartapp:availability:generation'
+# rebuild from time to time in case a change has been missed
+MATRIX_TIMEOUT = 60 * 60
+
+
+class AvailabilityMatrix:
+    """Which products restaurants have on sale.
+
+    Keeps an int bitset per product, bit number is the restaurant ordinal.
+    Restaurants which can cook a whole basket are found by AND-ing bitsets
+    of basket products.
+    """
+
+    def __init__(self):
+        self._restaurant_ids = []
+        self._ordinals = {}
+        self._product_masks = {}
+
+    @classmethod
+    def build(cls) -> 'AvailabilityMatrix':
+        matrix = cls()
+        menu_items = RestaurantMenuItem.objects \
+            .filter(availability=True) \
+            .order_by('restaurant_id') \
+            .values_list('restaurant_id', 'product_id')
+        for restaurant_id, product_id in menu_items:
+            matrix.set(restaurant_id, product_id, True)
+        return matrix
+
+    def set(self, restaurant_id: int, product_id: int, available: bool):
+        if restaurant_id not in self._ordinals:
+            if not available:
+                return
+            self._ordinals[restaurant_id] = len(self._restaurant_ids)
+            self._restaurant_ids.append(restaurant_id)
+
+        bit = 1 << self._ordinals[restaurant_id]
+        mask = self._product_masks.get(product_id, 0)
+        mask = mask | bit if available else mask & ~bit
+        if mask:
+            self._product_masks[product_id] = mask
+        else:
+            self._product_masks.pop(product_id, None)
+
+    def is_available(self, restaurant_id: int, product_id: int) -> bool:
+        if restaurant_id not in self._ordinals:
+            return False
+        bit = 1 << self._ordinals[restaurant_id]
+        return bool(self._product_masks.get(product_id, 0) & bit)
+
+    def get_product_availability(
+            self, product_id: int,
+            restaurant_ids: Iterable[int]) -> list[bool]:
+        return [self.is_available(restaurant_id, product_id)
+                for restaurant_id in restaurant_ids]
+
+    def get_restaurants_mask(self, product_ids: Iterable[int]) -> int:
+        """Bitset of restaurants having every product on sale."""
+        mask = (1 << len(self._restaurant_ids)) - 1
+        for product_id in product_ids:
+            mask &= self._product_masks.get(product_id, 0)
+        return mask
+
+    def get_restaurant_ids(self, mask: int) -> list[int]:
+        return [restaurant_id
+                for ordinal, restaurant_id in enumerate(self._restaurant_ids)
+                if mask >> ordinal & 1]
+
+
+def get_availability_matrix() -> AvailabilityMatrix:
+    """Matrix of the current menu, cached together with its generation.
+
+    A cached matrix is used only if no menu item has changed since, so
+    updates which have not been applied to it are never lost.
+    """
+    generation = get_generation()
+    cached = cache.get(MATRIX_CACHE_KEY)
+    if cached is not None and cached[0] == generation:
+        return cached[1]
+
+    # menu items saved meanwhile make the generation newer, so readers
+    # will not take this matrix and will build a fresher one
+    matrix = AvailabilityMatrix.build()
+    cache.set(MATRIX_CACHE_KEY, (generation, matrix), timeout=MATRIX_TIMEOUT)
+    return matrix
+
+
+def update_availability(restaurant_id: int, product_id: int,
+                        available: bool):
+    """Apply a menu item change to the cached matrix.
+
+    Each change gets its own generation and is applied only to the matrix
+    of the generation right before it. If the matrix has fallen behind,
+    e.g. because of a concurrent change, it is rebuilt on the next read.
+    """
+    try:
+        generation = cache.incr(GENERATION_CACHE_KEY)
+    except ValueError:
+        # no matrix can have a generation started after the change
+        get_generation()
+        return
+
+    cached = cache.get(MATRIX_CACHE_KEY)
+    if cached is None or cached[0] != generation - 1:
+        return
+    matrix = cached[1]
+    matrix.set(restaurant_id, product_id, available)
+    cache.set(MATRIX_CACHE_KEY, (generation, matrix), timeout=MATRIX_TIMEOUT)
+
+
+def get_generation() -> int:
+    generation = cache.get(GENERATION_CACHE_KEY)
+    if generation is None:
+        # a random start does not repeat generations of matrices cached
+        # before the counter was evicted
+        cache.add(GENERATION_CACHE_KEY, random.getrandbits(48), timeout=None)
+        generation = cache.get(GENERATION_CACHE_KEY)
+    return generation
@@ -0,0 +1,121 @@
+import gzip
+import hashlib
+import json
+import time
+import uuid
+from typing import NamedTuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import Product
+
+VERSION_CACHE_KEY = 'foodcartapp:catalogue:version'
+# cached tuples have Catalogue fields, the key is renamed when they change
+PAYLOAD_CACHE_KEY = 'foodcartapp:catalogue:{version}:payloads'
+ETAG_CACHE_KEY = 'foodcartapp:catalogue:{version}:etag'
+LOCK_CACHE_KEY = 'foodcartapp:catalogue:{version}:lock'
+LOCK_TIMEOUT = 30
+LOCK_POLL_INTERVAL = 0.05
+
+
+class Catalogue(NamedTuple):
+    payload: bytes
+    gzipped_payload: bytes
+    etag: str
+
+
+def build_catalogue() -> Catalogue:
+    products = Product.objects.select_related('category').available()
+
+    dumped_products = []
+    for product in products:
+        dumped_product = {
+            'id': product.id,
+            'name': product.name,
+            'price': product.price,
+            'special_status': product.special_status,
+            'description': product.description,
+            'category': {
+                'id': product.category.id,
+                'name': product.category.name,
+            },
+            'image': product.image.url,
+            'restaurant': {
+                'id': product.id,
+                'name': product.name,
+            }
+        }
+        dumped_products.append(dumped_product)
+
+    payload = json.dumps(dumped_products,
+                         cls=DjangoJSONEncoder,
+                         ensure_ascii=False,
+                         separators=(',', ':'),
+                         ).encode()
+    return Catalogue(
+        payload=payload,
+        gzipped_payload=gzip.compress(payload, mtime=0),
+        etag='"{}"'.format(hashlib.sha1(payload).hexdigest()),
+    )
+
+
+def get_catalogue() -> Catalogue:
+    """Take serialized catalogue from cache, build it on a cache miss.
+
+    Only the worker which got the lock rebuilds the catalogue, the others
+    wait for its result, so an invalidation does not cause a stampede.
+    """
+    version = _get_version()
+    payload_key = PAYLOAD_CACHE_KEY.format(version=version)
+    etag_key = ETAG_CACHE_KEY.format(version=version)
+    lock_key = LOCK_CACHE_KEY.format(version=version)
+
+    deadline = time.monotonic() + LOCK_TIMEOUT
+    while time.monotonic() < deadline:
+        catalogue = cache.get(payload_key)
+        if catalogue is not None:
+            return Catalogue(*catalogue)
+
+        if cache.add(lock_key, True, timeout=LOCK_TIMEOUT):
+            try:
+                catalogue = build_catalogue()
+                cache.set_many(
+                    {payload_key: tuple(catalogue),
+                     etag_key: catalogue.etag},
+                    timeout=settings.CATALOGUE_CACHE_TIMEOUT,
+                )
+            finally:
+                cache.delete(lock_key)
+            return catalogue
+
+        time.sleep(LOCK_POLL_INTERVAL)
+
+    return build_catalogue()
+
+
+def get_catalogue_etag() -> str | None:
+    """ETag of the cached catalogue, if any.
+
+    It is cached apart from the payload, so a conditional request is
+    answered without reading the whole catalogue from cache.
+    """
+    return cache.get(ETAG_CACHE_KEY.format(version=_get_version()))
+
+
+def invalidate_catalogue():
+    """Make cached catalogue outdated.
+
+    Catalogue is stored under a versioned key, so a payload being built
+    from outdated data right now will not be served after invalidation.
+    """
+    cache.set(VERSION_CACHE_KEY, uuid.uuid4().hex, timeout=None)
+
+
+def _get_version() -> str:
+    version = cache.get(VERSION_CACHE_KEY)
+    if version is None:
+        cache.add(VERSION_CACHE_KEY, uuid.uuid4().hex, timeout=None)
+        version = cache.get(VERSION_CACHE_KEY)
+    return version
@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    # invalidation only reaches the process which made the change
+    if settings.CACHES['default']['BACKEND'] not in PROCESS_LOCAL_CACHES:
+        return []
+    return [Warning(
+        'Cache is not shared between processes, so other workers serve '
+        'an outdated menu for up to CATALOGUE_CACHE_TIMEOUT seconds and '
+        'search nearest restaurants in an outdated index for up to '
+        'RESTAURANTS_INDEX_MAX_AGE seconds.',
+        hint='Set CACHE_URL to a shared cache such as Redis.',
+        id='foodcartapp.W001',
+    )]
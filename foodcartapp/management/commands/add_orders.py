@@ -21,7 +21,7 @@ class Command(BaseCommand):
                                          phonenumber=f'+7{i}031000000',
                                          )
             for product in choices(products, k=3):
-                OrderItem.objects.create(product_id=product,
+                OrderItem.objects.create(product=product,
                                          order=order,
                                          quantity=randint(1, 3),
                                          item_price=product.price,
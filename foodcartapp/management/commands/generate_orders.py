@@ -0,0 +1,79 @@
+import time
+from multiprocessing import Pool
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+
+from foodcartapp.models import Product, Restaurant
+from foodcartapp.order_generator import (build_catalogue, create_orders_batch,
+                                         create_orders_batch_in_worker,
+                                         get_batches, get_street_addresses,
+                                         init_worker, seed_addresses)
+
+
+class Command(BaseCommand):
+    help = 'Быстрое создание большого числа реалистичных заказов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('count', type=int, help='number of orders to add')
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='number of orders inserted at once')
+        parser.add_argument('--processes', type=int, default=1,
+                            help='number of worker processes')
+        parser.add_argument('--days', type=int, default=30,
+                            help='spread orders over the last days')
+        parser.add_argument('--seed', type=int, default=0,
+                            help='seed of the random generator')
+
+    def handle(self, *args, **options):
+        if options['days'] < 1:
+            raise CommandError('--days must be positive')
+        if options['processes'] > 1 and \
+                not connection.features.can_return_rows_from_bulk_insert:
+            # batches read their order ids back as the last ones, which
+            # concurrent batches would mix up
+            raise CommandError('--processes needs a database which returns '
+                               'ids of inserted rows, like PostgreSQL')
+        products = list(Product.objects.available().order_by('id'))
+        if not products:
+            raise CommandError('There are no available products, '
+                               'run add_burgers and add_menu_items first')
+        catalogue = build_catalogue(
+            products,
+            Restaurant.objects.values_list('id', flat=True),
+            days=options['days'],
+        )
+        seed_addresses(get_street_addresses())
+
+        batches = [
+            (catalogue, size, seed)
+            for size, seed in get_batches(options['count'],
+                                          options['batch_size'],
+                                          options['seed'])
+        ]
+        started_at = time.monotonic()
+        created = 0
+        if options['processes'] > 1:
+            connections.close_all()
+            with Pool(options['processes'], initializer=init_worker) as pool:
+                for batch_created in pool.imap_unordered(
+                        create_orders_batch_in_worker, batches):
+                    created += batch_created
+                    self.report_progress(created, options['count'],
+                                         started_at)
+        else:
+            for batch in batches:
+                created += create_orders_batch(*batch)
+                self.report_progress(created, options['count'], started_at)
+
+        self.stdout.write(
+            self.style.SUCCESS('Successfully added {} orders'.format(created))
+        )
+
+    def report_progress(self, created, total, started_at):
+        elapsed = time.monotonic() - started_at
+        self.stdout.write('{}/{} orders, {:.0f} orders/s'.format(
+            created,
+            total,
+            created / elapsed if elapsed else 0,
+        ))
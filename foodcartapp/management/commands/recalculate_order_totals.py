@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand
+
+from foodcartapp.models import Order
+
+
+class Command(BaseCommand):
+    help = 'Проверка и пересчёт сохранённой стоимости заказов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='number of orders checked at once')
+        parser.add_argument('--check', action='store_true',
+                            help='only report orders with a wrong total')
+
+    def handle(self, *args, **options):
+        checked = wrong = 0
+        last_id = 0
+        while True:
+            orders = list(
+                Order.objects
+                .filter(pk__gt=last_id)
+                .order_by('pk')
+                .with_calculated_total_price()[:options['batch_size']]
+            )
+            if not orders:
+                break
+            last_id = orders[-1].pk
+            checked += len(orders)
+
+            wrong_orders = [
+                order for order in orders
+                if order.total_price != order.calculated_total_price
+            ]
+            wrong += len(wrong_orders)
+            for order in wrong_orders:
+                self.stdout.write(
+                    'Order {}: stored {}, calculated {}'.format(
+                        order.pk,
+                        order.total_price,
+                        order.calculated_total_price,
+                    )
+                )
+                order.total_price = order.calculated_total_price
+
+            if not options['check']:
+                Order.objects.bulk_update(wrong_orders, ['total_price'])
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                'Checked {} orders, {} {} wrong total'.format(
+                    checked,
+                    wrong,
+                    'have' if options['check'] else 'fixed with',
+                )
+            )
+        )
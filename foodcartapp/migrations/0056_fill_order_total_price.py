@@ -0,0 +1,31 @@
+# Generated by Django 3.2 on 2026-10-18 02:37
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def fill_total_price(apps, schema_editor):
+    Order = apps.get_model('foodcartapp', 'Order')
+    OrderItem = apps.get_model('foodcartapp', 'OrderItem')
+    items_total_price = OrderItem.objects \
+        .filter(order=models.OuterRef('pk')) \
+        .values('order') \
+        .annotate(total_price=models.Sum(
+            models.F('item_price') * models.F('quantity')
+        )) \
+        .values('total_price')
+    Order.objects.update(total_price=Coalesce(
+        models.Subquery(items_total_price),
+        models.Value(0),
+        output_field=models.DecimalField(),
+    ))
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('foodcartapp', '0055_order_total_price'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_total_price, migrations.RunPython.noop),
+    ]
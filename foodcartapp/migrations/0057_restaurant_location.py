@@ -0,0 +1,101 @@
+# Generated by Django 3.2 on 2026-10-18 02:48
+
+import re
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# normalize_address as it was when the migration was written, the code
+# may change later while the migration has to give the same keys
+STREET_TYPES = {
+    'ул': 'улица',
+    'улица': 'улица',
+    'пр-т': 'проспект',
+    'просп': 'проспект',
+    'проспект': 'проспект',
+    'пер': 'переулок',
+    'переулок': 'переулок',
+    'ш': 'шоссе',
+    'шоссе': 'шоссе',
+    'б-р': 'бульвар',
+    'бул': 'бульвар',
+    'бульвар': 'бульвар',
+    'пл': 'площадь',
+    'площадь': 'площадь',
+    'наб': 'набережная',
+    'набережная': 'набережная',
+    'пр-д': 'проезд',
+    'проезд': 'проезд',
+    'туп': 'тупик',
+    'тупик': 'тупик',
+    'мкр': 'микрорайон',
+    'микрорайон': 'микрорайон',
+    'г': 'город',
+    'город': 'город',
+    'д': 'дом',
+    'дом': 'дом',
+    'к': 'корпус',
+    'корп': 'корпус',
+    'корпус': 'корпус',
+    'стр': 'строение',
+    'строение': 'строение',
+}
+# words which are implied when omitted, so they do not tell addresses apart
+IMPLIED_TOKENS = {'улица', 'город', 'дом', 'россия', 'рф'}
+
+TOKEN_SEPARATORS = re.compile(r'[\s,.;:()"«»/\\]+')
+HOUSE_NUMBER = re.compile(r'\d')
+
+
+def normalize_address(address: str) -> str:
+    address = address.lower().replace('ё', 'е')
+
+    words = []
+    numbers = []
+    for token in TOKEN_SEPARATORS.split(address):
+        token = STREET_TYPES.get(token.strip('-'), token.strip('-'))
+        if not token or token in IMPLIED_TOKENS:
+            continue
+        if HOUSE_NUMBER.search(token):
+            numbers.append(token)
+        else:
+            words.append(token)
+
+    return ' '.join(sorted(words) + numbers) or address.strip()
+
+
+def fill_restaurant_location(apps, schema_editor):
+    Restaurant = apps.get_model('foodcartapp', 'Restaurant')
+    Address = apps.get_model('coordinates_keeper', 'Address')
+    restaurants = list(Restaurant.objects.exclude(address=''))
+    locations = {}
+    for address in Address.objects.filter(
+        canonical_key__in=[normalize_address(restaurant.address)
+                           for restaurant in restaurants],
+    ):
+        known = locations.get(address.canonical_key)
+        if known is None or known.lat is None:
+            locations[address.canonical_key] = address
+    for restaurant in restaurants:
+        restaurant.location = locations.get(
+            normalize_address(restaurant.address),
+        )
+    Restaurant.objects.bulk_update(restaurants, ['location'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coordinates_keeper', '0010_refresh_address_canonical_key'),
+        ('foodcartapp', '0056_fill_order_total_price'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='restaurant',
+            name='location',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='restaurants', to='coordinates_keeper.address', verbose_name='координаты'),
+        ),
+        migrations.RunPython(fill_restaurant_location,
+                             migrations.RunPython.noop),
+    ]
@@ -1,13 +1,32 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
 from django.core.validators import MinValueValidator
 from django.db import models
-from django.db.models import OuterRef, Subquery, Count
+from django.db.models import OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from phonenumber_field.modelfields import PhoneNumberField
 
+from coordinates_keeper.normalization import normalize_address
+
 REGION_CODE = 'RU'
 REMOTENESS_ATTR_NAME = 'remoteness'
 
+# set while orders are deleted: their items go away by cascade, so totals
+# and change log of the orders need no update for every item
+orders_deletion = ContextVar('orders_deletion', default=False)
+
+
+@contextmanager
+def deleting_orders():
+    token = orders_deletion.set(True)
+    try:
+        yield
+    finally:
+        orders_deletion.reset(token)
+
 
 class Restaurant(models.Model):
     name = models.CharField(
@@ -24,6 +43,14 @@ class Restaurant(models.Model):
         max_length=50,
         blank=True,
     )
+    location = models.ForeignKey(
+        'coordinates_keeper.Address',
+        verbose_name='координаты',
+        related_name='restaurants',
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+    )
 
     class Meta:
         verbose_name = 'ресторан'
@@ -32,6 +59,17 @@ class Restaurant(models.Model):
     def __str__(self):
         return self.name
 
+    def get_location(self):
+        """Stored address of the restaurant.
+
+        Gives `None` if the address has not been resolved yet or has been
+        changed since then.
+        """
+        if self.location_id is None or \
+                self.location.canonical_key != normalize_address(self.address):
+            return None
+        return self.location
+
 
 class ProductQuerySet(models.QuerySet):
     def available(self):
@@ -131,14 +169,36 @@ class RestaurantMenuItem(models.Model):
 
 
 class OrderCustomQuerySet(models.QuerySet):
+    def delete(self):
+        with deleting_orders():
+            return super().delete()
+
     def new(self):
         return self.filter(order_status=Order.OrderStatus.NEW)
 
-    def total_price(self):
-        return self.annotate(total_price=models.Sum(
-            models.F('items__item_price') * models.F('items__quantity')
-        )
-        )
+    def with_calculated_total_price(self):
+        return self.annotate(calculated_total_price=Coalesce(
+            models.Sum(
+                models.F('items__item_price') * models.F('items__quantity')
+            ),
+            models.Value(0),
+            output_field=models.DecimalField(),
+        ))
+
+    def recalculate_total_price(self):
+        items_total_price = OrderItem.objects \
+            .filter(order=OuterRef('pk')) \
+            .values('order') \
+            .annotate(total_price=models.Sum(
+                models.F('item_price') * models.F('quantity')
+            )) \
+            .values('total_price')
+        return self.update(total_price=Coalesce(
+            Subquery(items_total_price),
+            models.Value(0),
+            output_field=models.DecimalField(),
+        ))
+
 
 class Order(models.Model):
     class OrderStatus(models.TextChoices):
@@ -187,6 +247,12 @@ class Order(models.Model):
         default=PaymentMethod.UNKNOWN,
     )
     comment = models.TextField('комментарий', blank=True)
+    total_price = models.DecimalField('стоимость заказа',
+                                      max_digits=10,
+                                      decimal_places=2,
+                                      default=0,
+                                      editable=False,
+                                      )
     restaurant = models.ForeignKey('Restaurant',
                                    related_name='orders',
                                    on_delete=models.SET_NULL,
@@ -204,6 +270,10 @@ class Order(models.Model):
     def __str__(self):
         return f'{self.firstname} {self.lastname} {self.address}'
 
+    def delete(self, *args, **kwargs):
+        with deleting_orders():
+            return super().delete(*args, **kwargs)
+
     @property
     def client_full_name(self):
         return f'{self.firstname} {self.lastname}'
@@ -0,0 +1,217 @@
+import random
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import NamedTuple
+
+import django
+from django.db import connection, connections, transaction
+from django.utils import timezone
+
+from coordinates_keeper.models import Address
+from coordinates_keeper.normalization import normalize_address
+
+from .models import Order, OrderItem, RestaurantMenuItem
+
+# real Moscow streets with approximate coordinates of their middle
+MOSCOW_STREETS = (
+    ('Тверская улица', 55.7650, 37.6050),
+    ('Новый Арбат', 55.7525, 37.5890),
+    ('Ленинский проспект', 55.6960, 37.5650),
+    ('Кутузовский проспект', 55.7400, 37.5300),
+    ('проспект Мира', 55.7950, 37.6350),
+    ('Профсоюзная улица', 55.6600, 37.5500),
+    ('Ленинградский проспект', 55.7900, 37.5350),
+    ('Мясницкая улица', 55.7620, 37.6350),
+    ('Варшавское шоссе', 55.6500, 37.6200),
+    ('Большая Якиманка', 55.7350, 37.6130),
+    ('Покровка', 55.7590, 37.6470),
+    ('Первомайская улица', 55.7950, 37.7900),
+    ('Дмитровское шоссе', 55.8500, 37.5700),
+    ('Каширское шоссе', 55.6500, 37.6700),
+    ('Нахимовский проспект', 55.6700, 37.5900),
+    ('Остоженка', 55.7400, 37.5970),
+    ('Пятницкая улица', 55.7400, 37.6290),
+    ('Шаболовка', 55.7180, 37.6070),
+    ('Щёлковское шоссе', 55.8100, 37.7900),
+    ('Рязанский проспект', 55.7200, 37.7800),
+)
+HOUSES_PER_STREET = 150
+
+BASKET_SIZES = (1, 2, 3, 4, 5, 6)
+BASKET_SIZE_WEIGHTS = (35, 30, 17, 10, 5, 3)
+QUANTITIES = (1, 2, 3)
+QUANTITY_WEIGHTS = (70, 22, 8)
+# orders by hour of the day, with lunch and dinner peaks
+HOUR_WEIGHTS = (1, 1, 0, 0, 0, 0, 1, 2, 4, 5, 6, 9,
+                14, 13, 9, 6, 6, 8, 12, 14, 12, 8, 4, 2)
+STATUSES = (Order.OrderStatus.NEW,
+            Order.OrderStatus.PROCESSED,
+            Order.OrderStatus.FINISHED)
+STATUS_WEIGHTS = (10, 15, 75)
+PAYMENT_METHODS = (Order.PaymentMethod.CASH,
+                   Order.PaymentMethod.ONLINE,
+                   Order.PaymentMethod.UNKNOWN)
+PAYMENT_METHOD_WEIGHTS = (40, 55, 5)
+FIRSTNAMES = ('Иван', 'Анна', 'Пётр', 'Мария', 'Алексей', 'Ольга',
+              'Дмитрий', 'Елена', 'Сергей', 'Наталья')
+LASTNAMES = ('Иванов', 'Смирнов', 'Кузнецов', 'Попов', 'Васильев',
+             'Петров', 'Соколов', 'Михайлов', 'Новиков', 'Фёдоров')
+
+
+class Catalogue(NamedTuple):
+    """Plain data sent to worker processes."""
+    products: list[tuple[int, Decimal]]
+    product_weights: list[float]
+    # restaurants having each product on sale
+    product_restaurants: dict[int, frozenset[int]]
+    addresses: list[str]
+    days: int
+    now: datetime
+
+
+def get_street_addresses() -> list[tuple[str, float, float]]:
+    """Addresses of generated orders with their coordinates."""
+    addresses = []
+    for street, lat, long in MOSCOW_STREETS:
+        # houses are scattered around the middle of the street
+        street_random = random.Random(street)
+        for house in range(1, HOUSES_PER_STREET + 1):
+            addresses.append((
+                f'Москва, {street}, {house}',
+                lat + street_random.uniform(-0.01, 0.01),
+                long + street_random.uniform(-0.015, 0.015),
+            ))
+    return addresses
+
+
+def seed_addresses(addresses: list[tuple[str, float, float]]):
+    """Store coordinates of the addresses, so they are never geocoded."""
+    Address.objects.bulk_create(
+        [Address(name=name.lower(),
+                 canonical_key=normalize_address(name),
+                 lat=lat,
+                 long=long,
+                 geocode_status=Address.GeocodeStatus.FOUND,
+                 )
+         for name, lat, long in addresses],
+        batch_size=1000,
+        ignore_conflicts=True,
+    )
+
+
+def generate_order(rnd: random.Random, catalogue: Catalogue) -> tuple:
+    created_at = catalogue.now - timedelta(
+        days=rnd.randrange(catalogue.days),
+    )
+    created_at = created_at.replace(
+        hour=rnd.choices(range(24), HOUR_WEIGHTS)[0],
+        minute=rnd.randrange(60),
+        second=rnd.randrange(60),
+    )
+    created_at = min(created_at, catalogue.now)
+    status = rnd.choices(STATUSES, STATUS_WEIGHTS)[0]
+
+    order = Order(
+        address=rnd.choice(catalogue.addresses),
+        firstname=rnd.choice(FIRSTNAMES),
+        lastname=rnd.choice(LASTNAMES),
+        phonenumber=f'+7929{rnd.randrange(10 ** 7):07d}',
+        created_at=created_at,
+        order_status=status,
+        payment_method=rnd.choices(PAYMENT_METHODS,
+                                   PAYMENT_METHOD_WEIGHTS)[0],
+    )
+
+    basket_size = rnd.choices(BASKET_SIZES, BASKET_SIZE_WEIGHTS)[0]
+    basket = rnd.choices(catalogue.products,
+                         catalogue.product_weights,
+                         k=basket_size)
+    items = [
+        (product_id, rnd.choices(QUANTITIES, QUANTITY_WEIGHTS)[0], price)
+        for product_id, price in basket
+    ]
+    order.total_price = sum(price * quantity
+                            for _, quantity, price in items)
+
+    if status != Order.OrderStatus.NEW:
+        order.called_at = created_at + timedelta(minutes=rnd.randint(1, 10))
+        # only restaurants which can cook the whole basket take the order
+        capable_ids = frozenset.intersection(*(
+            catalogue.product_restaurants.get(product_id, frozenset())
+            for product_id, _ in basket
+        ))
+        if capable_ids:
+            order.restaurant_id = rnd.choice(sorted(capable_ids))
+    if status == Order.OrderStatus.FINISHED:
+        order.delivered_at = order.called_at + timedelta(
+            minutes=rnd.randint(20, 90),
+        )
+    return order, items
+
+
+def create_orders_batch(catalogue: Catalogue, size: int, seed: int) -> int:
+    """Create a batch of orders with their items in one transaction."""
+    rnd = random.Random(seed)
+    generated = [generate_order(rnd, catalogue) for _ in range(size)]
+    orders = [order for order, _ in generated]
+
+    with transaction.atomic():
+        Order.objects.bulk_create(orders)
+        if not connection.features.can_return_rows_from_bulk_insert:
+            # SQLite gives no ids back, so the batch takes the last ids.
+            # It holds only while nobody else inserts orders, that is why
+            # generate_orders runs such databases in one process.
+            order_ids = Order.objects.order_by('-id') \
+                .values_list('id', flat=True)[:size]
+            for order, order_id in zip(orders, sorted(order_ids)):
+                order.id = order_id
+
+        OrderItem.objects.bulk_create([
+            OrderItem(order_id=order.id,
+                      product_id=product_id,
+                      quantity=quantity,
+                      item_price=price,
+                      )
+            for order, items in generated
+            for product_id, quantity, price in items
+        ])
+    return size
+
+
+def init_worker():
+    django.setup()
+    # connections inherited from the parent process must not be shared
+    connections.close_all()
+
+
+def create_orders_batch_in_worker(args) -> int:
+    return create_orders_batch(*args)
+
+
+def get_batches(count: int, batch_size: int, seed: int):
+    for number, start in enumerate(range(0, count, batch_size)):
+        yield min(batch_size, count - start), seed * 1_000_003 + number
+
+
+def build_catalogue(products, restaurant_ids, days: int) -> Catalogue:
+    products = [(product.id, product.price) for product in products]
+    # a few products are much more popular than the rest
+    product_weights = [1 / rank for rank in range(1, len(products) + 1)]
+    product_restaurants = {}
+    menu_items = RestaurantMenuItem.objects \
+        .filter(availability=True, restaurant_id__in=list(restaurant_ids)) \
+        .values_list('product_id', 'restaurant_id')
+    for product_id, restaurant_id in menu_items:
+        product_restaurants.setdefault(product_id, set()).add(restaurant_id)
+    return Catalogue(products=products,
+                     product_weights=product_weights,
+                     product_restaurants={
+                         product_id: frozenset(restaurant_ids)
+                         for product_id, restaurant_ids
+                         in product_restaurants.items()
+                     },
+                     addresses=[name for name, _, _
+                                in get_street_addresses()],
+                     days=days,
+                     now=timezone.localtime(),
+                     )
@@ -0,0 +1,116 @@
+from collections import defaultdict
+from typing import Iterable
+
+from django.conf import settings
+
+from coordinates_keeper.distance_calc import Distance, prepare_lookup
+from coordinates_keeper.models import Address
+from coordinates_keeper.normalization import normalize_address
+from coordinates_keeper.spatial_index import CachedIndex, SpatialIndex
+
+from .availability import get_availability_matrix
+from .models import Order, OrderItem, Restaurant
+
+
+def match_available_restaurants(
+        orders: Iterable[Order]) -> dict[int, list[Restaurant]]:
+    """Find restaurants which can cook every product of each order.
+
+    Gives the same restaurants as `Order.get_available_restaurants`,
+    but for a batch of orders in a constant number of queries, restaurants
+    are picked from the cached availability matrix.
+    """
+    order_ids = [order.id for order in orders]
+
+    order_products = defaultdict(set)
+    order_items = OrderItem.objects \
+        .filter(order_id__in=order_ids) \
+        .values_list('order_id', 'product_id')
+    for order_id, product_id in order_items:
+        order_products[order_id].add(product_id)
+
+    availability = get_availability_matrix()
+    matched_ids = {
+        order_id: availability.get_restaurant_ids(
+            availability.get_restaurants_mask(product_ids)
+        )
+        for order_id, product_ids in order_products.items()
+    }
+    restaurants = Restaurant.objects.select_related('location').in_bulk(
+        {restaurant_id
+         for restaurant_ids in matched_ids.values()
+         for restaurant_id in restaurant_ids}
+    )
+
+    return {
+        order_id: sorted(
+            (restaurants[restaurant_id]
+             for restaurant_id in matched_ids.get(order_id, [])
+             if restaurant_id in restaurants),
+            key=lambda restaurant: restaurant.id,
+        )
+        for order_id in order_ids
+    }
+
+
+def get_distance_calculator(orders: Iterable[Order],
+                            restaurants: Iterable[Restaurant]) -> Distance:
+    """Distances between addresses of orders and restaurants.
+
+    Known coordinates are used only, unknown addresses are put to the
+    geocoding queue. Restaurant locations are expected to be loaded with
+    select_related.
+    """
+    addresses = [order.address for order in orders]
+    locations = []
+    for restaurant in restaurants:
+        location = restaurant.get_location()
+        if location is None:
+            addresses.append(restaurant.address)
+        else:
+            locations.append(location)
+    return Distance(address_lookup=prepare_lookup(
+        addresses,
+        fetch_missing=False,
+        resolved_addresses=locations,
+    ))
+
+
+def locate_restaurants():
+    located = []
+    unresolved_keys = {}
+    for restaurant in Restaurant.objects.select_related('location'):
+        location = restaurant.get_location()
+        if location is None:
+            unresolved_keys[restaurant.id] = \
+                normalize_address(restaurant.address)
+        elif location.lat is not None and location.long is not None:
+            located.append((restaurant.id, location.lat, location.long))
+
+    # restaurants saved outside of the admin are found by their address
+    coordinates = {
+        key: (lat, long)
+        for key, lat, long in Address.objects.filter(
+            canonical_key__in=unresolved_keys.values(),
+            lat__isnull=False,
+            long__isnull=False,
+        ).values_list('canonical_key', 'lat', 'long')
+    }
+    located.extend(
+        (restaurant_id, *coordinates[key])
+        for restaurant_id, key in unresolved_keys.items()
+        if key in coordinates
+    )
+    return located
+
+
+restaurants_index = CachedIndex(
+    'restaurants',
+    build=locate_restaurants,
+    max_age=settings.RESTAURANTS_INDEX_MAX_AGE,
+)
+
+
+def get_restaurants_index() -> SpatialIndex:
+    """Spatial index of restaurants keyed by restaurant id."""
+    return restaurants_index.get()
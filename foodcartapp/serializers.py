@@ -4,11 +4,14 @@ from phonenumber_field import serializerfields
 from rest_framework import serializers
 from rest_framework.serializers import ModelSerializer
 
+from coordinates_keeper.geocode_queue import enqueue_addresses
+
 from .models import Order, OrderItem, Product
 
 
 class OrderItemSerializer(ModelSerializer):
-    product = serializers.PrimaryKeyRelatedField(queryset=Product.objects.all())
+    # products are fetched all at once in OrderSerializer.validate_products
+    product = serializers.IntegerField(source='product_id')
 
     class Meta:
         model = OrderItem
@@ -34,15 +37,43 @@ class OrderSerializer(ModelSerializer):
         )
         read_only_fields = ('id',)
 
+    def validate_products(self, items):
+        products = Product.objects.in_bulk(
+            {item['product_id'] for item in items}
+        )
+        error_message = serializers.PrimaryKeyRelatedField \
+            .default_error_messages['does_not_exist']
+
+        errors = []
+        for item in items:
+            product = products.get(item['product_id'])
+            if product is None:
+                errors.append({'product': [
+                    error_message.format(pk_value=item['product_id']),
+                ]})
+                continue
+            item['product'] = product
+            errors.append({})
+        if any(errors):
+            raise serializers.ValidationError(errors)
+
+        return items
+
     def create(self, validated_data):
         items = validated_data.pop('items')
+        total_price = sum(item['product'].price * item['quantity']
+                          for item in items)
         with transaction.atomic():
-            order = Order.objects.create(**validated_data)
-            for order_item in items:
-                OrderItem.objects.create(order=order,
-                                         product=order_item['product'],
-                                         quantity=order_item['quantity'],
-                                         item_price=order_item['product'].price,
-                                         )
+            order = Order.objects.create(total_price=total_price,
+                                         **validated_data)
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order,
+                          product=order_item['product'],
+                          quantity=order_item['quantity'],
+                          item_price=order_item['product'].price,
+                          )
+                for order_item in items
+            ])
+            enqueue_addresses([order.address])
 
         return order
@@ -0,0 +1,97 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from coordinates_keeper.models import Address
+from coordinates_keeper.normalization import normalize_address
+from coordinates_keeper.signals import addresses_geocoded
+
+from .availability import update_availability
+from .catalogue import invalidate_catalogue
+from .models import (Order, OrderItem, Product, ProductCategory, Restaurant,
+                     RestaurantMenuItem, orders_deletion)
+from .restaurants_matcher import restaurants_index
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=ProductCategory)
+@receiver(post_delete, sender=ProductCategory)
+@receiver(post_save, sender=RestaurantMenuItem)
+@receiver(post_delete, sender=RestaurantMenuItem)
+def invalidate_catalogue_on_change(**kwargs):
+    # the next request rebuilds catalogue once instead of rebuilding it
+    # for every menu item saved by an admin inline
+    transaction.on_commit(invalidate_catalogue)
+
+
+@receiver(pre_save, sender=RestaurantMenuItem)
+def remember_menu_item_position(instance, **kwargs):
+    # availability of the old restaurant and product pair has to be reset
+    # if a menu item is moved to another one
+    if instance.pk is None:
+        instance.saved_position = None
+        return
+    instance.saved_position = RestaurantMenuItem.objects \
+        .filter(pk=instance.pk) \
+        .values_list('restaurant_id', 'product_id') \
+        .first()
+
+
+@receiver(post_save, sender=RestaurantMenuItem)
+def update_availability_on_save(instance, **kwargs):
+    position = (instance.restaurant_id, instance.product_id)
+    saved_position = getattr(instance, 'saved_position', None)
+    available = instance.availability
+
+    def update():
+        if saved_position and saved_position != position:
+            update_availability(*saved_position, available=False)
+        update_availability(*position, available=available)
+
+    transaction.on_commit(update)
+
+
+@receiver(post_delete, sender=RestaurantMenuItem)
+def update_availability_on_delete(instance, **kwargs):
+    transaction.on_commit(lambda: update_availability(
+        instance.restaurant_id,
+        instance.product_id,
+        available=False,
+    ))
+
+
+@receiver(post_save, sender=OrderItem)
+@receiver(post_delete, sender=OrderItem)
+def recalculate_order_total_price(instance, **kwargs):
+    if orders_deletion.get():
+        return
+    Order.objects.filter(pk=instance.order_id).recalculate_total_price()
+
+
+@receiver(post_save, sender=Restaurant)
+@receiver(post_delete, sender=Restaurant)
+def invalidate_restaurants_index(**kwargs):
+    transaction.on_commit(restaurants_index.invalidate)
+
+
+@receiver(post_save, sender=Address)
+@receiver(post_delete, sender=Address)
+def invalidate_restaurants_index_on_address_change(instance, created=False,
+                                                   **kwargs):
+    # a new or deleted address without coordinates has not placed any
+    # restaurant to the index, so restaurants are not even looked at
+    located = instance.lat is not None and instance.long is not None
+    if not located and (created or kwargs['signal'] is post_delete):
+        return
+    invalidate_restaurants_index_on_geocoding(names=[instance.name])
+
+
+@receiver(addresses_geocoded)
+def invalidate_restaurants_index_on_geocoding(names, **kwargs):
+    restaurant_keys = {
+        normalize_address(address)
+        for address in Restaurant.objects.values_list('address', flat=True)
+    }
+    if restaurant_keys.intersection(map(normalize_address, names)):
+        transaction.on_commit(restaurants_index.invalidate)
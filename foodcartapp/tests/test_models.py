@@ -1,11 +1,18 @@
+from io import StringIO
+
 from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import connection
 from django.db.models import F
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from monitoring.testing import NPlusOneTestMixin
 
 from ..models import Order, OrderItem, Product
 
 
-class OrderTest(TestCase):
+class OrderTest(NPlusOneTestMixin, TestCase):
     def test_order_create(self):
         order_raw = {
             "firstname": "Иван",
@@ -74,7 +81,7 @@ class OrderTest(TestCase):
                                      item_price=product.price,
                                      )
 
-        order = Order.objects.total_price()[0]
+        order = Order.objects.get(pk=order.pk)
         self.assertEqual(order.total_price, total_price)
 
     def test_total_price_unchanged(self):
@@ -108,15 +115,94 @@ class OrderTest(TestCase):
                                      item_price=product.price,
                                      )
 
-        order = Order.objects.total_price()[0]
+        order = Order.objects.get(pk=order.pk)
         self.assertEqual(order.total_price, total_price)
         product = Product.objects.first()
         product.price = F('price') * 2
         product.save()
         self.assertEqual(order.total_price, total_price)
 
+    def test_total_price_follows_items(self):
+        order = Order.objects.create(firstname='Иван',
+                                     lastname='Петров',
+                                     phonenumber='+79291000000',
+                                     address='Москва',
+                                     )
+        product = Product.objects.create(name='test burger', price=100)
+        order_item = OrderItem.objects.create(product=product,
+                                              order=order,
+                                              quantity=2,
+                                              item_price=product.price,
+                                              )
+        order_item.quantity = 3
+        order_item.save()
+        order.refresh_from_db()
+        self.assertEqual(order.total_price, 300)
+
+        order_item.delete()
+        order.refresh_from_db()
+        self.assertEqual(order.total_price, 0)
+
+    def test_order_deletion_queries(self):
+        product = Product.objects.create(name='test burger', price=100)
+        orders = []
+        for items_count in (1, 5):
+            order = Order.objects.create(firstname='Иван',
+                                         lastname='Петров',
+                                         phonenumber='+79291000000',
+                                         address='Москва',
+                                         )
+            OrderItem.objects.bulk_create([
+                OrderItem(product=product,
+                          order=order,
+                          quantity=1,
+                          item_price=product.price,
+                          )
+                for _ in range(items_count)
+            ])
+            orders.append(order)
+
+        # items of a deleted order do not update its total one by one
+        small_order, big_order = orders
+        with CaptureQueriesContext(connection) as small_order_queries:
+            small_order.delete()
+        with CaptureQueriesContext(connection) as big_order_queries:
+            big_order.delete()
+        self.assertEqual(len(big_order_queries), len(small_order_queries))
+        self.assertFalse(OrderItem.objects.exists())
+
+    def test_recalculate_order_totals(self):
+        order = Order.objects.create(firstname='Иван',
+                                     lastname='Петров',
+                                     phonenumber='+79291000000',
+                                     address='Москва',
+                                     )
+        product = Product.objects.create(name='test burger', price=100)
+        OrderItem.objects.bulk_create([
+            OrderItem(product=product,
+                      order=order,
+                      quantity=2,
+                      item_price=product.price,
+                      ),
+        ])
+
+        call_command('recalculate_order_totals', check=True,
+                     stdout=StringIO())
+        order.refresh_from_db()
+        self.assertEqual(order.total_price, 0)
+
+        call_command('recalculate_order_totals', batch_size=1,
+                     stdout=StringIO())
+        order.refresh_from_db()
+        self.assertEqual(order.total_price, 200)
+        self.assertEqual(
+            Order.objects.with_calculated_total_price().get()
+            .calculated_total_price,
+            200,
+        )
+
 
-class TestOrderItem(TestCase):
+class TestOrderItem(NPlusOneTestMixin, TestCase):
     _price = 1000
 
     def setUp(self) -> None:
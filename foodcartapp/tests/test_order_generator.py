@@ -0,0 +1,80 @@
+from unittest import mock
+
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase
+
+from coordinates_keeper.models import Address
+from coordinates_keeper.normalization import normalize_address
+from monitoring.testing import NPlusOneTestMixin
+
+from ..models import Order, OrderItem, Product, Restaurant, RestaurantMenuItem
+
+
+class GenerateOrdersTest(NPlusOneTestMixin, TestCase):
+    def setUp(self) -> None:
+        restaurant = Restaurant.objects.create(name='Star Burger')
+        for name, price in (('burger', 300), ('fries', 120), ('cola', 90)):
+            product = Product.objects.create(name=name, price=price)
+            RestaurantMenuItem.objects.create(restaurant=restaurant,
+                                              product=product,
+                                              )
+
+    def test_generate_orders(self):
+        call_command('generate_orders', 250, batch_size=100,
+                     stdout=mock.Mock())
+
+        self.assertEqual(Order.objects.count(), 250)
+        self.assertFalse(
+            Order.objects.filter(items__isnull=True).exists()
+        )
+        self.assertEqual(OrderItem.objects.values('order').distinct().count(),
+                         250)
+        for order in Order.objects.with_calculated_total_price():
+            self.assertEqual(order.total_price, order.calculated_total_price)
+
+        known_keys = set(
+            Address.objects.filter(lat__isnull=False)
+            .values_list('canonical_key', flat=True)
+        )
+        order_keys = {normalize_address(address) for address
+                      in Order.objects.values_list('address', flat=True)}
+        self.assertLessEqual(order_keys, known_keys)
+
+    def test_processes_need_returned_ids(self):
+        with mock.patch.object(connection.features,
+                               'can_return_rows_from_bulk_insert', False):
+            with self.assertRaises(CommandError):
+                call_command('generate_orders', 10, processes=2,
+                             stdout=mock.Mock())
+        self.assertFalse(Order.objects.exists())
+
+    def test_restaurants_can_cook_orders(self):
+        burgers_only = Restaurant.objects.create(name='Burgers only')
+        RestaurantMenuItem.objects.create(
+            restaurant=burgers_only,
+            product=Product.objects.get(name='burger'),
+        )
+        call_command('generate_orders', 100, stdout=mock.Mock())
+
+        orders = Order.objects.filter(restaurant__isnull=False)
+        self.assertTrue(orders.filter(restaurant=burgers_only).exists())
+        for order in orders:
+            self.assertIn(order.restaurant,
+                          order.get_available_restaurants())
+
+    def test_same_seed_same_orders(self):
+        call_command('generate_orders', 10, seed=7, stdout=mock.Mock())
+        first = list(Order.objects.values_list('address', 'total_price'))
+        Order.objects.all().delete()
+        call_command('generate_orders', 10, seed=7, stdout=mock.Mock())
+
+        self.assertEqual(
+            list(Order.objects.values_list('address', 'total_price')),
+            first,
+        )
+
+    def test_add_orders(self):
+        call_command('add_orders', 2, stdout=mock.Mock())
+        self.assertEqual(OrderItem.objects.values('order').distinct().count(),
+                         2)
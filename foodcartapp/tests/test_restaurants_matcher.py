@@ -0,0 +1,182 @@
+from unittest import mock
+
+from django.contrib.admin import site
+from django.core.cache import cache
+from django.test import TestCase
+
+from coordinates_keeper.models import Address
+from monitoring.testing import NPlusOneTestMixin
+
+from ..admin import RestaurantAdmin
+from ..availability import (AvailabilityMatrix, get_availability_matrix,
+                            update_availability)
+from ..models import (Order, OrderItem, Product, Restaurant,
+                      RestaurantMenuItem)
+from ..restaurants_matcher import (locate_restaurants,
+                                   match_available_restaurants)
+
+
+class MatchAvailableRestaurantsTest(NPlusOneTestMixin, TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        burger, fries, cola = (
+            Product.objects.create(name=name, price=100)
+            for name in ('burger', 'fries', 'cola')
+        )
+        full, no_cola, cola_disabled = (
+            Restaurant.objects.create(name=name)
+            for name in ('full', 'no cola', 'cola disabled')
+        )
+        menu = (
+            (full, burger, True),
+            (full, fries, True),
+            (full, cola, True),
+            (no_cola, burger, True),
+            (no_cola, fries, True),
+            (cola_disabled, burger, True),
+            (cola_disabled, cola, False),
+        )
+        for restaurant, product, availability in menu:
+            RestaurantMenuItem.objects.create(restaurant=restaurant,
+                                              product=product,
+                                              availability=availability,
+                                              )
+
+        baskets = (
+            (burger,),
+            (burger, fries),
+            (burger, cola),
+            (cola, cola),
+            (),
+        )
+        for basket in baskets:
+            order = Order.objects.create(firstname='Иван',
+                                         lastname='Петров',
+                                         phonenumber='+79291000000',
+                                         address='Москва',
+                                         )
+            for product in basket:
+                OrderItem.objects.create(order=order,
+                                         product=product,
+                                         quantity=1,
+                                         item_price=product.price,
+                                         )
+
+    def test_same_as_per_order_lookup(self):
+        orders = list(Order.objects.all())
+        matched = match_available_restaurants(orders)
+        for order in orders:
+            with self.subTest(order=order.id):
+                self.assertCountEqual(
+                    matched[order.id],
+                    order.get_available_restaurants(),
+                )
+
+    def test_constant_queries(self):
+        orders = list(Order.objects.all())
+        with self.assertNumQueries(3):
+            match_available_restaurants(orders)
+
+    def test_menu_changes_without_rebuild(self):
+        orders = list(Order.objects.all())
+        match_available_restaurants(orders)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            menu_item = RestaurantMenuItem.objects.get(
+                restaurant__name='cola disabled',
+                product__name='cola',
+            )
+            menu_item.availability = True
+            menu_item.save()
+            RestaurantMenuItem.objects.filter(
+                restaurant__name='full',
+                product__name='fries',
+            ).delete()
+
+        with self.assertNumQueries(2):
+            matched = match_available_restaurants(orders)
+        for order in orders:
+            with self.subTest(order=order.id):
+                self.assertCountEqual(
+                    matched[order.id],
+                    order.get_available_restaurants(),
+                )
+
+    def test_concurrent_updates_are_not_lost(self):
+        get_availability_matrix()
+        first = RestaurantMenuItem.objects.get(restaurant__name='full',
+                                               product__name='fries')
+        second = RestaurantMenuItem.objects.get(restaurant__name='no cola',
+                                                product__name='burger')
+        RestaurantMenuItem.objects \
+            .filter(pk__in=[first.pk, second.pk]) \
+            .update(availability=False)
+
+        apply_change = AvailabilityMatrix.set
+
+        def apply_with_second_update(matrix, *args):
+            # the second update comes while the first one is being applied
+            with mock.patch.object(AvailabilityMatrix, 'set', apply_change):
+                update_availability(second.restaurant_id, second.product_id,
+                                    available=False)
+            apply_change(matrix, *args)
+
+        with mock.patch.object(AvailabilityMatrix, 'set',
+                               apply_with_second_update):
+            update_availability(first.restaurant_id, first.product_id,
+                                available=False)
+
+        matrix = get_availability_matrix()
+        self.assertFalse(matrix.is_available(first.restaurant_id,
+                                             first.product_id))
+        self.assertFalse(matrix.is_available(second.restaurant_id,
+                                             second.product_id))
+
+
+@mock.patch('coordinates_keeper.distance_calc.fetch_coordinates',
+            return_value=(37.637760, 55.826296))
+class RestaurantLocationTest(NPlusOneTestMixin, TestCase):
+    def save_in_admin(self, restaurant):
+        restaurant_admin = RestaurantAdmin(Restaurant, site)
+        restaurant_admin.save_model(request=None,
+                                    obj=restaurant,
+                                    form=None,
+                                    change=bool(restaurant.pk),
+                                    )
+
+    def test_location_is_resolved_in_admin(self, fetch_coordinates):
+        restaurant = Restaurant(name='Star Burger', address='ВДНХ')
+        self.save_in_admin(restaurant)
+
+        restaurant.refresh_from_db()
+        self.assertEqual(restaurant.location.name, 'вднх')
+        self.assertEqual(restaurant.get_location(), restaurant.location)
+
+        restaurant.address = 'Красная площадь'
+        self.assertIsNone(restaurant.get_location())
+        self.save_in_admin(restaurant)
+        self.assertEqual(restaurant.location.name, 'красная площадь')
+        self.assertEqual(fetch_coordinates.call_count, 2)
+
+    def test_locate_restaurants(self, fetch_coordinates):
+        location = Address.objects.create(name='вднх', lat=55.8, long=37.6)
+        located = Restaurant.objects.create(name='located',
+                                            address='ВДНХ',
+                                            location=location,
+                                            )
+        Address.objects.create(name='красная площадь', lat=55.7, long=37.6)
+        by_address = Restaurant.objects.create(name='by address',
+                                               address='Красная площадь',
+                                               )
+        Restaurant.objects.create(name='unknown', address='Тверская 1')
+
+        with self.assertNumQueries(2):
+            self.assertCountEqual(locate_restaurants(), [
+                (located.id, 55.8, 37.6),
+                (by_address.id, 55.7, 37.6),
+            ])
+
+    def test_new_address_without_coordinates_skips_restaurants(
+            self, fetch_coordinates):
+        with self.assertNumQueries(1):
+            Address.objects.create(name='тверская 1')
@@ -1,10 +1,19 @@
+import gzip
+import json
 from typing import NamedTuple
+from unittest import mock
 
+from django.core.cache import cache
+from django.db import connection
 from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework import status
 
-from ..models import Order, Product
+from monitoring.testing import NPlusOneTestMixin
+
+from ..models import (Order, OrderItem, Product, ProductCategory, Restaurant,
+                      RestaurantMenuItem)
 
 
 class CheckCase(NamedTuple):
@@ -13,7 +22,7 @@ class CheckCase(NamedTuple):
     want: int
 
 
-class TestNewOrder(TestCase):
+class TestNewOrder(NPlusOneTestMixin, TestCase):
     def setUp(self) -> None:
         Product.objects.create(id=1, name='test product name', price=1)
 
@@ -127,6 +136,37 @@ class TestNewOrder(TestCase):
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         self.assertIn('id', response.data)
 
+    def test_constant_queries(self):
+        products = [
+            Product.objects.create(name=f'test product {number}', price=10)
+            for number in range(20)
+        ]
+        query_counts = []
+        for basket in (products[:1], products):
+            payload = {
+                'products': [{'product': product.id, 'quantity': 2}
+                             for product in basket],
+                'firstname': 'Иван',
+                'lastname': 'Петров',
+                'phonenumber': '+79291000000',
+                'address': 'Москва',
+            }
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post(
+                    reverse('foodcartapp:order'),
+                    data=json.dumps(payload),
+                    content_type='application/json',
+                )
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            query_counts.append(len(queries))
+
+        self.assertEqual(query_counts[0], query_counts[1])
+        order_items = OrderItem.objects.filter(order=response.data['id'])
+        self.assertEqual(len(order_items), len(products))
+        self.assertTrue(all(item.item_price == 10 for item in order_items))
+        order = Order.objects.get(pk=response.data['id'])
+        self.assertEqual(order.total_price, 10 * 2 * len(products))
+
     def test_transaction_behavior(self):
         cases = (
             CheckCase(
@@ -169,3 +209,121 @@ class TestNewOrder(TestCase):
                 self.assertEqual(len(orders), case.want)
                 orders.delete()
 
+
+class TestProductList(NPlusOneTestMixin, TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        category = ProductCategory.objects.create(name='бургеры')
+        restaurant = Restaurant.objects.create(name='test restaurant')
+        product = Product.objects.create(name='test burger',
+                                         price=100,
+                                         category=category,
+                                         image='burger.jpg',
+                                         )
+        RestaurantMenuItem.objects.create(restaurant=restaurant,
+                                          product=product,
+                                          )
+
+    def test_product_list(self):
+        response = self.client.get('/api/products/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()[0]['name'], 'test burger')
+        self.assertIn('ETag', response)
+
+    def test_cached_product_list(self):
+        self.client.get('/api/products/')
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/products/')
+        self.assertEqual(response.json()[0]['name'], 'test burger')
+
+    def test_not_modified(self):
+        etag = self.client.get('/api/products/')['ETag']
+        response = self.client.get('/api/products/',
+                                   HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_not_modified_without_reading_catalogue(self):
+        etag = self.client.get('/api/products/')['ETag']
+        with mock.patch('foodcartapp.views.get_catalogue') as get_catalogue:
+            with self.assertNumQueries(0):
+                response = self.client.get('/api/products/',
+                                           HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+        get_catalogue.assert_not_called()
+
+    def test_modified_since_is_ignored(self):
+        # the catalogue is validated by ETag only
+        response = self.client.get(
+            '/api/products/',
+            HTTP_IF_MODIFIED_SINCE='Wed, 21 Oct 2099 07:28:00 GMT',
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_cache_headers(self):
+        with self.settings(CATALOGUE_MAX_AGE=60,
+                           API_STALE_WHILE_REVALIDATE=600):
+            response = self.client.get('/api/products/')
+        self.assertEqual(response['Cache-Control'],
+                         'public, max-age=60, stale-while-revalidate=600')
+        self.assertNotIn('Last-Modified', response)
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+
+    def test_gzipped_product_list(self):
+        response = self.client.get('/api/products/',
+                                   HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        products = json.loads(gzip.decompress(response.content))
+        self.assertEqual(products[0]['name'], 'test burger')
+
+    def test_refused_gzip(self):
+        for accept_encoding in ('gzip;q=0', 'deflate, gzip; q=0.0',
+                                'x-gzip', 'identity, *;q=0'):
+            response = self.client.get('/api/products/',
+                                       HTTP_ACCEPT_ENCODING=accept_encoding)
+            self.assertNotIn('Content-Encoding', response, accept_encoding)
+            self.assertEqual(response.json()[0]['name'], 'test burger')
+
+    def test_gzip_with_quality(self):
+        for accept_encoding in ('GZIP;q=0.5', 'deflate;q=1, *;q=0.1'):
+            response = self.client.get('/api/products/',
+                                       HTTP_ACCEPT_ENCODING=accept_encoding)
+            self.assertEqual(response['Content-Encoding'], 'gzip',
+                             accept_encoding)
+
+    def test_not_modified_varies_by_encoding(self):
+        etag = self.client.get('/api/products/',
+                               HTTP_ACCEPT_ENCODING='gzip')['ETag']
+        response = self.client.get('/api/products/',
+                                   HTTP_ACCEPT_ENCODING='gzip',
+                                   HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+
+    def test_invalidation(self):
+        etag = self.client.get('/api/products/')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.update_or_create(
+                name='test burger',
+                defaults={'price': 200},
+            )
+
+        response = self.client.get('/api/products/',
+                                   HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()[0]['price'], '200.00')
+        self.assertNotEqual(response['ETag'], etag)
+
+
+class TestBannersList(NPlusOneTestMixin, TestCase):
+    def test_banners_list(self):
+        response = self.client.get('/api/banners/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()[0]['title'], 'Burger')
+        self.assertIn('public', response['Cache-Control'])
+
+    def test_not_modified(self):
+        etag = self.client.get('/api/banners/')['ETag']
+        response = self.client.get('/api/banners/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
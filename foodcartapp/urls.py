@@ -6,7 +6,7 @@ from .views import product_list_api, banners_list_api, register_order
 app_name = "foodcartapp"
 
 urlpatterns = [
-    path('products/', product_list_api),
-    path('banners/', banners_list_api),
+    path('products/', product_list_api, name='products'),
+    path('banners/', banners_list_api, name='banners'),
     path('order/', register_order, name='order'),
 ]
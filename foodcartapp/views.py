@@ -1,17 +1,26 @@
-from django.http import JsonResponse
+import hashlib
+import json
+from functools import lru_cache
+
+from django.conf import settings
+from django.http import HttpResponse
 from django.templatetags.static import static
+from django.utils.cache import (get_conditional_response, patch_cache_control,
+                                patch_vary_headers)
 from rest_framework import status
 from rest_framework.decorators import api_view
 from rest_framework.request import Request
 from rest_framework.response import Response
 
-from .models import Product
+from .catalogue import get_catalogue, get_catalogue_etag
 from .serializers import OrderSerializer
 
 
-def banners_list_api(request):
+@lru_cache(maxsize=None)
+def get_banners() -> tuple[bytes, str]:
+    """Serialized banners and their ETag."""
     # FIXME move data to db?
-    return JsonResponse([
+    banners = [
         {
             'title': 'Burger',
             'src': static('burger.jpg'),
@@ -27,38 +36,83 @@ def banners_list_api(request):
             'src': static('tasty.jpg'),
             'text': 'Food is incomplete without a tasty dessert',
         }
-    ], safe=False, json_dumps_params={
-        'ensure_ascii': False,
-        'indent': 4,
-    })
+    ]
+    payload = json.dumps(banners, ensure_ascii=False, indent=4).encode()
+    return payload, '"{}"'.format(hashlib.sha1(payload).hexdigest())
+
+
+def banners_list_api(request):
+    payload, etag = get_banners()
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(payload, content_type='application/json')
+
+    response['ETag'] = etag
+    patch_cache_control(
+        response,
+        public=True,
+        max_age=settings.BANNERS_MAX_AGE,
+        stale_while_revalidate=settings.API_STALE_WHILE_REVALIDATE,
+    )
+    return response
+
+
+def get_encoded_etag(etag: str, gzipped: bool) -> str:
+    # gzipped and plain payloads are different representations
+    return '{}-gzip"'.format(etag[:-1]) if gzipped else etag
+
+
+def accepts_gzip(accept_encoding: str) -> bool:
+    """Whether gzip has a non-zero quality in the Accept-Encoding header."""
+    qualities = {}
+    for coding in accept_encoding.split(','):
+        name, *params = coding.split(';')
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[name.strip().lower()] = quality
+    return qualities.get('gzip', qualities.get('*', 0.0)) > 0
 
 
 def product_list_api(request):
-    products = Product.objects.select_related('category').available()
-
-    dumped_products = []
-    for product in products:
-        dumped_product = {
-            'id': product.id,
-            'name': product.name,
-            'price': product.price,
-            'special_status': product.special_status,
-            'description': product.description,
-            'category': {
-                'id': product.category.id,
-                'name': product.category.name,
-            },
-            'image': product.image.url,
-            'restaurant': {
-                'id': product.id,
-                'name': product.name,
-            }
-        }
-        dumped_products.append(dumped_product)
-    return JsonResponse(dumped_products, safe=False, json_dumps_params={
-        'ensure_ascii': False,
-        'indent': 4,
-    })
+    gzipped = accepts_gzip(request.headers.get('Accept-Encoding', ''))
+
+    # conditional requests are answered without reading the catalogue,
+    # there is no Last-Modified since the catalogue keeps no change time
+    catalogue = None
+    etag = get_catalogue_etag()
+    if etag is None:
+        catalogue = get_catalogue()
+        etag = catalogue.etag
+    etag = get_encoded_etag(etag, gzipped)
+
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        # the catalogue may have been changed since validators were read
+        catalogue = catalogue or get_catalogue()
+        etag = get_encoded_etag(catalogue.etag, gzipped)
+        if gzipped:
+            response = HttpResponse(catalogue.gzipped_payload,
+                                    content_type='application/json')
+            response['Content-Encoding'] = 'gzip'
+        else:
+            response = HttpResponse(catalogue.payload,
+                                    content_type='application/json')
+
+    response['ETag'] = etag
+    patch_cache_control(
+        response,
+        public=True,
+        max_age=settings.CATALOGUE_MAX_AGE,
+        stale_while_revalidate=settings.API_STALE_WHILE_REVALIDATE,
+    )
+    patch_vary_headers(response, ['Accept-Encoding'])
+    return response
 
 
 @api_view(['POST'])
@@ -0,0 +1,176 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# upper bounds of histogram buckets, the last bucket is +Inf
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+                    2.5, 5.0, 10.0)
+QUERIES_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+REQUEST_HISTOGRAMS = {
+    'request_duration_seconds': DURATION_BUCKETS,
+    'request_db_duration_seconds': DURATION_BUCKETS,
+    'request_geocoder_duration_seconds': DURATION_BUCKETS,
+    'request_queries': QUERIES_BUCKETS,
+    'request_duplicate_queries': QUERIES_BUCKETS,
+}
+METRICS_PREFIX = 'star_burger_'
+
+
+class Histogram:
+    """Prometheus style histogram: counts of values in fixed buckets."""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0
+
+    def observe(self, value):
+        # bucket bounds are inclusive, as `le` label says
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def get_cumulative_counts(self) -> list[tuple[str, int]]:
+        bounds = [str(bound) for bound in self.buckets] + ['+Inf']
+        cumulative = []
+        total = 0
+        for bound, count in zip(bounds, self.counts):
+            total += count
+            cumulative.append((bound, total))
+        return cumulative
+
+
+class MetricsRegistry:
+    """Histograms of requests by view, shared by threads of the process."""
+
+    def __init__(self):
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def observe_request(self, view: str, values: dict):
+        with self._lock:
+            for name, value in values.items():
+                key = (name, view)
+                if key not in self._histograms:
+                    self._histograms[key] = Histogram(
+                        REQUEST_HISTOGRAMS[name],
+                    )
+                self._histograms[key].observe(value)
+
+    def collect(self) -> dict:
+        """Copy of histograms by metric name and view."""
+        with self._lock:
+            collected = {}
+            for (name, view), histogram in sorted(self._histograms.items()):
+                copy = Histogram(histogram.buckets)
+                copy.counts = list(histogram.counts)
+                copy.count, copy.sum = histogram.count, histogram.sum
+                collected.setdefault(name, {})[view] = copy
+            return collected
+
+    def clear(self):
+        with self._lock:
+            self._histograms.clear()
+
+
+registry = MetricsRegistry()
+
+
+class RequestMetrics:
+    """Counters of a request being served."""
+
+    __slots__ = ('db_duration', 'queries', 'duplicate_queries',
+                 'geocoder_duration', '_seen_queries')
+
+    def __init__(self):
+        self.db_duration = 0.0
+        self.queries = 0
+        self.duplicate_queries = 0
+        self.geocoder_duration = 0.0
+        self._seen_queries = set()
+
+    def __call__(self, execute, sql, params, many, context):
+        """Database execute wrapper, counts and times queries."""
+        started_at = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_duration += time.perf_counter() - started_at
+            self.queries += 1
+            if not many:
+                # params of executemany may be huge, they are not compared
+                query = (sql, repr(params))
+                if query in self._seen_queries:
+                    self.duplicate_queries += 1
+                else:
+                    self._seen_queries.add(query)
+
+
+current_request_metrics: ContextVar[RequestMetrics | None] = ContextVar(
+    'current_request_metrics', default=None,
+)
+
+
+@contextmanager
+def measure_geocoder():
+    """Add time spent in the block to geocoder time of the current request."""
+    metrics = current_request_metrics.get()
+    if metrics is None:
+        yield
+        return
+    started_at = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.geocoder_duration += time.perf_counter() - started_at
+
+
+def format_labels(labels: dict) -> str:
+    escaped = (
+        '{}="{}"'.format(
+            name,
+            str(value).replace('\\', r'\\').replace('"', r'\"')
+            .replace('\n', r'\n'),
+        )
+        for name, value in labels.items()
+    )
+    return '{' + ','.join(escaped) + '}'
+
+
+def render_prometheus(histograms: dict, gauges: dict | None = None,
+                      counters: dict | None = None) -> str:
+    """Metrics in Prometheus text exposition format.
+
+    `gauges` maps metric names to values or to lists of (labels, value),
+    `counters` maps metric names to values and get the `_total` suffix.
+    """
+    lines = []
+    for name, by_view in histograms.items():
+        full_name = METRICS_PREFIX + name
+        lines.append(f'# TYPE {full_name} histogram')
+        for view, histogram in by_view.items():
+            for bound, count in histogram.get_cumulative_counts():
+                labels = format_labels({'view': view, 'le': bound})
+                lines.append(f'{full_name}_bucket{labels} {count}')
+            labels = format_labels({'view': view})
+            lines.append(f'{full_name}_sum{labels} {histogram.sum}')
+            lines.append(f'{full_name}_count{labels} {histogram.count}')
+
+    for name, samples in (gauges or {}).items():
+        full_name = METRICS_PREFIX + name
+        lines.append(f'# TYPE {full_name} gauge')
+        if not isinstance(samples, list):
+            samples = [({}, samples)]
+        for labels, value in samples:
+            labels = format_labels(labels) if labels else ''
+            lines.append(f'{full_name}{labels} {value}')
+
+    for name, value in (counters or {}).items():
+        full_name = f'{METRICS_PREFIX}{name}_total'
+        lines.append(f'# TYPE {full_name} counter')
+        lines.append(f'{full_name} {value}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,98 @@
+import random
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from .metrics import RequestMetrics, current_request_metrics, registry
+from .profiling import SamplingProfiler, save_profile
+from .query_patterns import NPlusOneDetector
+
+
+class MetricsMiddleware:
+    """Record time, database queries and geocoder time of each request.
+
+    Values are added to histograms by view name, see the `metrics` view.
+    Put it first in MIDDLEWARE to measure the other middleware too.
+    Queries made while a streaming response is being sent are not counted.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics = RequestMetrics()
+        token = current_request_metrics.set(metrics)
+        started_at = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(metrics))
+                response = self.get_response(request)
+        finally:
+            current_request_metrics.reset(token)
+
+        resolver_match = getattr(request, 'resolver_match', None)
+        registry.observe_request(
+            resolver_match.view_name if resolver_match else '<unresolved>',
+            {
+                'request_duration_seconds': time.perf_counter() - started_at,
+                'request_db_duration_seconds': metrics.db_duration,
+                'request_geocoder_duration_seconds':
+                    metrics.geocoder_duration,
+                'request_queries': metrics.queries,
+                'request_duplicate_queries': metrics.duplicate_queries,
+            },
+        )
+        return response
+
+
+class NPlusOneMiddleware:
+    """Find N+1 queries in requests, see NPLUSONE_DETECTION setting.
+
+    It is off by default and meant for tests and staging: 'warn' logs
+    repeated queries with the stack which made them, 'raise' fails the
+    request.
+    """
+
+    def __init__(self, get_response):
+        if not settings.NPLUSONE_DETECTION:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with NPlusOneDetector(settings.NPLUSONE_THRESHOLD,
+                              action=settings.NPLUSONE_DETECTION):
+            return self.get_response(request)
+
+
+class ProfilingMiddleware:
+    """Profile requests of staff, see PROFILING_* settings.
+
+    A request is profiled if it has the `profile` query parameter or with
+    PROFILING_SAMPLE_RATE probability. The profile is saved to
+    PROFILING_DIR and its name is sent in the X-Profile header.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        # the user is loaded only when the request is going to be profiled
+        wanted = 'profile' in request.GET or \
+            random.random() < settings.PROFILING_SAMPLE_RATE
+        if not (wanted and request.user.is_staff):
+            return self.get_response(request)
+
+        with SamplingProfiler(settings.PROFILING_INTERVAL) as profiler:
+            response = self.get_response(request)
+        resolver_match = getattr(request, 'resolver_match', None)
+        response['X-Profile'] = save_profile(
+            profiler,
+            view=resolver_match.view_name if resolver_match
+            else '<unresolved>',
+            path=request.get_full_path(),
+        )
+        return response
@@ -0,0 +1,137 @@
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+
+from django.conf import settings
+
+PROFILE_EXTENSIONS = ('.collapsed', '.txt')
+
+
+class SamplingProfiler:
+    """Record stacks of the current thread every `interval` seconds.
+
+    A background thread takes the samples, so the profiled code runs at
+    almost full speed, and functions waiting for the database or the
+    geocoder show up as well as the busy ones.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.samples = Counter()
+        self.started_at = None
+        self.duration = 0.0
+        self._started = None
+        self._thread_id = None
+        self._stop = threading.Event()
+        self._sampler = None
+
+    def __enter__(self):
+        self._thread_id = threading.get_ident()
+        self.started_at = datetime.now(timezone.utc)
+        self._started = time.perf_counter()
+        self._sampler = threading.Thread(target=self._sample, daemon=True)
+        self._sampler.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self._stop.set()
+        self._sampler.join()
+        self.duration = time.perf_counter() - self._started
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._thread_id)
+            if frame is not None:
+                self.samples[get_stack(frame)] += 1
+
+
+def get_stack(frame) -> tuple[str, ...]:
+    """Functions of the stack from the outermost one."""
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        filename = code.co_filename
+        if filename.startswith(settings.BASE_DIR):
+            filename = os.path.relpath(filename, settings.BASE_DIR)
+        elif 'site-packages' in filename:
+            filename = filename.split('site-packages' + os.sep, 1)[-1]
+        # semicolons separate functions in the collapsed format
+        stack.append('{} ({}:{})'.format(code.co_name, filename,
+                                         code.co_firstlineno)
+                     .replace(';', ','))
+        frame = frame.f_back
+    return tuple(reversed(stack))
+
+
+def format_collapsed(samples: Counter) -> str:
+    """Stacks in the collapsed format of flamegraph.pl and speedscope."""
+    return ''.join(f'{";".join(stack)} {count}\n'
+                   for stack, count in samples.most_common())
+
+
+def format_summary(profiler: SamplingProfiler, view: str, path: str,
+                   top: int) -> str:
+    """Functions with the most samples, in them or in their callees."""
+    total_samples = sum(profiler.samples.values())
+    own_samples = Counter()
+    all_samples = Counter()
+    for stack, count in profiler.samples.items():
+        own_samples[stack[-1]] += count
+        for function in set(stack):
+            all_samples[function] += count
+
+    lines = [
+        f'View: {view}',
+        f'Path: {path}',
+        f'Started at: {profiler.started_at.isoformat()}',
+        f'Duration: {profiler.duration * 1000:.1f} ms, '
+        f'{total_samples} samples every {profiler.interval * 1000:.1f} ms',
+        '',
+        '  total%    own%  function',
+    ]
+    for function, count in all_samples.most_common(top):
+        lines.append('{:>8.1f}{:>8.1f}  {}'.format(
+            100 * count / total_samples,
+            100 * own_samples[function] / total_samples,
+            function,
+        ))
+    return '\n'.join(lines) + '\n'
+
+
+def save_profile(profiler: SamplingProfiler, view: str, path: str) -> str:
+    """Write the collapsed stacks and the summary, give their file name.
+
+    Only PROFILING_KEEP latest profiles are kept in PROFILING_DIR.
+    """
+    directory = settings.PROFILING_DIR
+    os.makedirs(directory, exist_ok=True)
+    name = '{}-{}'.format(
+        profiler.started_at.strftime('%Y%m%dT%H%M%S.%fZ'),
+        re.sub(r'[^\w.-]', '_', view.replace(':', '.')),
+    )
+    with open(os.path.join(directory, name + '.collapsed'), 'w') as file:
+        file.write(format_collapsed(profiler.samples))
+    with open(os.path.join(directory, name + '.txt'), 'w') as file:
+        file.write(format_summary(profiler, view, path,
+                                  top=settings.PROFILING_TOP))
+    remove_old_profiles(directory, keep=settings.PROFILING_KEEP)
+    return name
+
+
+def remove_old_profiles(directory: str, keep: int):
+    # names start with the time, so they are sorted from the oldest
+    names = sorted({
+        filename.rsplit('.', 1)[0]
+        for filename in os.listdir(directory)
+        if filename.endswith(PROFILE_EXTENSIONS)
+    })
+    for name in names[:max(len(names) - keep, 0)]:
+        for extension in PROFILE_EXTENSIONS:
+            try:
+                os.remove(os.path.join(directory, name + extension))
+            except FileNotFoundError:
+                pass
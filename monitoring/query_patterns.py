@@ -0,0 +1,114 @@
+import logging
+import os
+import re
+import traceback
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+_STRINGS = re.compile(r"'(?:[^']|'')*'")
+_NUMBERS = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LISTS = re.compile(r'\bIN \([^()]*\)', re.IGNORECASE)
+_VALUES_LISTS = re.compile(r'\bVALUES\s*\([^()]*\)(?:\s*,\s*\([^()]*\))*',
+                           re.IGNORECASE)
+_SPACES = re.compile(r'\s+')
+_TRANSACTION_STATEMENTS = ('SAVEPOINT', 'RELEASE SAVEPOINT',
+                           'ROLLBACK TO SAVEPOINT')
+STACK_DEPTH = 8
+# frames of the monitoring itself, like middleware and query wrappers,
+# tell nothing about the code which made the query
+_MONITORING_DIR = os.path.dirname(os.path.abspath(__file__)) + os.sep
+_MONITORING_TESTS = os.path.join(_MONITORING_DIR, 'tests.py')
+
+logger = logging.getLogger(__name__)
+
+
+class NPlusOneError(AssertionError):
+    """Same query has been made too many times."""
+
+
+def normalize_sql(sql: str) -> str:
+    """Shape of the query: literals and lists of any length look the same."""
+    shape = _STRINGS.sub('?', sql)
+    shape = _NUMBERS.sub('?', shape)
+    shape = _IN_LISTS.sub('IN (...)', shape)
+    shape = _VALUES_LISTS.sub('VALUES (...)', shape)
+    return _SPACES.sub(' ', shape).strip()
+
+
+def get_project_stack() -> list[traceback.FrameSummary]:
+    """Innermost frames of the project code, without libraries."""
+    frames = [
+        frame for frame in traceback.extract_stack()
+        if frame.filename.startswith(settings.BASE_DIR) and
+        'site-packages' not in frame.filename and
+        not is_monitoring_frame(frame.filename)
+    ]
+    return frames[-STACK_DEPTH:]
+
+
+def is_monitoring_frame(filename: str) -> bool:
+    return filename.startswith(_MONITORING_DIR) and \
+        filename != _MONITORING_TESTS
+
+
+class NPlusOneDetector:
+    """Find queries of the same shape repeated more than `threshold` times.
+
+    Queries are grouped by `normalize_sql`, so a query made in a loop with
+    different params is one group. The Python stack which made a group
+    exceed the threshold is kept for the report. On exit the detector
+    raises NPlusOneError if `action` is 'raise' or logs a warning if it is
+    'warn'.
+    """
+
+    def __init__(self, threshold: int, action: str = 'raise'):
+        self.threshold = threshold
+        self.action = action
+        self.counts = Counter()
+        self.stacks = {}
+        self._exit_stack = None
+
+    def __call__(self, execute, sql, params, many, context):
+        if not sql.lstrip().upper().startswith(_TRANSACTION_STATEMENTS):
+            shape = normalize_sql(sql)
+            self.counts[shape] += 1
+            if self.counts[shape] == self.threshold + 1:
+                self.stacks[shape] = get_project_stack()
+        return execute(sql, params, many, context)
+
+    def __enter__(self):
+        self._exit_stack = ExitStack()
+        for connection in connections.all():
+            self._exit_stack.enter_context(connection.execute_wrapper(self))
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self._exit_stack.close()
+        if exc_type is None:
+            self.check()
+
+    def get_repeated_queries(self) -> dict[str, int]:
+        return {shape: count for shape, count in self.counts.items()
+                if count > self.threshold}
+
+    def get_report(self) -> str:
+        lines = []
+        for shape, count in self.get_repeated_queries().items():
+            lines.append(f'Query made {count} times, more than '
+                         f'{self.threshold}: {shape}')
+            for frame in self.stacks[shape]:
+                path = os.path.relpath(frame.filename, settings.BASE_DIR)
+                lines.append(f'  {path}:{frame.lineno} in {frame.name}')
+                if frame.line:
+                    lines.append(f'    {frame.line}')
+        return '\n'.join(lines)
+
+    def check(self):
+        if not self.get_repeated_queries():
+            return
+        if self.action == 'raise':
+            raise NPlusOneError(self.get_report())
+        logger.warning('N+1 queries detected\n%s', self.get_report())
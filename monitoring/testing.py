@@ -0,0 +1,34 @@
+from django.test import override_settings
+
+from .query_patterns import NPlusOneDetector
+
+
+class NPlusOneTestMixin:
+    """Fail tests which make N+1 queries.
+
+    Every request of the test client is checked by NPlusOneMiddleware.
+    Code called without the client is checked with `assertNoNPlusOne`.
+    Test data is small, so the threshold is lower than in production.
+    """
+    nplusone_threshold = 2
+
+    @classmethod
+    def setUpClass(cls):
+        cls._nplusone_settings = override_settings(
+            NPLUSONE_DETECTION='raise',
+            NPLUSONE_THRESHOLD=cls.nplusone_threshold,
+        )
+        cls._nplusone_settings.enable()
+        try:
+            super().setUpClass()
+        except Exception:
+            cls._nplusone_settings.disable()
+            raise
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls._nplusone_settings.disable()
+
+    def assertNoNPlusOne(self, threshold: int | None = None):
+        return NPlusOneDetector(threshold or self.nplusone_threshold)
@@ -0,0 +1,320 @@
+import os
+import tempfile
+import time
+from collections import Counter
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import transaction
+from django.test import (RequestFactory, SimpleTestCase, TestCase,
+                         override_settings)
+from django.urls import reverse
+
+from coordinates_keeper.geocoder import YandexGeocoder
+from foodcartapp.models import Product, ProductCategory
+
+from .metrics import (Histogram, RequestMetrics, current_request_metrics,
+                      measure_geocoder, registry, render_prometheus)
+from .middleware import MetricsMiddleware, NPlusOneMiddleware
+from .profiling import (SamplingProfiler, format_collapsed,
+                        remove_old_profiles)
+from .query_patterns import NPlusOneDetector, NPlusOneError, normalize_sql
+
+
+class HistogramTest(SimpleTestCase):
+    def test_bounds_are_inclusive(self):
+        histogram = Histogram([1, 5])
+        for value in (0, 1, 2, 5, 6):
+            histogram.observe(value)
+
+        self.assertEqual(histogram.get_cumulative_counts(),
+                         [('1', 2), ('5', 4), ('+Inf', 5)])
+        self.assertEqual(histogram.count, 5)
+        self.assertEqual(histogram.sum, 14)
+
+    def test_render_prometheus(self):
+        histogram = Histogram([1])
+        histogram.observe(0.5)
+
+        text = render_prometheus(
+            {'request_queries': {'foodcartapp:order': histogram}},
+            {'geocoder_circuit': [({'state': 'open'}, 1)]},
+            {'geocoder_requests': 3},
+        )
+
+        self.assertEqual(text.splitlines(), [
+            '# TYPE star_burger_request_queries histogram',
+            'star_burger_request_queries_bucket'
+            '{view="foodcartapp:order",le="1"} 1',
+            'star_burger_request_queries_bucket'
+            '{view="foodcartapp:order",le="+Inf"} 1',
+            'star_burger_request_queries_sum{view="foodcartapp:order"} 0.5',
+            'star_burger_request_queries_count{view="foodcartapp:order"} 1',
+            '# TYPE star_burger_geocoder_circuit gauge',
+            'star_burger_geocoder_circuit{state="open"} 1',
+            '# TYPE star_burger_geocoder_requests_total counter',
+            'star_burger_geocoder_requests_total 3',
+        ])
+
+
+class RequestMetricsTest(SimpleTestCase):
+    def test_duplicate_queries_are_counted(self):
+        metrics = RequestMetrics()
+        execute = mock.Mock()
+        for params in ([1], [2], [1]):
+            metrics(execute, 'SELECT %s', params, False, {})
+
+        self.assertEqual(metrics.queries, 3)
+        self.assertEqual(metrics.duplicate_queries, 1)
+        self.assertEqual(execute.call_count, 3)
+
+    def test_geocoder_time_is_added_to_current_request(self):
+        metrics = RequestMetrics()
+        token = current_request_metrics.set(metrics)
+        try:
+            with mock.patch('time.perf_counter', side_effect=[10.0, 10.5]):
+                with measure_geocoder():
+                    pass
+        finally:
+            current_request_metrics.reset(token)
+
+        self.assertEqual(metrics.geocoder_duration, 0.5)
+
+    def test_geocoder_time_outside_of_request_is_ignored(self):
+        with measure_geocoder():
+            pass
+
+
+@override_settings(
+    GEOCODER_BACKEND='coordinates_keeper.geocoder.OfflineGeocoder',
+    METRICS_TOKEN='secret',
+)
+class MetricsViewTest(TestCase):
+    def setUp(self):
+        registry.clear()
+        cache.clear()
+        category = ProductCategory.objects.create(name='Бургеры')
+        Product.objects.create(name='Чизбургер',
+                               category=category,
+                               price=100,
+                               image='burger.jpg',
+                               )
+
+    def test_requests_are_recorded_by_view(self):
+        self.client.get(reverse('foodcartapp:order'))
+        self.client.get(reverse('foodcartapp:products'))
+
+        histograms = registry.collect()
+        durations = histograms['request_duration_seconds']
+        self.assertIn('foodcartapp:order', durations)
+        self.assertEqual(durations['foodcartapp:order'].count, 1)
+        queries = histograms['request_queries']
+        self.assertGreater(queries['foodcartapp:products'].sum, 0)
+
+    def test_unresolved_requests_are_recorded(self):
+        self.client.get('/no-such-page/')
+
+        durations = registry.collect()['request_duration_seconds']
+        self.assertEqual(durations['<unresolved>'].count, 1)
+
+    def test_anonymous_users_are_forbidden(self):
+        response = self.client.get(reverse('monitoring:metrics'))
+
+        self.assertEqual(response.status_code, 403)
+
+    def test_staff_gets_metrics(self):
+        self.client.force_login(
+            User.objects.create_user('manager', is_staff=True),
+        )
+        self.client.get(reverse('foodcartapp:products'))
+
+        response = self.client.get(reverse('monitoring:metrics'))
+
+        self.assertEqual(response.status_code, 200)
+        text = response.content.decode()
+        self.assertIn('star_burger_request_duration_seconds_count'
+                      '{view="foodcartapp:products"} 1', text)
+        self.assertIn('star_burger_geocoder_gazetteer_size 0', text)
+
+    def test_geocoder_counters_are_counters(self):
+        self.client.force_login(
+            User.objects.create_user('manager', is_staff=True),
+        )
+        with mock.patch('monitoring.views.get_geocoder',
+                        return_value=YandexGeocoder(api_key='')):
+            response = self.client.get(reverse('monitoring:metrics'))
+
+        text = response.content.decode()
+        self.assertIn('# TYPE star_burger_geocoder_requests_total counter\n'
+                      'star_burger_geocoder_requests_total 0', text)
+        self.assertIn('# TYPE star_burger_geocoder_circuit gauge\n'
+                      'star_burger_geocoder_circuit{state="closed"} 1', text)
+
+    def test_token_gives_access(self):
+        response = self.client.get(reverse('monitoring:metrics'),
+                                   HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.get(reverse('monitoring:metrics'),
+                                   HTTP_AUTHORIZATION='Bearer wrong')
+        self.assertEqual(response.status_code, 403)
+
+
+def get_categories_one_by_one(ids):
+    return [ProductCategory.objects.filter(id=category_id).first()
+            for category_id in ids]
+
+
+class NPlusOneDetectorTest(TestCase):
+    def test_normalize_sql(self):
+        self.assertEqual(
+            normalize_sql('SELECT "id"  FROM "t1" WHERE "name" = \'x\'\n'
+                          'AND "id" IN (%s, %s, %s) LIMIT 21'),
+            'SELECT "id" FROM "t1" WHERE "name" = ? '
+            'AND "id" IN (...) LIMIT ?',
+        )
+        self.assertEqual(
+            normalize_sql('INSERT INTO "t" ("a") VALUES (%s), (%s)'),
+            normalize_sql('INSERT INTO "t" ("a") VALUES (%s)'),
+        )
+
+    def test_repeated_queries_are_reported_with_stack(self):
+        with self.assertRaises(NPlusOneError) as context:
+            with NPlusOneDetector(threshold=2):
+                get_categories_one_by_one([1, 2, 3])
+
+        report = str(context.exception)
+        self.assertIn('Query made 3 times, more than 2: SELECT', report)
+        self.assertIn('monitoring/tests.py', report)
+        self.assertIn('in get_categories_one_by_one', report)
+
+    def test_queries_under_threshold_pass(self):
+        with NPlusOneDetector(threshold=2):
+            get_categories_one_by_one([1, 2])
+            ProductCategory.objects.filter(id__in=[1, 2, 3]).count()
+
+    def test_savepoints_are_ignored(self):
+        with NPlusOneDetector(threshold=1):
+            for _ in range(3):
+                with transaction.atomic():
+                    pass
+
+    def test_warning(self):
+        with self.assertLogs('monitoring.query_patterns', 'WARNING') as logs:
+            with NPlusOneDetector(threshold=2, action='warn'):
+                get_categories_one_by_one([1, 2, 3])
+
+        self.assertIn('N+1 queries detected', logs.output[0])
+
+    @override_settings(NPLUSONE_DETECTION='raise', NPLUSONE_THRESHOLD=2)
+    def test_middleware(self):
+        def view(request):
+            get_categories_one_by_one([1, 2, 3])
+
+        middleware = MetricsMiddleware(NPlusOneMiddleware(view))
+        with self.assertRaises(NPlusOneError) as context:
+            middleware(RequestFactory().get('/'))
+
+        report = str(context.exception)
+        self.assertIn('in get_categories_one_by_one', report)
+        self.assertNotIn('monitoring/middleware.py', report)
+        self.assertNotIn('monitoring/metrics.py', report)
+
+    def test_middleware_is_off_by_default(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            NPlusOneMiddleware(mock.Mock())
+
+
+def busy_wait(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+class SamplingProfilerTest(SimpleTestCase):
+    def test_samples_stacks(self):
+        with SamplingProfiler(interval=0.001) as profiler:
+            busy_wait(0.05)
+
+        self.assertGreater(profiler.duration, 0.05)
+        stack, _ = profiler.samples.most_common(1)[0]
+        self.assertTrue(stack[-1].startswith(
+            'busy_wait (monitoring/tests.py:',
+        ))
+        self.assertIn('test_samples_stacks', stack[-2])
+
+    def test_format_collapsed(self):
+        samples = Counter({('main (a.py:1)', 'f (a.py:5)'): 3,
+                           ('main (a.py:1)',): 1})
+
+        self.assertEqual(format_collapsed(samples),
+                         'main (a.py:1);f (a.py:5) 3\n'
+                         'main (a.py:1) 1\n')
+
+    def test_old_profiles_are_removed(self):
+        with tempfile.TemporaryDirectory() as directory:
+            for name in ('20260101T000000.000000Z-a',
+                         '20260102T000000.000000Z-b',
+                         '20260103T000000.000000Z-c'):
+                for extension in ('.collapsed', '.txt'):
+                    open(os.path.join(directory, name + extension),
+                         'w').close()
+
+            remove_old_profiles(directory, keep=2)
+
+            self.assertEqual(sorted(os.listdir(directory)), [
+                '20260102T000000.000000Z-b.collapsed',
+                '20260102T000000.000000Z-b.txt',
+                '20260103T000000.000000Z-c.collapsed',
+                '20260103T000000.000000Z-c.txt',
+            ])
+
+
+class ProfilingMiddlewareTest(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        settings_override = override_settings(PROFILING_DIR=self.directory,
+                                              PROFILING_INTERVAL=0.001)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.client.force_login(
+            User.objects.create_user('manager', is_staff=True),
+        )
+
+    def test_profile_is_saved_on_request(self):
+        response = self.client.get(reverse('restaurateur:RestaurantView'),
+                                   {'profile': ''})
+
+        name = response['X-Profile']
+        self.assertTrue(name.endswith('-restaurateur.RestaurantView'))
+        self.assertEqual(sorted(os.listdir(self.directory)),
+                         [name + '.collapsed', name + '.txt'])
+        with open(os.path.join(self.directory, name + '.txt')) as file:
+            summary = file.read()
+        self.assertIn('View: restaurateur:RestaurantView', summary)
+        self.assertIn('Path: /manager/restaurants/?profile=', summary)
+
+    def test_only_staff_is_profiled(self):
+        self.client.logout()
+
+        response = self.client.get(reverse('foodcartapp:banners'),
+                                   {'profile': ''})
+
+        self.assertNotIn('X-Profile', response)
+        self.assertFalse(os.path.exists(self.directory) and
+                         os.listdir(self.directory))
+
+    @override_settings(PROFILING_SAMPLE_RATE=1)
+    def test_sampled_requests(self):
+        response = self.client.get(reverse('restaurateur:RestaurantView'))
+
+        self.assertIn('X-Profile', response)
+
+    def test_requests_are_not_profiled_by_default(self):
+        response = self.client.get(reverse('restaurateur:RestaurantView'))
+
+        self.assertNotIn('X-Profile', response)
@@ -0,0 +1,43 @@
+import hmac
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+
+from coordinates_keeper.geocoder import get_geocoder
+
+from .metrics import registry, render_prometheus
+
+
+def has_metrics_access(request) -> bool:
+    if request.user.is_staff:
+        return True
+    # Prometheus cannot log in, so it sends the token instead
+    token = settings.METRICS_TOKEN
+    authorization = request.headers.get('Authorization', '')
+    return bool(token) and hmac.compare_digest(authorization,
+                                               f'Bearer {token}')
+
+
+def get_geocoder_metrics() -> tuple[dict, dict]:
+    """Counters and gauges of the geocoder stats."""
+    geocoder = get_geocoder()
+    counters, gauges = {}, {}
+    for name, value in geocoder.stats().items():
+        if name in geocoder.counters:
+            counters[f'geocoder_{name}'] = value
+        elif isinstance(value, (int, float)):
+            gauges[f'geocoder_{name}'] = value
+        else:
+            gauges[f'geocoder_{name}'] = [({'state': value}, 1)]
+    return counters, gauges
+
+
+def metrics(request):
+    """Request histograms and geocoder counters in Prometheus format."""
+    if not has_metrics_access(request):
+        return HttpResponseForbidden()
+    counters, gauges = get_geocoder_metrics()
+    return HttpResponse(
+        render_prometheus(registry.collect(), gauges, counters),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
@@ -0,0 +1,190 @@
+from collections import Counter
+
+import numpy as np
+from django.conf import settings
+from django.db import models, transaction
+
+from foodcartapp.models import Order
+from foodcartapp.restaurants_matcher import (get_distance_calculator,
+                                             match_available_restaurants)
+
+from .models import OrderEvent
+
+UNASSIGNED = -1
+
+
+def assign_restaurants(costs: np.ndarray, capacity: np.ndarray) -> np.ndarray:
+    """Assign orders to restaurants with the least total cost.
+
+    `costs` is an orders by restaurants matrix, `inf` marks restaurants
+    which cannot take the order. `capacity` limits orders per restaurant.
+    Gives the restaurant index for each order, or UNASSIGNED.
+
+    Orders are added one by one with successive shortest paths: a new order
+    may move already assigned orders to other restaurants if it makes the
+    total cost lower. The residual graph is compressed to restaurants and
+    searched with Dijkstra, restaurant potentials keep the reduced costs
+    of moves non-negative. Earlier orders are never left unassigned in
+    favour of later ones.
+    """
+    orders_count, restaurants_count = costs.shape
+    assignment = np.full(orders_count, UNASSIGNED)
+    free = np.array(capacity, dtype=int)
+    members = [[] for _ in range(restaurants_count)]
+    # Johnson potentials of restaurants and of the sink which free
+    # restaurants lead to, they keep reduced costs non-negative
+    potentials = np.zeros(restaurants_count)
+    sink_potential = 0.0
+
+    # moves[j, k] is the cheapest cost change of moving an order from
+    # restaurant j to restaurant k, movers[j, k] is that order
+    moves = np.full((restaurants_count, restaurants_count), np.inf)
+    movers = np.full((restaurants_count, restaurants_count), UNASSIGNED)
+
+    def update_moves(restaurant):
+        orders = np.array(members[restaurant], dtype=int)
+        if not len(orders):
+            moves[restaurant] = np.inf
+            return
+        deltas = costs[orders] - costs[orders, restaurant][:, np.newaxis]
+        cheapest = deltas.argmin(axis=0)
+        moves[restaurant] = deltas[cheapest, np.arange(restaurants_count)]
+        moves[restaurant, restaurant] = np.inf
+        movers[restaurant] = orders[cheapest]
+
+    for order in range(orders_count):
+        if not (free > 0).any():
+            break
+        order_costs = costs[order]
+        reachable = np.isfinite(order_costs)
+        if not reachable.any():
+            continue
+        order_potential = np.max(
+            potentials[reachable] - order_costs[reachable],
+        )
+        path_costs = np.maximum(order_costs + order_potential - potentials, 0)
+        previous = np.full(restaurants_count, UNASSIGNED)
+        pending = path_costs.copy()
+        visited = np.zeros(restaurants_count, dtype=bool)
+        target, target_cost = UNASSIGNED, np.inf
+        while True:
+            restaurant = int(pending.argmin())
+            cost = pending[restaurant]
+            if cost >= target_cost:
+                break
+            pending[restaurant] = np.inf
+            visited[restaurant] = True
+            if free[restaurant] > 0:
+                sink_cost = cost + max(
+                    potentials[restaurant] - sink_potential, 0,
+                )
+                if sink_cost < target_cost:
+                    target, target_cost = restaurant, sink_cost
+            relaxed = cost + np.maximum(
+                moves[restaurant] + potentials[restaurant] - potentials, 0,
+            )
+            improved = (relaxed < path_costs) & ~visited
+            path_costs[improved] = pending[improved] = relaxed[improved]
+            previous[improved] = restaurant
+        if target == UNASSIGNED:
+            continue
+        potentials += np.minimum(path_costs, target_cost)
+        sink_potential += target_cost
+
+        free[target] -= 1
+        changed = {target}
+        restaurant = target
+        for _ in range(restaurants_count):
+            if previous[restaurant] == UNASSIGNED:
+                break
+            source = int(previous[restaurant])
+            mover = int(movers[source, restaurant])
+            members[source].remove(mover)
+            members[restaurant].append(mover)
+            assignment[mover] = restaurant
+            changed.add(source)
+            restaurant = source
+        members[restaurant].append(order)
+        assignment[order] = restaurant
+        for restaurant in changed:
+            update_moves(restaurant)
+
+    return assignment
+
+
+def get_restaurants_load() -> Counter:
+    return Counter(dict(
+        Order.objects
+        .filter(order_status=Order.OrderStatus.PROCESSED,
+                restaurant__isnull=False)
+        .values('restaurant')
+        .annotate(load=models.Count('id'))
+        .values_list('restaurant', 'load')
+    ))
+
+
+def dispatch_new_orders(limit: int | None = None) -> int:
+    """Assign new orders to the nearest restaurants able to cook them.
+
+    Restaurants take no more than RESTAURANT_CAPACITY processed orders.
+    Orders without coordinates or suitable restaurants are left new.
+    Assignment time grows fast with the number of orders, so only
+    DISPATCH_BATCH_SIZE oldest new orders are dispatched at once, `limit`
+    makes the batch smaller. Returns the number of assigned orders.
+    """
+    if limit is None or limit > settings.DISPATCH_BATCH_SIZE:
+        limit = settings.DISPATCH_BATCH_SIZE
+    with transaction.atomic():
+        orders = list(
+            Order.objects.new()
+            .select_for_update()
+            .order_by('created_at', 'id')[:limit]
+        )
+        available_restaurants = match_available_restaurants(orders)
+        restaurants = list({
+            rest.id: rest
+            for order_restaurants in available_restaurants.values()
+            for rest in order_restaurants
+        }.values())
+        if not orders or not restaurants:
+            return 0
+
+        dist = get_distance_calculator(orders, restaurants)
+        distances = dist.get_distance_matrix(
+            [order.address for order in orders],
+            [rest.address for rest in restaurants],
+        )
+        positions = {rest.id: position
+                     for position, rest in enumerate(restaurants)}
+        costs = np.full(distances.shape, np.inf)
+        for row, order in enumerate(orders):
+            columns = [positions[rest.id]
+                       for rest in available_restaurants[order.id]]
+            costs[row, columns] = distances[row, columns]
+        # unknown distance is no better than an impossible one
+        costs[np.isnan(costs)] = np.inf
+
+        load = get_restaurants_load()
+        capacity = np.array([
+            max(settings.RESTAURANT_CAPACITY - load[rest.id], 0)
+            for rest in restaurants
+        ])
+        assignment = assign_restaurants(costs, capacity)
+
+        assigned_orders = {}
+        for order, position in zip(orders, assignment):
+            if position != UNASSIGNED:
+                assigned_orders.setdefault(position, []).append(order.id)
+        for position, order_ids in assigned_orders.items():
+            Order.objects.filter(id__in=order_ids).update(
+                restaurant=restaurants[position],
+                order_status=Order.OrderStatus.PROCESSED,
+            )
+        # queryset updates send no post_save, so the board is told here
+        OrderEvent.objects.bulk_create([
+            OrderEvent(order_id=order_id)
+            for order_ids in assigned_orders.values()
+            for order_id in order_ids
+        ])
+
+    return sum(map(len, assigned_orders.values()))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from restaurateur.dispatcher import dispatch_new_orders
+
+
+class Command(BaseCommand):
+    help = 'Распределение новых заказов по ближайшим ресторанам'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int,
+                            help='dispatch fewer oldest new orders than '
+                                 'DISPATCH_BATCH_SIZE')
+
+    def handle(self, *args, **options):
+        assigned = dispatch_new_orders(limit=options['limit'])
+        self.stdout.write(
+            self.style.SUCCESS(
+                'Successfully assigned {} orders'.format(assigned)
+            )
+        )
@@ -0,0 +1,23 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from restaurateur.models import OrderEvent
+
+
+class Command(BaseCommand):
+    help = 'Удаление старых записей журнала изменений заказов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=1,
+                            help='keep events of the last days')
+
+    def handle(self, *args, **options):
+        purged, _ = OrderEvent.objects.filter(
+            created_at__lt=timezone.now() - timedelta(days=options['days']),
+        ).delete()
+
+        self.stdout.write(
+            self.style.SUCCESS('Successfully purged {} events'.format(purged))
+        )
@@ -1,3 +1,18 @@
 from django.db import models
+from django.utils import timezone
 
-# Create your models here.
+
+class OrderEvent(models.Model):
+    """Change log of orders, read by the live orders board."""
+    order_id = models.PositiveIntegerField('ID заказа', db_index=True)
+    created_at = models.DateTimeField('создано в',
+                                      default=timezone.now,
+                                      db_index=True,
+                                      )
+
+    class Meta:
+        verbose_name = 'изменение заказа'
+        verbose_name_plural = 'журнал изменений заказов'
+
+    def __str__(self):
+        return f'{self.order_id} {self.created_at}'
@@ -0,0 +1,23 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from foodcartapp.models import Order, OrderItem, orders_deletion
+
+from .models import OrderEvent
+
+
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Order)
+def log_order_change(instance, **kwargs):
+    # the event is saved in the same transaction as the order, so the board
+    # never sees it before the order itself
+    OrderEvent.objects.create(order_id=instance.pk)
+
+
+@receiver(post_save, sender=OrderItem)
+@receiver(post_delete, sender=OrderItem)
+def log_order_items_change(instance, **kwargs):
+    # deleted orders log their own event
+    if orders_deletion.get():
+        return
+    OrderEvent.objects.create(order_id=instance.order_id)
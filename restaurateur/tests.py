@@ -1,3 +1,424 @@
-from django.test import TestCase
+import itertools
+import json
+import threading
+import time
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from coordinates_keeper.models import Address
+from foodcartapp.models import (Order, OrderItem, Product, Restaurant,
+                                RestaurantMenuItem)
+from monitoring.testing import NPlusOneTestMixin
+
+from .dispatcher import UNASSIGNED, assign_restaurants
+from .models import OrderEvent
+from .pagination import paginate_by_keyset
+
+
+def create_orders(count, **fields):
+    created_at = timezone.now()
+    return [
+        Order.objects.create(firstname='Иван',
+                             lastname='Петров',
+                             phonenumber='+79291000000',
+                             address='Москва',
+                             created_at=created_at,
+                             **fields,
+                             )
+        for _ in range(count)
+    ]
+
+
+class KeysetPaginationTest(TestCase):
+    def test_pages_with_same_created_at(self):
+        orders = create_orders(5)
+
+        seen = []
+        cursor = None
+        while True:
+            page = paginate_by_keyset(Order.objects.all(), cursor, 2)
+            seen.extend(page.items)
+            cursor = page.next_cursor
+            if cursor is None:
+                break
+
+        self.assertEqual(seen, orders)
+
+
+@override_settings(ORDERS_PAGE_SIZE=2)
+class OrdersViewTest(NPlusOneTestMixin, TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        manager = User.objects.create(username='manager', is_staff=True)
+        self.client.force_login(manager)
+
+    def test_default_new_orders(self):
+        new_orders = create_orders(3)
+        create_orders(1, order_status=Order.OrderStatus.PROCESSED)
+
+        orders_url = reverse('restaurateur:view_orders')
+        response = self.client.get(orders_url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['order_items'], new_orders[:2])
+
+        response = self.client.get(
+            orders_url + response.context['next_page_url'],
+        )
+        self.assertEqual(response.context['order_items'], new_orders[2:])
+        self.assertIsNone(response.context['next_page_url'])
+
+    def test_filters(self):
+        create_orders(1)
+        cash_orders = create_orders(1,
+                                    order_status=Order.OrderStatus.PROCESSED,
+                                    payment_method=Order.PaymentMethod.CASH,
+                                    )
+        response = self.client.get(reverse('restaurateur:view_orders'), {
+            'status': '',
+            'payment_method': Order.PaymentMethod.CASH,
+        })
+        self.assertEqual(response.context['order_items'], cash_orders)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('restaurateur:view_orders'),
+                                   {'cursor': 'broken'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_restaurant_distances(self):
+        order, = create_orders(1)
+        product = Product.objects.create(name='burger', price=100)
+        OrderItem.objects.create(order=order,
+                                 product=product,
+                                 quantity=1,
+                                 item_price=100,
+                                 )
+        location = Address.objects.create(name='вднх',
+                                          lat=55.826296,
+                                          long=37.637760,
+                                          )
+        restaurant = Restaurant.objects.create(name='Star Burger',
+                                               address='ВДНХ',
+                                               location=location,
+                                               )
+        RestaurantMenuItem.objects.create(restaurant=restaurant,
+                                          product=product,
+                                          )
+        Address.objects.create(name='москва', lat=55.753930, long=37.620795)
+
+        response = self.client.get(reverse('restaurateur:view_orders'))
+        restaurants = response.context['order_items'][0].restaurants
+        self.assertEqual([rest.id for rest in restaurants], [restaurant.id])
+        self.assertAlmostEqual(restaurants[0].distance, 8.1, places=1)
+
+    @override_settings(RESTAURANTS_SEARCH_RADIUS_KM=20)
+    def test_restaurants_without_coordinates_are_kept(self):
+        order, = create_orders(1)
+        product = Product.objects.create(name='burger', price=100)
+        OrderItem.objects.create(order=order,
+                                 product=product,
+                                 quantity=1,
+                                 item_price=100,
+                                 )
+        location = Address.objects.create(name='вднх',
+                                          lat=55.826296,
+                                          long=37.637760,
+                                          )
+        located = Restaurant.objects.create(name='Star Burger',
+                                            address='ВДНХ',
+                                            location=location,
+                                            )
+        unknown = Restaurant.objects.create(name='Star Burger Tverskaya',
+                                            address='Тверская 1',
+                                            )
+        for restaurant in (located, unknown):
+            RestaurantMenuItem.objects.create(restaurant=restaurant,
+                                              product=product,
+                                              )
+        Address.objects.create(name='москва', lat=55.753930, long=37.620795)
+
+        response = self.client.get(reverse('restaurateur:view_orders'))
+        restaurants = response.context['order_items'][0].restaurants
+        self.assertEqual([rest.id for rest in restaurants],
+                         [located.id, unknown.id])
+        self.assertIsNone(restaurants[1].distance)
+
+    @override_settings(ORDERS_PAGE_SIZE=10)
+    def test_no_nplusone_queries(self):
+        products = [Product.objects.create(name=name, price=100)
+                    for name in ('burger', 'fries', 'cola')]
+        restaurants = [Restaurant.objects.create(name=name, address=name)
+                       for name in ('first', 'second', 'third')]
+        for restaurant in restaurants:
+            for product in products:
+                RestaurantMenuItem.objects.create(restaurant=restaurant,
+                                                  product=product,
+                                                  )
+        for order in create_orders(5):
+            for product in products:
+                OrderItem.objects.create(order=order,
+                                         product=product,
+                                         quantity=1,
+                                         item_price=100,
+                                         )
+
+        response = self.client.get(reverse('restaurateur:view_orders'))
+        self.assertEqual(len(response.context['order_items']), 5)
+
+
+@override_settings(ORDER_EVENTS_STREAM_TIMEOUT=0)
+class OrdersStreamTest(NPlusOneTestMixin, TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        manager = User.objects.create(username='manager', is_staff=True)
+        self.client.force_login(manager)
+
+    def read_events(self, **params):
+        response = self.client.get(reverse('restaurateur:stream_orders'),
+                                   params)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = b''.join(response.streaming_content).decode()
+        events = []
+        for message in stream.split('\n\n'):
+            fields = dict(line.split(': ', 1)
+                          for line in message.splitlines()
+                          if not line.startswith(':'))
+            if 'event' in fields:
+                events.append((fields['event'], int(fields['id']),
+                               json.loads(fields['data'])))
+        return events
+
+    def test_order_changes_are_logged(self):
+        order, = create_orders(1)
+        order.comment = 'Позвонить заранее'
+        order.save()
+        order_id = order.id
+        order.delete()
+
+        self.assertEqual(
+            list(OrderEvent.objects.values_list('order_id', flat=True)),
+            [order_id] * 3,
+        )
+
+    def test_stream_changed_orders(self):
+        board_response = self.client.get(reverse('restaurateur:view_orders'))
+        self.assertIn('last_event_id=0',
+                      board_response.context['stream_url'])
+
+        new_order, = create_orders(1)
+        processed_order, = create_orders(
+            1,
+            order_status=Order.OrderStatus.PROCESSED,
+        )
+        last_event_id = OrderEvent.objects.latest('id').id
+
+        events = self.read_events(last_event_id=0)
+        self.assertEqual([event[:2] for event in events], [
+            ('order', last_event_id),
+            ('remove', last_event_id),
+        ])
+        self.assertEqual(events[0][2]['id'], new_order.id)
+        self.assertIn(f'id="order-{new_order.id}"', events[0][2]['html'])
+        self.assertEqual(events[1][2], {'id': processed_order.id})
+
+        OrderEvent.objects.update(
+            created_at=timezone.now() - timedelta(minutes=1),
+        )
+        self.assertEqual(self.read_events(last_event_id=last_event_id), [])
+
+    def test_events_committed_late_are_sent(self):
+        create_orders(2)
+        first_event, second_event = OrderEvent.objects.order_by('id')
+        # the first event's transaction has been committed after the second
+        OrderEvent.objects.filter(id=second_event.id).update(
+            created_at=timezone.now() - timedelta(minutes=1),
+        )
+
+        events = self.read_events(last_event_id=second_event.id)
+        self.assertEqual([(event, data['id']) for event, _, data in events],
+                         [('order', first_event.order_id)])
+        # the cursor does not go back
+        self.assertEqual(events[0][1], second_event.id)
+
+    @override_settings(ORDER_EVENTS_STREAM_TIMEOUT=0.05,
+                       ORDER_EVENTS_POLL_INTERVAL=0.01)
+    def test_events_are_sent_once_per_stream(self):
+        create_orders(1)
+
+        events = self.read_events(last_event_id=0)
+        self.assertEqual(len(events), 1)
+
+    def test_streams_are_limited(self):
+        create_orders(1)
+
+        with mock.patch('restaurateur.views.order_streams',
+                        threading.BoundedSemaphore(1)) as order_streams:
+            order_streams.acquire()
+            self.assertEqual(self.read_events(last_event_id=0), [])
+            order_streams.release()
+            self.assertEqual(len(self.read_events(last_event_id=0)), 1)
+
+    def test_resume_with_last_event_id_header(self):
+        create_orders(2)
+        OrderEvent.objects.update(
+            created_at=timezone.now() - timedelta(minutes=1),
+        )
+        first_event_id = OrderEvent.objects.earliest('id').id
+
+        response = self.client.get(reverse('restaurateur:stream_orders'),
+                                   HTTP_LAST_EVENT_ID=str(first_event_id))
+        stream = b''.join(response.streaming_content).decode()
+        self.assertEqual(stream.count('event: order'), 1)
+
+
+class AssignRestaurantsTest(SimpleTestCase):
+    def brute_force(self, costs, capacity):
+        """Cheapest assignment of the most orders, earlier orders first."""
+        orders_count, restaurants_count = costs.shape
+        best_key, best = None, None
+        choices = range(UNASSIGNED, restaurants_count)
+        for assignment in itertools.product(choices, repeat=orders_count):
+            assignment = np.array(assignment)
+            assigned = assignment != UNASSIGNED
+            if (np.bincount(assignment[assigned],
+                            minlength=restaurants_count) > capacity).any():
+                continue
+            total = costs[assigned, assignment[assigned]].sum()
+            if not np.isfinite(total):
+                continue
+            key = (-assigned.sum(), tuple(~assigned), total)
+            if best_key is None or key < best_key:
+                best_key, best = key, assignment
+        return best
+
+    def test_same_as_brute_force(self):
+        rng = np.random.default_rng(0)
+        for _ in range(50):
+            costs = rng.uniform(0, 10, (5, 3))
+            costs[rng.random(costs.shape) < 0.3] = np.inf
+            capacity = rng.integers(0, 3, 3)
+
+            assignment = assign_restaurants(costs, capacity)
+            expected = self.brute_force(costs, capacity)
+            assigned = assignment != UNASSIGNED
+            np.testing.assert_array_equal(assigned, expected != UNASSIGNED)
+            self.assertAlmostEqual(
+                costs[assigned, assignment[assigned]].sum(),
+                costs[assigned, expected[assigned]].sum(),
+            )
+
+    def test_many_orders_are_assigned_fast(self):
+        rng = np.random.default_rng(0)
+        costs = rng.uniform(0, 10, (1000, 300))
+        # most orders compete for a few nearby restaurants
+        costs[:, :20] /= 100
+        for capacity in (10, 3):
+            started_at = time.perf_counter()
+            assignment = assign_restaurants(costs, np.full(300, capacity))
+            self.assertLess(time.perf_counter() - started_at, 1)
+            self.assertEqual((assignment != UNASSIGNED).sum(),
+                             min(1000, 300 * capacity))
+
+    def test_nearest_kitchen_is_not_overloaded(self):
+        costs = np.array([
+            [1.0, 2.0],
+            [1.0, 5.0],
+        ])
+        # the first order moves to the other restaurant to free the nearest
+        # one for the second order
+        np.testing.assert_array_equal(
+            assign_restaurants(costs, capacity=np.array([1, 1])),
+            [1, 0],
+        )
+
+
+@override_settings(RESTAURANT_CAPACITY=1)
+class DispatchOrdersTest(NPlusOneTestMixin, TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        product = Product.objects.create(name='burger', price=100)
+        Address.objects.create(name='москва', lat=55.753930, long=37.620795)
+        self.restaurants = []
+        for name, lat in (('near', 55.76), ('far', 55.9)):
+            restaurant = Restaurant.objects.create(
+                name=name,
+                address=name,
+                location=Address.objects.create(name=name,
+                                                lat=lat,
+                                                long=37.62,
+                                                ),
+            )
+            RestaurantMenuItem.objects.create(restaurant=restaurant,
+                                              product=product,
+                                              )
+            self.restaurants.append(restaurant)
+        self.orders = create_orders(3)
+        for order in self.orders:
+            OrderItem.objects.create(order=order,
+                                     product=product,
+                                     quantity=1,
+                                     item_price=100,
+                                     )
+
+    def test_dispatch_command(self):
+        with self.assertNoNPlusOne():
+            call_command('dispatch_orders', stdout=mock.Mock())
+
+        near, far = self.restaurants
+        self.assertEqual(
+            [(order.restaurant, order.order_status)
+             for order in Order.objects.order_by('id')],
+            [(near, Order.OrderStatus.PROCESSED),
+             (far, Order.OrderStatus.PROCESSED),
+             (None, Order.OrderStatus.NEW)],
+        )
+        self.assertEqual(
+            set(OrderEvent.objects.filter(
+                order_id__in=[order.id for order in self.orders[:2]],
+            ).values_list('order_id', flat=True)),
+            {self.orders[0].id, self.orders[1].id},
+        )
+
+    @override_settings(DISPATCH_BATCH_SIZE=1)
+    def test_dispatch_command_is_batched(self):
+        call_command('dispatch_orders', limit=2, stdout=mock.Mock())
+
+        self.assertEqual(Order.objects.new().count(), 2)
+
+    def test_board_action(self):
+        manager = User.objects.create(username='manager', is_staff=True)
+        self.client.force_login(manager)
+        dispatch_url = reverse('restaurateur:dispatch_orders')
+
+        self.assertEqual(self.client.get(dispatch_url).status_code, 405)
+        response = self.client.post(dispatch_url, follow=True)
+        self.assertRedirects(response, reverse('restaurateur:view_orders'))
+        self.assertContains(response, 'Распределено заказов: 2')
+        self.assertEqual(Order.objects.new().count(), 1)
+
+    @override_settings(DISPATCH_BATCH_SIZE=1)
+    def test_board_action_dispatches_batch(self):
+        manager = User.objects.create(username='manager', is_staff=True)
+        self.client.force_login(manager)
+
+        response = self.client.post(reverse('restaurateur:dispatch_orders'),
+                                    follow=True)
+        self.assertContains(response, 'Распределено заказов: 1')
+        self.assertEqual(Order.objects.new().count(), 2)
+
+    def test_anonymous_users_are_sent_to_login(self):
+        dispatch_url = reverse('restaurateur:dispatch_orders')
+
+        response = self.client.get(dispatch_url)
+        self.assertRedirects(
+            response,
+            f'{reverse("restaurateur:login")}?next={dispatch_url}',
+            fetch_redirect_response=False,
+        )
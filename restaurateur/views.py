@@ -1,18 +1,43 @@
-from typing import Iterable
+import json
+import threading
+import time
+from copy import copy
+from datetime import timedelta
+from typing import Iterable, Iterator
 
+import numpy as np
 from django import forms
+from django.conf import settings
+from django.http import HttpResponseBadRequest, StreamingHttpResponse
 from django.shortcuts import redirect, render
+from django.template.loader import render_to_string
 from django.views import View
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
 from django.db import models
+from django.db.models import Max, Q
+from django.utils import timezone
+from django.contrib import messages
 from django.contrib.auth.decorators import user_passes_test
+from django.views.decorators.http import require_POST
 
 from django.contrib.auth import authenticate, login
 from django.contrib.auth import views as auth_views
 
+from foodcartapp.availability import get_availability_matrix
 from foodcartapp.models import Product, Restaurant, Order
+from foodcartapp.restaurants_matcher import (get_distance_calculator,
+                                             get_restaurants_index,
+                                             match_available_restaurants)
 
-from coordinates_keeper.distance_calc import Distance, prepare_lookup
+from .dispatcher import dispatch_new_orders
+from .models import OrderEvent
+from .pagination import InvalidCursor, paginate_by_keyset
+
+
+# longer transactions saving orders may be seen by the live board late
+ORDER_EVENTS_GRACE_PERIOD = timedelta(seconds=30)
+
+order_streams = threading.BoundedSemaphore(settings.ORDER_EVENTS_MAX_STREAMS)
 
 
 class Login(forms.Form):
@@ -32,6 +57,21 @@ class Login(forms.Form):
     )
 
 
+class OrdersFilter(forms.Form):
+    status = forms.ChoiceField(
+        label='Статус',
+        choices=[('', 'Все'), *Order.OrderStatus.choices],
+        required=False,
+        widget=forms.Select(attrs={'class': 'form-control'}),
+    )
+    payment_method = forms.ChoiceField(
+        label='Способ оплаты',
+        choices=[('', 'Все'), *Order.PaymentMethod.choices],
+        required=False,
+        widget=forms.Select(attrs={'class': 'form-control'}),
+    )
+
+
 class LoginView(View):
     def get(self, request, *args, **kwargs):
         form = Login()
@@ -70,22 +110,15 @@ def is_manager(user):
 @user_passes_test(is_manager, login_url='restaurateur:login')
 def view_products(request):
     restaurants = list(Restaurant.objects.order_by('name'))
-    products = list(Product.objects.prefetch_related('menu_items'))
-
-    default_availability = {restaurant.id: False for restaurant in restaurants}
-    products_with_restaurants = []
-    for product in products:
-        availability = {
-            **default_availability,
-            **{item.restaurant_id: item.availability for item in
-               product.menu_items.all()},
-        }
-        orderer_availability = [availability[restaurant.id] for restaurant in
-                                restaurants]
-
-        products_with_restaurants.append(
-            (product, orderer_availability)
-        )
+    products = list(Product.objects.all())
+
+    availability = get_availability_matrix()
+    restaurant_ids = [restaurant.id for restaurant in restaurants]
+    products_with_restaurants = [
+        (product,
+         availability.get_product_availability(product.id, restaurant_ids))
+        for product in products
+    ]
 
     return render(request, template_name="products_list.html", context={
         'products_with_restaurants': products_with_restaurants,
@@ -100,37 +133,242 @@ def view_restaurants(request):
     })
 
 
+def get_orders_filter(query) -> OrdersFilter:
+    return OrdersFilter({
+        'status': Order.OrderStatus.NEW,
+        **query.dict(),
+    })
+
+
+def filter_orders(filter_form: OrdersFilter) -> models.QuerySet:
+    orders = Order.objects.all()
+    if filter_form.cleaned_data['status']:
+        orders = orders.filter(order_status=filter_form.cleaned_data['status'])
+    if filter_form.cleaned_data['payment_method']:
+        orders = orders.filter(
+            payment_method=filter_form.cleaned_data['payment_method'],
+        )
+    return orders
+
+
 @user_passes_test(is_manager, login_url='restaurateur:login')
 def view_orders(request):
-    orders = enrich_orders_with_restaurants(
-        Order.objects.new().total_price()
-    )
+    filter_form = get_orders_filter(request.GET)
+    if not filter_form.is_valid():
+        return HttpResponseBadRequest('Неверный фильтр заказов')
+    orders = filter_orders(filter_form)
+
+    # taken before the orders, so the live feed does not miss changes
+    # made while the page is rendered
+    last_event_id = OrderEvent.objects.aggregate(
+        last_event_id=Max('id'),
+    )['last_event_id'] or 0
+
+    try:
+        page = paginate_by_keyset(orders,
+                                  cursor=request.GET.get('cursor'),
+                                  page_size=settings.ORDERS_PAGE_SIZE,
+                                  )
+    except InvalidCursor:
+        return HttpResponseBadRequest('Неверная страница заказов')
+
+    next_page_url = None
+    if page.next_cursor:
+        next_page_query = request.GET.copy()
+        next_page_query['cursor'] = page.next_cursor
+        next_page_url = f'?{next_page_query.urlencode()}'
+
+    stream_query = request.GET.copy()
+    stream_query.pop('cursor', None)
+    stream_query['last_event_id'] = last_event_id
+
     return render(request,
                   template_name='order_items.html',
                   context={
-                      'order_items': orders,
+                      'order_items': enrich_orders_with_restaurants(
+                          page.items,
+                      ),
+                      'filter_form': filter_form,
+                      'next_page_url': next_page_url,
+                      'stream_url': '{}?{}'.format(
+                          reverse('restaurateur:stream_orders'),
+                          stream_query.urlencode(),
+                      ),
                   },
                   )
 
 
+@user_passes_test(is_manager, login_url='restaurateur:login')
+@require_POST
+def dispatch_orders(request):
+    # a batch is dispatched, the rest is left to the next click or command
+    assigned = dispatch_new_orders()
+    messages.success(request, f'Распределено заказов: {assigned}')
+    return redirect('restaurateur:view_orders')
+
+
+@user_passes_test(is_manager, login_url='restaurateur:login')
+def stream_orders(request):
+    """Push changed orders of the board as Server-Sent Events.
+
+    Each `order` event carries the rendered table row, `remove` event is
+    sent for orders which were deleted or do not match the filter anymore.
+    The stream is closed after ORDER_EVENTS_STREAM_TIMEOUT seconds and the
+    browser reconnects with the Last-Event-ID header.
+
+    An open stream takes a worker thread and a database connection, so
+    a process keeps at most ORDER_EVENTS_MAX_STREAMS of them, other
+    browsers are asked to reconnect later.
+    """
+    filter_form = get_orders_filter(request.GET)
+    if not filter_form.is_valid():
+        return HttpResponseBadRequest('Неверный фильтр заказов')
+    orders = filter_orders(filter_form)
+    try:
+        last_event_id = int(request.headers.get('Last-Event-ID') or
+                            request.GET.get('last_event_id', 0))
+    except ValueError:
+        return HttpResponseBadRequest('Неверный номер события')
+
+    response = StreamingHttpResponse(
+        generate_order_events(orders, last_event_id),
+        content_type='text/event-stream',
+    )
+    response['Cache-Control'] = 'no-cache'
+    # stop nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def generate_order_events(orders: models.QuerySet,
+                          last_event_id: int) -> Iterator[str]:
+    retry = 'retry: {}\n\n'.format(
+        int(settings.ORDER_EVENTS_POLL_INTERVAL * 1000),
+    )
+    if not order_streams.acquire(blocking=False):
+        yield retry
+        return
+    try:
+        yield retry
+        yield from poll_order_events(orders, last_event_id)
+    finally:
+        order_streams.release()
+
+
+def poll_order_events(orders: models.QuerySet,
+                      last_event_id: int) -> Iterator[str]:
+    deadline = time.monotonic() + settings.ORDER_EVENTS_STREAM_TIMEOUT
+    # ids are taken before commit, so an event of a longer transaction may
+    # show up behind the cursor, recent events are looked through again
+    sent_events = {}
+    while True:
+        window_start = timezone.now() - ORDER_EVENTS_GRACE_PERIOD
+        sent_events = {event_id: created_at
+                       for event_id, created_at in sent_events.items()
+                       if created_at >= window_start}
+        events = list(
+            OrderEvent.objects
+            .filter(Q(id__gt=last_event_id) |
+                    Q(created_at__gte=window_start))
+            .exclude(id__in=sent_events)
+            .order_by('id')[:settings.ORDERS_PAGE_SIZE]
+        )
+        if events:
+            sent_events.update((event.id, event.created_at)
+                               for event in events)
+            last_event_id = max(last_event_id, events[-1].id)
+            changed_ids = list(dict.fromkeys(event.order_id
+                                             for event in events))
+            changed_orders = {
+                order.id: order
+                for order in enrich_orders_with_restaurants(
+                    orders.filter(id__in=changed_ids),
+                )
+            }
+            for order_id in changed_ids:
+                order = changed_orders.get(order_id)
+                if order is None:
+                    yield format_event('remove', {'id': order_id},
+                                       last_event_id)
+                    continue
+                yield format_event('order', {
+                    'id': order_id,
+                    'html': render_to_string('order_row.html',
+                                             {'item': order}),
+                }, last_event_id)
+        else:
+            # keeps proxies from closing the idle connection
+            yield ': ping\n\n'
+
+        if time.monotonic() >= deadline:
+            return
+        time.sleep(settings.ORDER_EVENTS_POLL_INTERVAL)
+
+
+def format_event(event: str, data: dict, event_id: int) -> str:
+    return 'event: {}\nid: {}\ndata: {}\n\n'.format(
+        event,
+        event_id,
+        json.dumps(data, ensure_ascii=False),
+    )
+
+
 def enrich_orders_with_restaurants(orders: models.QuerySet) -> Iterable[Order]:
-    addresses = []
     orders = list(orders)
-    for order in orders:
-        addresses.append(order.address)
-        order.restaurants = []
-        for rest in order.get_available_restaurants():
-            order.restaurants.append(rest)
-            addresses.append(rest.address)
+    available_restaurants = match_available_restaurants(orders)
 
-    dist = Distance(address_lookup=prepare_lookup(addresses))
-    for order in orders:
-        order_address = order.address
-        for rest in order.restaurants:
-            rest.distance = dist.get_distance(order_address, rest.address)
+    restaurants = {rest.id: rest
+                   for order_restaurants in available_restaurants.values()
+                   for rest in order_restaurants}
+    dist = get_distance_calculator(orders, restaurants.values())
 
-        order.restaurants = sorted(order.restaurants,
-                                   key=lambda e: (
-                                       e.distance is None, e.distance))
+    nearest_limit = settings.RESTAURANTS_NEAREST_LIMIT
+    search_radius = settings.RESTAURANTS_SEARCH_RADIUS_KM
+    restaurants_index = None
+    if nearest_limit is not None or search_radius is not None:
+        restaurants_index = get_restaurants_index()
+
+    pairs = []
+    for row, order in enumerate(orders):
+        candidates = available_restaurants[order.id]
+        lat, long = dist.get_coordinates(order.address)
+        if restaurants_index is not None and lat is not None:
+            candidates_by_id = {rest.id: rest for rest in candidates}
+            nearest = restaurants_index.nearest(
+                lat, long,
+                k=nearest_limit,
+                radius_km=search_radius,
+                keys=candidates_by_id.keys(),
+            )
+            # restaurants without coordinates are kept as without the index,
+            # they go last with an unknown distance
+            candidates = [candidates_by_id[restaurant_id]
+                          for restaurant_id, _ in nearest] + \
+                [rest for rest in candidates
+                 if rest.id not in restaurants_index]
+        pairs.extend((row, rest) for rest in candidates)
+
+    distances = dist.get_paired_distances(
+        [orders[row].address for row, _ in pairs],
+        [rest.address for _, rest in pairs],
+    )
+    # nearest candidates go first, candidates with unknown distance last
+    sort_keys = np.where(np.isnan(distances), np.inf, distances)
+    rows = np.array([row for row, _ in pairs], dtype=int)
+    ranking = np.lexsort((sort_keys, rows))
+
+    for order in orders:
+        order.restaurants = []
+    for position in ranking:
+        row, rest = pairs[position]
+        order = orders[row]
+        if nearest_limit is not None and \
+                len(order.restaurants) >= nearest_limit:
+            continue
+        # each order keeps its own distance, so it needs its own copy
+        rest = copy(rest)
+        kilometers = distances[position]
+        rest.distance = None if np.isnan(kilometers) else float(kilometers)
+        order.restaurants.append(rest)
 
     return orders
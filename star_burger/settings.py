@@ -13,6 +13,56 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 SECRET_KEY = env('SECRET_KEY', 'etirgvonenrfnoerngorenogneongg334g')
 DEBUG = env.bool('DEBUG', True)
 YANDEX_MAP_API_KEY = env('STAR_BURGER__YANDEX_MAP_API_KEY', '')
+GEOCODER_BACKEND = env('STAR_BURGER__GEOCODER_BACKEND',
+                       'coordinates_keeper.geocoder.YandexGeocoder')
+GEOCODER_GAZETTEER = env('STAR_BURGER__GEOCODER_GAZETTEER', '')
+GEOCODER_OFFLINE_BBOX = env.list('STAR_BURGER__GEOCODER_OFFLINE_BBOX',
+                                 [55.57, 37.36, 55.91, 37.85],
+                                 subcast=float)
+GEOCODER_CONCURRENCY = env.int('STAR_BURGER__GEOCODER_CONCURRENCY', 8)
+GEOCODER_CONNECT_TIMEOUT = env.float('STAR_BURGER__GEOCODER_CONNECT_TIMEOUT',
+                                     2.0)
+GEOCODER_TIMEOUT = env.float('STAR_BURGER__GEOCODER_TIMEOUT', 3.0)
+GEOCODER_RATE_LIMIT = env.float('STAR_BURGER__GEOCODER_RATE_LIMIT', 5.0)
+GEOCODER_BURST = env.int('STAR_BURGER__GEOCODER_BURST', 10)
+GEOCODER_FAILURE_THRESHOLD = env.int('STAR_BURGER__GEOCODER_FAILURE_THRESHOLD',
+                                     5)
+GEOCODER_COOLDOWN = env.float('STAR_BURGER__GEOCODER_COOLDOWN', 30.0)
+GEOCODER_RETRY_DELAY = env.int('STAR_BURGER__GEOCODER_RETRY_DELAY', 300)
+GEOCODER_RETRY_MAX_DELAY = env.int('STAR_BURGER__GEOCODER_RETRY_MAX_DELAY',
+                                   7 * 24 * 3600)
+GEOCODER_REFRESH_DAYS = env.int('STAR_BURGER__GEOCODER_REFRESH_DAYS', 90)
+DISTANCE_ELLIPSOIDAL = env.bool('STAR_BURGER__DISTANCE_ELLIPSOIDAL', False)
+ORDERS_PAGE_SIZE = env.int('STAR_BURGER__ORDERS_PAGE_SIZE', 50)
+RESTAURANT_CAPACITY = env.int('STAR_BURGER__RESTAURANT_CAPACITY', 10)
+DISPATCH_BATCH_SIZE = env.int('STAR_BURGER__DISPATCH_BATCH_SIZE', 200)
+ORDER_EVENTS_POLL_INTERVAL = env.float(
+    'STAR_BURGER__ORDER_EVENTS_POLL_INTERVAL', 1.0,
+)
+ORDER_EVENTS_STREAM_TIMEOUT = env.float(
+    'STAR_BURGER__ORDER_EVENTS_STREAM_TIMEOUT', 60.0,
+)
+ORDER_EVENTS_MAX_STREAMS = env.int(
+    'STAR_BURGER__ORDER_EVENTS_MAX_STREAMS', 4,
+)
+METRICS_TOKEN = env('STAR_BURGER__METRICS_TOKEN', '')
+NPLUSONE_DETECTION = env('STAR_BURGER__NPLUSONE_DETECTION', '',
+                         validate=lambda value: value in ('', 'warn', 'raise'))
+NPLUSONE_THRESHOLD = env.int('STAR_BURGER__NPLUSONE_THRESHOLD', 5)
+PROFILING_DIR = env('STAR_BURGER__PROFILING_DIR',
+                    os.path.join(BASE_DIR, 'profiles'))
+PROFILING_SAMPLE_RATE = env.float('STAR_BURGER__PROFILING_SAMPLE_RATE', 0.0)
+PROFILING_INTERVAL = env.float('STAR_BURGER__PROFILING_INTERVAL', 0.005)
+PROFILING_TOP = env.int('STAR_BURGER__PROFILING_TOP', 30)
+PROFILING_KEEP = env.int('STAR_BURGER__PROFILING_KEEP', 100)
+RESTAURANTS_NEAREST_LIMIT = env.int('STAR_BURGER__RESTAURANTS_NEAREST_LIMIT',
+                                    None)
+RESTAURANTS_SEARCH_RADIUS_KM = env.float(
+    'STAR_BURGER__RESTAURANTS_SEARCH_RADIUS_KM',
+    None,
+)
+RESTAURANTS_INDEX_MAX_AGE = env.int('STAR_BURGER__RESTAURANTS_INDEX_MAX_AGE',
+                                    10 * 60)
 
 ALLOWED_HOSTS = env.list('ALLOWED_HOSTS', ['127.0.0.1', 'localhost'])
 
@@ -20,6 +70,7 @@ INSTALLED_APPS = [
     'foodcartapp.apps.FoodcartappConfig',
     'restaurateur.apps.RestaurateurConfig',
     'coordinates_keeper.apps.CoordinatesKeeperConfig',
+    'monitoring.apps.MonitoringConfig',
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
@@ -32,12 +83,15 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'monitoring.middleware.MetricsMiddleware',
+    'monitoring.middleware.NPlusOneMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'monitoring.middleware.ProfilingMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'debug_toolbar.middleware.DebugToolbarMiddleware',
 ]
@@ -82,6 +136,17 @@ WSGI_APPLICATION = 'star_burger.wsgi.application'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 MEDIA_URL = '/media/'
 
+CACHES = {
+    'default': env.dj_cache_url('CACHE_URL', 'locmem://'),
+}
+CATALOGUE_CACHE_TIMEOUT = env.int('STAR_BURGER__CATALOGUE_CACHE_TIMEOUT',
+                                  10 * 60)
+CATALOGUE_MAX_AGE = env.int('STAR_BURGER__CATALOGUE_MAX_AGE', 60)
+BANNERS_MAX_AGE = env.int('STAR_BURGER__BANNERS_MAX_AGE', 60 * 60)
+API_STALE_WHILE_REVALIDATE = env.int(
+    'STAR_BURGER__API_STALE_WHILE_REVALIDATE', 10 * 60,
+)
+
 DATABASES = {
     'default': dj_database_url.config(
         default='sqlite:////{0}'.format(os.path.join(BASE_DIR, 'db.sqlite3'))
@@ -27,6 +27,7 @@ urlpatterns = [
                        name='start_page'),
                   path('api/', include('foodcartapp.urls')),
                   path('manager/', include('restaurateur.urls')),
+                  path('monitoring/', include('monitoring.urls')),
                   path('api_auth/', include('rest_framework.urls')),
               ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
 